@@ -1,16 +1,21 @@
 # -*- coding: utf-8 -*-
 """Instantiate the MVC application."""
 
+import os
 import sys
 from PySide6.QtWidgets import QApplication
 from biopeaks.model import Model
 from biopeaks.view import View
 from biopeaks.controller import Controller
+from biopeaks.cache import ResultCache
 
 
 class Application(QApplication):
     """MVC application.
 
+    Extrema and statistics are cached if the environment variable
+    BIOPEAKS_CACHE_DIR points to a cache directory (see cache.ResultCache).
+
     See also
     --------
     model.Model, view.View, controller.Controller
@@ -18,7 +23,9 @@ class Application(QApplication):
     def __init__(self, sys_argv):
         super(Application, self).__init__(sys_argv)
         self._model = Model()
-        self._controller = Controller(self._model)
+        cachedir = os.environ.get("BIOPEAKS_CACHE_DIR")
+        cache = ResultCache(cachedir) if cachedir else None
+        self._controller = Controller(self._model, cache=cache)
         self._view = View(self._model, self._controller)
 
 
@@ -2,35 +2,160 @@
 """Signal processing utilities used in heart and resp modules."""
 
 import numpy as np
-from scipy.interpolate import interp1d
 
 
-def interp_stats(peaks, stats, nsamp):
+# Sampling frequencies (in Hz) that suffice for the detection of the extrema
+# of each modality. See `decimation_factor`.
+decimated_sfreqs = {"ECG": 250,
+                    "PPG": 50,
+                    "RESP": 10}
+
+
+class DetectorWorkspace:
+    """Reusable buffers for the intermediate results of the detectors.
+
+    The detectors (`ecg_peaks`, `ppg_peaks`, `resp_extrema`) write their
+    full-length intermediate results (gradients, moving averages, threshold
+    masks etc.) into named buffers of the workspace using in-place operations.
+    A buffer is allocated the first time it is requested and is only
+    re-allocated if a longer signal or a different dtype is requested. Passing
+    the same workspace to the detectors across many signals of equal length
+    therefore avoids large allocations after the first signal. Note that the
+    output of the Butterworth filters is still allocated by SciPy.
+
+    A workspace must not be shared by concurrently running detectors.
+
+    Attributes
+    ----------
+    size : int
+        Minimal number of elements of each buffer.
+    dtype : data-type
+        Default precision of the intermediate results.
+    allocations : int
+        Number of buffers that have been allocated so far.
+
+    Examples
+    --------
+    >>> workspace = DetectorWorkspace(size=signals[0].size)
+    >>> for signal in signals:
+    ...     peaks = ecg_peaks(signal, sfreq, workspace=workspace)
+    """
+
+    def __init__(self, size=0, dtype=np.float64):
+        """Instantiate an empty workspace.
+
+        Parameters
+        ----------
+        size : int, optional
+            Expected length of the signals in samples. Buffers are allocated
+            with at least that many elements. Default is 0.
+        dtype : data-type, optional
+            Default precision of the intermediate results. Used by the
+            detectors if their `dtype` argument is None. Default is
+            np.float64.
+        """
+        self.size = size
+        self.dtype = np.dtype(dtype)
+        self.allocations = 0
+        self._buffers = {}
+
+    def get(self, name, size, dtype=None):
+        """Return a buffer.
+
+        Parameters
+        ----------
+        name : str
+            The name of the buffer.
+        size : int
+            The number of elements of the buffer.
+        dtype : data-type, optional
+            The dtype of the buffer. Default is None (`self.dtype`).
+
+        Returns
+        -------
+        ndarray
+            A view of the first `size` elements of the buffer. The content of
+            the buffer is undefined.
+        """
+        dtype = self.dtype if dtype is None else np.dtype(dtype)
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.dtype != dtype or buffer.size < size:
+            buffer = np.empty(max(size, self.size), dtype=dtype)
+            self._buffers[name] = buffer
+            self.allocations += 1
+        return buffer[:size]
+
+    @property
+    def nbytes(self):
+        """Total number of bytes held by the buffers."""
+        return sum(buffer.nbytes for buffer in self._buffers.values())
+
+    def clear(self):
+        """Release all buffers."""
+        self._buffers.clear()
+
+
+def abs_gradient(signal, out):
+    """Compute the absolute gradient of a signal in place.
+
+    Equivalent to `np.abs(np.gradient(signal))`, but writes the result to a
+    pre-allocated array.
+
+    Parameters
+    ----------
+    signal : ndarray
+        The signal. Must have at least two elements.
+    out : ndarray
+        Array with the same number of elements as `signal` that the absolute
+        gradient is written to.
+
+    Returns
+    -------
+    out : ndarray
+    """
+    np.subtract(signal[2:], signal[:-2], out=out[1:-1])
+    np.divide(out[1:-1], 2., out=out[1:-1])    # central differences
+    out[0] = signal[1] - signal[0]    # one-sided differences at the edges
+    out[-1] = signal[-1] - signal[-2]
+    np.abs(out, out=out)
+    return out
+
+
+def interp_stats(peaks, stats, nsamp, out=None):
     """Interpolate instantaneous statistics.
 
     Interpolate instantaneous statistics between the associated samples (i.e.,
-    extrema) over a vector ranging up to a specific sample.
+    extrema) over a vector ranging up to a specific sample. Multiple
+    statistics that are associated with the same samples can be interpolated
+    at once, in which case the intervals between the samples are only located
+    once for all statistics.
 
     Parameters
     ----------
     peaks : ndarray
-        Samples associated with the instantaneous statistics. Must have the same
-        number of elements as `stats`.
-    stats : ndarray
+        Samples associated with the instantaneous statistics, in ascending
+        order. Must have the same number of elements as `stats`.
+    stats : ndarray or list of ndarray
         The instantaneous statistics associated with each peak. Must have the
-        same number of elements as `peaks`.
+        same number of elements as `peaks`. Multiple statistics can be passed
+        as a list or as rows of a 2D array.
     nsamp : int
         Interpolate statistics over a vector containing samples from 0 to
         `nsamp`.
+    out : ndarray, optional
+        Array with `nsamp` columns (and a row per statistic in case of
+        multiple statistics) that the interpolated statistics are written to.
+        By default None (a new array is allocated).
 
     Returns
     -------
     ndarray
-        The interpolated instantaneous statistics.
+        The interpolated instantaneous statistics, with a row per statistic in
+        case of multiple statistics.
 
     See Also
     --------
-    scipy.interpolate.interp1d
+    numpy.interp
 
     Notes
     -----
@@ -41,12 +166,44 @@ def interp_stats(peaks, stats, nsamp):
     biologically implausible interpolated `stats` values due to over- or
     undershooting (i.e., violations of monotonicity).
     """
-    f = interp1d(np.ravel(peaks), stats, kind='slinear',
-                 bounds_error=False, fill_value=([stats[0]], [stats[-1]]))
-    samples = np.arange(0, nsamp)    # implicitly preserves original sampling rate
-    statsintp = f(samples)
+    peaks = np.ravel(peaks)
+    stats = np.asarray(stats, dtype=float)
+    single = stats.ndim == 1
+    stats = np.atleast_2d(stats)
+    if out is None:
+        out = np.empty(nsamp) if single else np.empty((stats.shape[0], nsamp))
+    outrows = np.atleast_2d(out)
+
+    # Index of the first sample that is at or after each peak. The samples in
+    # [bounds[i], bounds[i + 1]) lie between peaks i and i + 1.
+    bounds = np.clip(np.ceil(peaks), 0, nsamp).astype(np.intp)
+    with np.errstate(divide="ignore", invalid="ignore"):    # duplicate peaks have no samples in between
+        slopes = np.diff(stats, axis=1) / np.diff(peaks)
+    for values, row in zip(stats, outrows):
+        row[:bounds[0]] = values[0]
+        row[bounds[-1]:] = values[-1]
+
+    # Interpolate blocks of consecutive intervals, such that the temporary
+    # arrays are limited to roughly blocksize samples. The intervals of the
+    # samples are located once per block for all statistics.
+    blocksize = 2**16
+    blockstarts = np.unique(np.searchsorted(bounds,
+                                            np.arange(bounds[0], bounds[-1],
+                                                      blocksize),
+                                            side="right") - 1)    # first interval of each block
+    blockends = np.append(blockstarts[1:], peaks.size - 1)
+    for begidx, endidx in zip(blockstarts, blockends):
+        begsamp, endsamp = bounds[begidx], bounds[endidx]
+        idcs = np.repeat(np.arange(begidx, endidx),
+                         np.diff(bounds[begidx:endidx + 1]))    # interval of each sample
+        offsets = np.arange(begsamp, endsamp) - peaks[idcs]    # distance of each sample to the preceding peak
+        for values, slope, row in zip(stats, slopes, outrows):
+            block = row[begsamp:endsamp]
+            np.take(slope, idcs, out=block)
+            block *= offsets
+            block += values[idcs]
 
-    return statsintp
+    return out
 
 
 def find_segments(condition):
@@ -77,3 +234,52 @@ def find_segments(condition):
     durations = ends - starts
 
     return starts, ends, durations
+
+
+def decimation_factor(sfreq, modality):
+    """Compute the factor by which a signal can be downsampled for detection.
+
+    Parameters
+    ----------
+    sfreq : int
+        The sampling frequency of the signal.
+    modality : str
+        One of {"ECG", "PPG", "RESP"}.
+
+    Returns
+    -------
+    int
+        The largest integer factor that downsamples `sfreq` to no less than
+        the sampling frequency required by `modality` (see
+        `decimated_sfreqs`). One if the signal cannot be downsampled.
+    """
+    return max(int(sfreq // decimated_sfreqs[modality]), 1)
+
+
+def refine_peaks(signal, peaks, radius):
+    """Move peaks to the local maximum of a signal.
+
+    Parameters
+    ----------
+    signal : ndarray
+        The signal containing the peaks.
+    peaks : ndarray
+        Approximate samples of the peaks, e.g., peaks that have been detected
+        in a decimated version of `signal`.
+    radius : int
+        Each peak is moved to the maximum of `signal` within `radius` samples
+        of the peak.
+
+    Returns
+    -------
+    ndarray
+        The unique refined peaks.
+    """
+    if peaks.size == 0:
+        return peaks
+    offsets = np.arange(-radius, radius + 1)
+    windows = np.clip(peaks[:, None] + offsets, 0, signal.size - 1)
+    maxima = np.argmax(signal[windows], axis=1)
+    refined = windows[np.arange(peaks.size), maxima]
+
+    return np.unique(refined)
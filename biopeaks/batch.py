@@ -0,0 +1,762 @@
+# -*- coding: utf-8 -*-
+"""Batch processing of multiple files without the GUI.
+
+Files are read ahead of the analysis by a `Prefetcher`, such that reading and
+parsing the next files (mostly I/O and GIL-releasing pandas / NumPy code)
+overlaps with the analysis of the current file. `BatchProcessor` consumes the
+prefetched signals, detects and optionally corrects the extrema, and saves the
+statistics (and optionally the extrema) of each file. If a marker channel is
+specified, the statistics are additionally averaged around the onsets of the
+marker (see `biopeaks.epochs`) and saved for each event.
+
+Each processed file is recorded in a manifest ("batch_manifest.jsonl" in the
+statistics directory), together with the parameters of the batch, a hash of
+the file, and the paths of the output files. An interrupted batch can be
+resumed by skipping the files that the manifest lists as complete (see
+`BatchManifest.pending`).
+
+Examples
+--------
+>>> processor = BatchProcessor("ECG", "EDF", "A3", wdirstats="stats",
+...                            savestats=["period", "rate"])
+>>> results = processor.run(fpaths)
+"""
+
+import os
+import json
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+import numpy as np
+from biopeaks.heart import correct_peaks, heart_stats
+from biopeaks.resp import resp_stats
+from biopeaks.detectors import peakfuncs
+from biopeaks.epochs import marker_onsets, event_stats
+from biopeaks.beats import beat_table
+from biopeaks.io_utils import (read_custom, read_opensignals, read_edf,
+                               write_peaks, write_stats)
+from biopeaks.profiling import stage
+from biopeaks.cancellation import (CancellationToken, cancellable,
+                                   check_cancelled, current_token)
+from biopeaks.progress import ProgressTracker, tracking, current_tracker
+
+
+readfuncs = {"Custom": read_custom,
+             "OpenSignals": read_opensignals,
+             "EDF": read_edf}
+
+
+def batch_params(modality, filetype, signalinfo, savestats, correctpeaks,
+                 wdirpeaks=None, markerinfo=None, epochwindow=None,
+                 savebeats=False):
+    """Collect the parameters that determine the outputs of a batch.
+
+    Parameters
+    ----------
+    modality : str
+        One of {"ECG", "PPG", "RESP"}.
+    filetype : str
+        One of {"Custom", "OpenSignals", "EDF"}.
+    signalinfo : str or dict
+        The biosignal channel (e.g., "A1"), or the custom header in case of
+        "Custom" files.
+    savestats : list of str
+        The statistics that are saved.
+    correctpeaks : bool
+        Whether cardiac extrema are auto-corrected.
+    wdirpeaks : str, optional
+        Directory the extrema are saved to. By default None (extrema are not
+        saved).
+    markerinfo : str or dict, optional
+        The marker channel, or the custom header in case of "Custom" files.
+        By default None (statistics are not averaged around events).
+    epochwindow : tuple of float, optional
+        Start and end of the events' windows in seconds (only relevant if
+        `markerinfo` is not None). By default None.
+    savebeats : bool, optional
+        Whether the features of each beat are saved. By default False.
+
+    Returns
+    -------
+    params : dict
+        JSON-compatible parameters, as recorded in `BatchManifest`.
+    """
+    params = {"modality": modality,
+              "filetype": filetype,
+              "signalinfo": signalinfo,
+              "savestats": sorted(savestats),
+              "correctpeaks": bool(correctpeaks),
+              "wdirpeaks": None if wdirpeaks is None else str(wdirpeaks)}
+    if markerinfo is not None:    # parameters of batches without events are unchanged
+        params["markerinfo"] = markerinfo
+        params["epochwindow"] = list(epochwindow)
+    if savebeats:
+        params["savebeats"] = True
+    return json.loads(json.dumps(params, sort_keys=True, default=str))
+
+
+def fingerprint(fpath, previous=None, blocksize=2 ** 20):
+    """Identify the content of a file.
+
+    Parameters
+    ----------
+    fpath : str
+        File system location of the file.
+    previous : dict, optional
+        An earlier fingerprint of the file. If the size and modification time
+        of the file are unchanged, the hash of `previous` is reused instead of
+        reading the file. By default None.
+    blocksize : int, optional
+        Number of bytes that are hashed at once. By default 1 MiB.
+
+    Returns
+    -------
+    fingerprint : dict
+        The "size" and modification time ("mtime_ns") of the file, as well as
+        the BLAKE2b hash of its content ("blake2b").
+    """
+    stat = Path(fpath).stat()
+    fprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if (previous is not None and previous.get("size") == fprint["size"] and
+            previous.get("mtime_ns") == fprint["mtime_ns"]):
+        fprint["blake2b"] = previous["blake2b"]
+        return fprint
+
+    digest = hashlib.blake2b(digest_size=16)
+    with open(fpath, "rb") as f:
+        for block in iter(lambda: f.read(blocksize), b""):
+            digest.update(block)
+    fprint["blake2b"] = digest.hexdigest()
+
+    return fprint
+
+
+def read_and_fingerprint(readfunc, fpath):
+    """Read a file and fingerprint it (while it is in the page cache).
+
+    Parameters
+    ----------
+    readfunc : function
+        Function that reads the file, taking its path as single argument.
+    fpath : str
+        File system location of the file.
+
+    Returns
+    -------
+    data, fingerprint
+        The data returned by `readfunc` and the fingerprint of the file (see
+        `fingerprint`), which is None if the file cannot be accessed.
+    """
+    data = readfunc(fpath)
+    try:
+        fprint = fingerprint(fpath)
+    except OSError:
+        fprint = None
+    return data, fprint
+
+
+class BatchManifest:
+    """Record the processing of each file of a batch.
+
+    The manifest is a JSON-lines file. Each line records one file: its path
+    ("fpath"), "status" ("done" or "error"), the parameters of the batch
+    ("params", see `batch_params`), the fingerprint of the file ("input", see
+    `fingerprint`), the paths and sizes of the output files ("outputs"), and
+    the "error" if any. Lines are only appended, and the last line of a file
+    takes precedence. A line is written once all outputs of a file have been
+    written, such that an interruption leaves at most an incomplete last line,
+    which is ignored when the manifest is read.
+    """
+
+    def __init__(self, wdir, fname="batch_manifest.jsonl"):
+        """Read the records of an existing manifest.
+
+        Parameters
+        ----------
+        wdir : str
+            Directory containing the manifest (usually the directory the
+            statistics are saved to).
+        fname : str, optional
+            File name of the manifest. By default "batch_manifest.jsonl".
+        """
+        self.path = Path(wdir).joinpath(fname)
+        self.records = {}
+        self._lock = threading.Lock()
+        if not self.path.exists():
+            return
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:    # line has been truncated by an interruption
+                    continue
+                self.records[_manifestkey(record["fpath"])] = record
+
+    def record(self, fpath, params, status="done", outputs=(), error=None,
+               fprint=None):
+        """Append the record of a file.
+
+        Parameters
+        ----------
+        fpath : str
+            File system location of the file.
+        params : dict
+            The parameters of the batch (see `batch_params`).
+        status : str, optional
+            Either "done" or "error". By default "done".
+        outputs : list of str, optional
+            Paths of the output files. By default empty.
+        error : str, optional
+            Description of the error. By default None.
+        fprint : dict, optional
+            The fingerprint of the file. By default None (computed).
+        """
+        key = _manifestkey(fpath)
+        if fprint is None:
+            fprint = fingerprint(fpath,
+                                 previous=self.records.get(key, {}).get("input"))
+        outputs = [{"path": str(path), "size": filesize(path)}
+                   for path in outputs]
+        record = {"fpath": str(fpath), "status": status, "params": params,
+                  "input": fprint, "outputs": outputs, "error": error}
+        with self._lock:
+            self.records[key] = record
+            with open(self.path, "a") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def is_complete(self, fpath, params):
+        """Check if a file has been processed with the same parameters.
+
+        Parameters
+        ----------
+        fpath : str
+            File system location of the file.
+        params : dict
+            The parameters of the batch (see `batch_params`).
+
+        Returns
+        -------
+        complete : bool
+            True if the last record of the file has status "done", the
+            parameters are the same as `params`, the file's content is
+            unchanged, and all output files exist with their recorded size.
+        """
+        record = self.records.get(_manifestkey(fpath))
+        if record is None or record["status"] != "done":
+            return False
+        if record["params"] != params:
+            return False
+        for output in record["outputs"]:
+            if filesize(output["path"]) != output["size"]:
+                return False
+        try:
+            fprint = fingerprint(fpath, previous=record["input"])
+        except OSError:
+            return False
+
+        return fprint["blake2b"] == record["input"]["blake2b"]
+
+    def pending(self, fpaths, params):
+        """Select the files that have not been processed completely.
+
+        Parameters
+        ----------
+        fpaths : list of str
+            File system locations of the files.
+        params : dict
+            The parameters of the batch (see `batch_params`).
+
+        Returns
+        -------
+        pending : list of str
+            The elements of `fpaths` for which `is_complete` is False, in
+            their original order.
+        """
+        return [fpath for fpath in fpaths if not self.is_complete(fpath,
+                                                                  params)]
+
+
+def _manifestkey(fpath):
+    return str(Path(fpath).resolve())
+
+
+def read_channels(rpath, filetype, signalinfo, markerinfo=None):
+    """Read the biosignal and the marker channel of a file.
+
+    Parameters
+    ----------
+    rpath : str
+        File system location of the file.
+    filetype : str
+        One of {"Custom", "OpenSignals", "EDF"}.
+    signalinfo : str or dict
+        The biosignal channel (e.g., "A1"), or the custom header in case of
+        "Custom" files.
+    markerinfo : str or dict, optional
+        The marker channel, or the custom header in case of "Custom" files. By
+        default None (do not read a marker channel). The marker channel is not
+        read either if it is "none", or if the custom header does not contain
+        a marker index.
+
+    Returns
+    -------
+    biosignal, marker : dict, dict
+        As returned by the reader corresponding to `filetype`. `marker` is None
+        if no marker channel has been read.
+    """
+    readfunc = readfuncs[filetype]
+    biosignal = readfunc(rpath, signalinfo, channeltype="signal")
+
+    marker = None
+    if biosignal["error"] or markerinfo is None or markerinfo == "none":
+        return biosignal, marker
+    if filetype == "Custom" and markerinfo["markeridx"] is None:
+        return biosignal, marker
+    marker = readfunc(rpath, markerinfo, channeltype="marker")
+
+    return biosignal, marker
+
+
+class Prefetcher:
+    """Read files ahead of their analysis on I/O threads.
+
+    The files are read in order, at most `n_ahead` files ahead of the file
+    that is currently analyzed. Additionally, a read is only started if the
+    prefetched data that has not been retrieved yet does not exceed
+    `max_bytes` afterwards (at least one file is always read ahead). The
+    memory footprint of files that are still being read is estimated by their
+    size on disk.
+
+    The reads are cancelled together with the processing that consumes them:
+    the I/O threads check the same cancellation token, and waiting for a file
+    is interrupted once the token has been cancelled (see
+    `biopeaks.cancellation`). Likewise, the I/O threads report the bytes they
+    read to the same progress tracker (see `biopeaks.progress`).
+    """
+
+    def __init__(self, fpaths, readfunc, n_ahead=2, max_bytes=2 ** 29,
+                 n_threads=2, token=None, tracker=None):
+        """Start reading the first files.
+
+        Parameters
+        ----------
+        fpaths : list of str
+            File system locations of the files in the order of analysis.
+        readfunc : function
+            Function that reads a file, taking its path as single argument.
+            The returned data is searched for ndarrays (also within dicts and
+            tuples) in order to determine its memory footprint.
+        n_ahead : int, optional
+            Maximum number of files that are read ahead. By default 2.
+        max_bytes : int, optional
+            Memory budget for prefetched data in bytes. By default 512 MiB.
+        n_threads : int, optional
+            Number of I/O threads. By default 2.
+        token : CancellationToken, optional
+            Token that cancels the reads. By default None (the token that is
+            active in the current thread, if any).
+        tracker : ProgressTracker, optional
+            Tracker that receives progress reports of the reads. By default
+            None (the tracker that is active in the current thread, if any).
+        """
+        self.readfunc = readfunc
+        self.token = current_token() if token is None else token
+        self.tracker = current_tracker() if tracker is None else tracker
+        self.n_ahead = max(n_ahead, 1)
+        self.max_bytes = max_bytes
+        self._pending = deque(fpaths)
+        self._futures = deque()    # (path, future, estimated bytes) in order of analysis
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=n_threads,
+                                            thread_name_prefix="prefetch")
+        self._schedule()
+
+    def get(self, fpath=None):
+        """Retrieve the data of the next file, waiting until it has been read.
+
+        Parameters
+        ----------
+        fpath : str, optional
+            The expected path of the next file. By default None (do not
+            check).
+
+        Returns
+        -------
+        fpath, data
+            The path of the file and the data returned by `readfunc`.
+        """
+        with self._lock:
+            if not self._futures:
+                raise LookupError("No files left to prefetch.")
+            path, future, _ = self._futures.popleft()
+        if fpath is not None and Path(fpath) != Path(path):
+            raise LookupError(f"Expected {fpath}, but next file is {path}.")
+        with stage("prefetch.wait"):
+            while not wait([future], timeout=.1).done:
+                check_cancelled()
+            data = future.result()
+        self._schedule()
+        return path, data
+
+    def __iter__(self):
+        while self._futures or self._pending:
+            yield self.get()
+
+    @property
+    def buffered_bytes(self):
+        """Memory occupied by files that have been read but not retrieved.
+
+        Files that are still being read are accounted for with their size on
+        disk.
+        """
+        with self._lock:
+            return self._buffered_bytes()
+
+    def close(self):
+        """Stop reading files and release the prefetched data."""
+        with self._lock:
+            self._pending.clear()
+            futures, self._futures = self._futures, deque()
+        for _, future, _ in futures:
+            future.cancel()
+        self._executor.shutdown(wait=False)
+
+    def _schedule(self):
+        """Start reading files as long as the limits permit."""
+        with self._lock:
+            buffered = self._buffered_bytes()
+            while self._pending and len(self._futures) < self.n_ahead:
+                estimate = filesize(self._pending[0])
+                if self._futures and buffered + estimate > self.max_bytes:
+                    break
+                path = self._pending.popleft()
+                future = self._executor.submit(self._read, path)
+                self._futures.append((path, future, estimate))
+                buffered += estimate
+
+    def _read(self, path):
+        with cancellable(self.token), tracking(self.tracker):
+            return self.readfunc(path)
+
+    def _buffered_bytes(self):
+        buffered = 0
+        for _, future, estimate in self._futures:
+            if not future.done():
+                buffered += estimate
+            elif future.exception() is None:
+                buffered += _nbytes(future.result())
+        return buffered
+
+
+def filesize(path):
+    """Size of a file in bytes, or zero if `path` is not a file."""
+    try:
+        return Path(path).stat().st_size
+    except (OSError, TypeError):
+        return 0
+
+
+def _nbytes(data):
+    """Sum up the size of all arrays contained in (nested) dicts or tuples."""
+    if isinstance(data, np.ndarray):
+        return data.nbytes
+    if isinstance(data, dict):
+        return sum(_nbytes(value) for value in data.values())
+    if isinstance(data, (tuple, list)):
+        return sum(_nbytes(value) for value in data)
+    return 0
+
+
+class BatchProcessor:
+    """Detect extrema and compute statistics for a batch of files.
+
+    The output files are named like those of the GUI's batch processing, i.e.,
+    "<file name>_stats.csv" in `wdirstats` and "<file name>_peaks.csv" in
+    `wdirpeaks`. If a marker channel is specified, the statistics of each
+    event are saved to "<file name>_events.csv" in `wdirstats` (see
+    `epochs.event_stats`). If `savebeats` is True, the features of each
+    cardiac beat are saved to "<file name>_beats.csv" next to the extrema (see
+    `beats.beat_table`). Each file is recorded in a `BatchManifest` in
+    `wdirstats`.
+
+    `run` can be cancelled from another thread with `cancel`.
+    """
+
+    def __init__(self, modality, filetype, signalinfo, wdirstats,
+                 savestats=None, wdirpeaks=None, correctpeaks=False,
+                 resume=False, cache=None, progress=None, n_ahead=2,
+                 max_prefetch_bytes=2 ** 29, n_threads=2, markerinfo=None,
+                 epochwindow=(-1., 10.), savebeats=False):
+        """Configure the processing.
+
+        Parameters
+        ----------
+        modality : str
+            One of {"ECG", "PPG", "RESP"}.
+        filetype : str
+            One of {"Custom", "OpenSignals", "EDF"}.
+        signalinfo : str or dict
+            The biosignal channel (e.g., "A1"), or the custom header in case
+            of "Custom" files.
+        wdirstats : str
+            Directory to save the statistics to.
+        savestats : list of str, optional
+            The statistics to be saved. Any of {"period", "rate",
+            "tidalamp"}. By default None (all statistics of the modality).
+        wdirpeaks : str, optional
+            Directory to save the extrema to. By default None (do not save
+            extrema).
+        correctpeaks : bool, optional
+            Auto-correct cardiac extrema. By default False.
+        resume : bool, optional
+            Skip files that the manifest in `wdirstats` lists as complete (see
+            `BatchManifest.is_complete`). By default False.
+        cache : ResultCache, optional
+            Cache for extrema and statistics. By default None (results are
+            not cached).
+        progress : function, optional
+            Called with progress events during `run` (see
+            `biopeaks.progress`). By default None.
+        n_ahead, max_prefetch_bytes, n_threads : int, optional
+            Passed on to `Prefetcher`.
+        markerinfo : str or dict, optional
+            The marker channel (e.g., "I1"), or the custom header in case of
+            "Custom" files. By default None (do not read a marker channel).
+        epochwindow : tuple of float, optional
+            Start (baseline, negative) and end (response, positive) of the
+            events' windows relative to the marker onsets in seconds. By
+            default (-1, 10).
+        savebeats : bool, optional
+            Save the features of each beat of ECG and PPG (see
+            `beats.beat_table`) to `wdirpeaks`, or to `wdirstats` if
+            `wdirpeaks` is None. By default False.
+        """
+        self.modality = modality
+        self.filetype = filetype
+        self.signalinfo = signalinfo
+        self.wdirstats = wdirstats
+        self.wdirpeaks = wdirpeaks
+        self.correctpeaks = correctpeaks
+        if savestats is None:
+            savestats = ["period", "rate"]
+            if modality == "RESP":
+                savestats.append("tidalamp")
+        self.savestats = savestats
+        self.resume = resume
+        self.cache = cache
+        self.progress = progress
+        self.n_ahead = n_ahead
+        self.max_prefetch_bytes = max_prefetch_bytes
+        self.n_threads = n_threads
+        self.markerinfo = markerinfo
+        self.epochwindow = epochwindow
+        self.savebeats = savebeats and modality != "RESP"
+        self.manifest = None
+        self._token = CancellationToken()
+
+    def cancel(self):
+        """Cancel the current (or next) call of `run`.
+
+        Thread-safe. `run` raises `Cancelled` at the next check, i.e.,
+        typically within milliseconds. Files that have been processed
+        completely are recorded in the manifest, such that the batch can be
+        resumed.
+        """
+        self._token.cancel()
+
+    @property
+    def params(self):
+        """dict: The parameters of the batch (see `batch_params`)."""
+        return batch_params(self.modality, self.filetype, self.signalinfo,
+                            self.savestats, self.correctpeaks, self.wdirpeaks,
+                            self.markerinfo, self.epochwindow,
+                            self.savebeats)
+
+    def run(self, fpaths):
+        """Process files.
+
+        Parameters
+        ----------
+        fpaths : list of str
+            File system locations of the files.
+
+        Returns
+        -------
+        results : list of dict
+            One entry per file, containing the path of the file ("fpath"),
+            any error that occurred ("error"), the paths of the output files
+            ("wpathstats", "wpathpeaks", "wpathevents", "wpathbeats"), and
+            whether the file has been
+            skipped since it had already been processed ("skipped").
+
+        Raises
+        ------
+        Cancelled
+            If `cancel` has been called.
+        """
+        token = self._token
+        try:
+            with cancellable(token):
+                return self._run(fpaths)
+        finally:
+            if token.cancelled:    # allow for running again
+                self._token = CancellationToken()
+
+    def _run(self, fpaths):
+        self.manifest = BatchManifest(self.wdirstats)
+        params = self.params
+        pending = fpaths
+        if self.resume:
+            pending = self.manifest.pending(fpaths, params)
+
+        tracker = None
+        if self.progress is not None:
+            sizes = {fpath: filesize(fpath) for fpath in pending}
+            tracker = ProgressTracker(files_total=len(pending),
+                                      bytes_total=sum(sizes.values()),
+                                      callback=self.progress)
+
+        processed = {}
+        with tracking(tracker):
+            prefetcher = Prefetcher(pending, self._read_and_fingerprint,
+                                    n_ahead=self.n_ahead,
+                                    max_bytes=self.max_prefetch_bytes,
+                                    n_threads=self.n_threads)
+            try:
+                for fpath, (channels, fprint) in prefetcher:
+                    check_cancelled()
+                    if tracker is not None:
+                        tracker.start_file(sizes[fpath])
+                    result = self.process(fpath, *channels)
+                    self._record(result, params, fprint)
+                    processed[fpath] = result
+                    if tracker is not None:
+                        tracker.finish_file()
+            finally:
+                prefetcher.close()
+
+        results = []
+        for fpath in fpaths:
+            result = processed.get(fpath)
+            if result is None:
+                result = self._result(fpath)
+                result["skipped"] = True
+            results.append(result)
+
+        return results
+
+    def read(self, fpath):
+        """Read the biosignal and the marker channel (if any) of a file."""
+        return read_channels(fpath, self.filetype, self.signalinfo,
+                             self.markerinfo)
+
+    def process(self, fpath, biosignal, marker=None):
+        """Process the biosignal of a single file.
+
+        Parameters
+        ----------
+        fpath : str
+            File system location of the file.
+        biosignal, marker : dict
+            As returned by `read`. By default, `marker` is None (no marker
+            channel).
+
+        Returns
+        -------
+        result : dict
+            See `run`.
+        """
+        result = {"fpath": str(fpath), "error": False, "wpathstats": None,
+                  "wpathpeaks": None, "wpathevents": None, "wpathbeats": None,
+                  "skipped": False}
+        if biosignal["error"]:
+            result["error"] = biosignal["error"]
+            return result
+        if marker is not None and marker["error"]:
+            result["error"] = marker["error"]
+            return result
+
+        signal = biosignal["signal"]
+        sfreq = biosignal["sfreq"]
+        kwargs = {"return_segments": True} if self.savebeats else {}    # segments of the beats are re-used for the beat features
+        if self.cache is not None:
+            peaks = self.cache.detect(signal, sfreq, self.modality, **kwargs)
+        else:
+            peaks = peakfuncs[self.modality](signal, sfreq, **kwargs)
+        if self.savebeats:
+            peaks, segments = peaks
+        if np.size(peaks) < 2:
+            result["error"] = "Error: no peaks available."
+            return result
+        if self.correctpeaks and self.modality != "RESP":
+            if self.cache is not None:
+                peaks = self.cache.correct(peaks, sfreq)
+            else:
+                peaks = correct_peaks(peaks, sfreq)
+
+        if self.cache is not None:
+            stats = self.cache.stats(peaks, signal, sfreq, self.modality)
+        elif self.modality == "RESP":
+            period, rate, tidalamp = resp_stats(peaks, signal, sfreq)
+            stats = {"period": period, "rate": rate, "tidalamp": tidalamp}
+        else:
+            period, rate = heart_stats(peaks, sfreq, signal.size)
+            stats = {"period": period, "rate": rate}
+
+        result.update(self._result(fpath))
+        stats = {key: stats[key] for key in self.savestats if key in stats}
+        write_stats(result["wpathstats"], stats)
+        if self.wdirpeaks:
+            write_peaks(result["wpathpeaks"], peaks, sfreq, self.modality,
+                        signal=signal)
+        if self.savebeats:
+            beats = beat_table(signal, peaks, sfreq, self.modality,
+                               segments=segments)
+            beats.to_csv(result["wpathbeats"], index=False,
+                         float_format="%.4f")
+        if marker is None:    # e.g., custom header without marker index
+            result["wpathevents"] = None
+        else:
+            onsets = marker_onsets(marker["signal"], sfreq=sfreq,
+                                   sfreqmarker=marker["sfreq"])    # marker sfreq only differs in case of EDF
+            tmin, tmax = self.epochwindow
+            events = event_stats(stats, onsets, sfreq, tmin=tmin, tmax=tmax)
+            events.to_csv(result["wpathevents"], index=False,
+                          float_format="%.4f")
+
+        return result
+
+    def _result(self, fpath):
+        """Compose the result of a successfully processed file."""
+        fname = Path(fpath).stem
+        result = {"fpath": str(fpath), "error": False, "skipped": False,
+                  "wpathstats": Path(self.wdirstats).joinpath(f"{fname}_stats.csv"),
+                  "wpathpeaks": None, "wpathevents": None, "wpathbeats": None}
+        if self.wdirpeaks:
+            result["wpathpeaks"] = Path(self.wdirpeaks).joinpath(f"{fname}_peaks.csv")
+        if self.markerinfo is not None:
+            result["wpathevents"] = Path(self.wdirstats).joinpath(f"{fname}_events.csv")
+        if self.savebeats:
+            wdirbeats = self.wdirpeaks if self.wdirpeaks else self.wdirstats
+            result["wpathbeats"] = Path(wdirbeats).joinpath(f"{fname}_beats.csv")
+        return result
+
+    def _read_and_fingerprint(self, fpath):
+        return read_and_fingerprint(self.read, fpath)
+
+    def _record(self, result, params, fprint):
+        if result["error"]:
+            if fprint is not None:    # files that cannot be found are not recorded
+                self.manifest.record(result["fpath"], params, status="error",
+                                     error=result["error"], fprint=fprint)
+            return
+        outputs = [result["wpathstats"]]
+        for key in ["wpathpeaks", "wpathevents", "wpathbeats"]:
+            if result[key] is not None:
+                outputs.append(result[key])
+        self.manifest.record(result["fpath"], params, outputs=outputs,
+                             fprint=fprint)
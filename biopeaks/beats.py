@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""Features of individual cardiac beats.
+
+`beat_table` computes the features of all beats of an ECG or PPG at once. The
+features that refer to the QRS complex (ECG) or wave (PPG) of a beat re-use
+the segments that the detector found the peak in (see the `return_segments`
+argument of `heart.ecg_peaks` and `heart.ppg_peaks`). Reductions over the
+samples of each beat (e.g., the minimum of each QRS complex) are computed
+with `np.minimum.reduceat` and friends over the concatenated samples of all
+beats, rather than with a loop over beats.
+
+`beat_windows` gathers the samples around all peaks into a matrix (a beat per
+row) from a strided view of the signal. The matrix is the basis for ensemble
+templates of the beats' morphology (`beat_template`) and the correlation of
+each beat with a template (`template_correlation`), e.g., for the quality
+control of long recordings.
+
+Examples
+--------
+>>> peaks, segments = ecg_peaks(signal, sfreq, return_segments=True)
+>>> beats = beat_table(signal, peaks, sfreq, "ECG", segments=segments)
+>>> beats[["time", "amplitude", "qrs_width"]]
+
+>>> windows, peaks = beat_windows(signal, peaks, sfreq, dtype=np.float32)
+>>> template = beat_template(windows)
+>>> outliers = peaks[template_correlation(windows, template) < .8]
+"""
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def beat_table(signal, peaks, sfreq, modality, segments=None):
+    """Compute features of each beat.
+
+    Parameters
+    ----------
+    signal : ndarray
+        The ECG or PPG signal.
+    peaks : ndarray
+        The R-peaks or systolic peaks in samples of `signal`.
+    sfreq : int
+        Sampling frequency of `signal`.
+    modality : str
+        One of {"ECG", "PPG"}.
+    segments : ndarray, optional
+        The first and last + 1 sample of the QRS complexes (ECG) or waves
+        (PPG), one segment per row, as returned by the detector. Default is
+        None (features of segments are NaN). Features of segments are also
+        NaN for peaks that are not contained in any segment (e.g., peaks that
+        have been corrected or edited).
+
+    Returns
+    -------
+    beats : DataFrame
+        A row per peak, containing the "peak" (sample), "time" (seconds),
+        "amplitude" (`signal` at the peak), and "interval" to the preceding
+        peak (ms, NaN for the first peak) of each beat. For ECG, the width
+        ("qrs_width", ms) and peak-to-peak amplitude ("qrs_amplitude") of
+        the QRS complex. For PPG, the minimum between the preceding and the
+        current peak ("foot_amplitude"), the "pulse_amplitude" (i.e.,
+        "amplitude" minus "foot_amplitude"), the "rise_time" from the foot
+        to the peak (ms), and the width of the wave ("wave_width", ms).
+        Features are computed in double precision. NaN samples of `signal`
+        are ignored by the QRS amplitude and the foot (which are NaN if all
+        samples of the QRS complex or pulse are NaN).
+    """
+    if modality not in ["ECG", "PPG"]:
+        raise ValueError(f"Modality must be 'ECG' or 'PPG', got {modality}.")
+    signal = np.asarray(signal)
+    peaks = np.unique(np.asarray(peaks, dtype=int))
+    interval = np.full(peaks.size, np.nan)
+    interval[1:] = np.diff(peaks) * 1000 / sfreq
+    beats = pd.DataFrame({"peak": peaks, "time": peaks / sfreq,
+                          "amplitude": signal[peaks].astype(float),
+                          "interval": interval})
+    if not peaks.size:
+        return beats.reindex(columns=list(beats.columns) +
+                             _segment_features[modality])
+
+    begs, ends = _match_segments(peaks, segments)
+    matched = begs >= 0
+    width = np.full(peaks.size, np.nan)
+    width[matched] = (ends - begs)[matched] * 1000 / sfreq
+
+    if modality == "ECG":
+        qrsamplitude = np.full(peaks.size, np.nan)
+        if matched.any():
+            lows, _, highs = _window_extrema(signal, begs[matched],
+                                             ends[matched])
+            qrsamplitude[matched] = highs - lows
+        beats["qrs_width"] = width
+        beats["qrs_amplitude"] = qrsamplitude
+    else:
+        # The foot of a pulse is the minimum between the preceding and the
+        # current peak.
+        feet, footsamples, _ = _window_extrema(signal, np.r_[0, peaks[:-1]],
+                                               peaks + 1)
+        beats["foot_amplitude"] = feet
+        beats["pulse_amplitude"] = beats["amplitude"] - beats["foot_amplitude"]
+        beats["rise_time"] = np.where(footsamples >= 0, peaks - footsamples,
+                                      np.nan) * 1000 / sfreq
+        beats["wave_width"] = width
+
+    return beats
+
+
+def beat_windows(signal, peaks, sfreq, before=.2, after=.4, dtype=None):
+    """Extract the samples around each peak.
+
+    Parameters
+    ----------
+    signal : ndarray
+        The ECG or PPG signal.
+    peaks : ndarray
+        The R-peaks or systolic peaks in samples of `signal`.
+    sfreq : int
+        Sampling frequency of `signal`.
+    before, after : float, optional
+        Extent of the windows before and after the peaks in seconds. Defaults
+        are .2 and .4.
+    dtype : data-type, optional
+        Data type of the windows. Pass np.float32 in order to halve the memory
+        footprint for long recordings. The samples are converted while they
+        are gathered (i.e., without a full-size intermediate copy). Default is
+        None (the dtype of `signal`).
+
+    Returns
+    -------
+    windows : ndarray
+        The windows, a beat per row (n_beats x n_samples). Column `i`
+        corresponds to `i / sfreq - before` seconds relative to the peak.
+    peaks : ndarray
+        The peaks of the beats in `windows`. Peaks whose window extends
+        beyond `signal` are discarded.
+    """
+    signal = np.asarray(signal)
+    peaks = np.asarray(peaks, dtype=int)
+    first = int(np.rint(before * sfreq))
+    nsamp = first + int(np.rint(after * sfreq)) + 1    # including the peak
+    starts = peaks - first
+    valid = (starts >= 0) & (starts + nsamp <= signal.size)
+    peaks = peaks[valid]
+    starts = starts[valid]
+    if dtype is None or np.dtype(dtype) == signal.dtype:
+        if not peaks.size:
+            return np.empty((0, nsamp), dtype=signal.dtype), peaks
+        return sliding_window_view(signal, nsamp)[starts], peaks
+    # Convert block by block, such that the temporary copies in the dtype of
+    # the signal are small.
+    windows = np.empty((peaks.size, nsamp), dtype=dtype)
+    if peaks.size:
+        view = sliding_window_view(signal, nsamp)    # zero-copy, a window per sample
+        blocksize = max(2 ** 20 // nsamp, 1)
+        for i in range(0, peaks.size, blocksize):
+            windows[i:i + blocksize] = view[starts[i:i + blocksize]]
+    return windows, peaks
+
+
+def beat_template(windows, method="median"):
+    """Compute the ensemble template of the beats.
+
+    Parameters
+    ----------
+    windows : ndarray
+        The windows of the beats (n_beats x n_samples), see `beat_windows`.
+    method : str, optional
+        One of {"median", "mean"}. The median is robust to outlying beats
+        (e.g., artifacts). Default is "median".
+
+    Returns
+    -------
+    template : ndarray
+        The template (n_samples).
+    """
+    if method == "median":
+        return np.median(windows, axis=0)
+    if method == "mean":
+        return np.mean(windows, axis=0)
+    raise ValueError(f"Method must be 'median' or 'mean', got {method}.")
+
+
+def template_correlation(windows, template):
+    """Correlate each beat with a template.
+
+    Parameters
+    ----------
+    windows : ndarray
+        The windows of the beats (n_beats x n_samples), see `beat_windows`.
+    template : ndarray
+        The template (n_samples), see `beat_template`.
+
+    Returns
+    -------
+    r : ndarray
+        The Pearson correlation of each beat with `template`. NaN for beats
+        (or templates) without variance.
+    """
+    template = np.asarray(template, dtype=float)
+    template = template - template.mean()
+    r = np.empty(windows.shape[0])
+    blocksize = max(2 ** 20 // max(windows.shape[1], 1), 1)    # limit the size of the centered copies
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for i in range(0, windows.shape[0], blocksize):
+            block = windows[i:i + blocksize].astype(float)
+            block -= block.mean(axis=1, keepdims=True)
+            r[i:i + blocksize] = (block @ template /
+                                  (np.linalg.norm(block, axis=1) *
+                                   np.linalg.norm(template)))
+    return r
+
+
+_segment_features = {"ECG": ["qrs_width", "qrs_amplitude"],
+                     "PPG": ["foot_amplitude", "pulse_amplitude", "rise_time",
+                             "wave_width"]}
+
+
+def _match_segments(peaks, segments):
+    """Find the segment that contains each peak.
+
+    Returns the first and last + 1 sample of the segment of each peak, or -1
+    for peaks that aren't contained in any segment.
+    """
+    begs = np.full(peaks.size, -1)
+    ends = np.full(peaks.size, -1)
+    if segments is None or not np.size(segments):
+        return begs, ends
+    segments = np.asarray(segments, dtype=int).reshape(-1, 2)
+    segments = segments[np.argsort(segments[:, 0], kind="stable")]
+    idcs = np.searchsorted(segments[:, 0], peaks, side="right") - 1
+    contained = idcs >= 0
+    contained[contained] = peaks[contained] < segments[idcs[contained], 1]
+    begs[contained] = segments[idcs[contained], 0]
+    ends[contained] = segments[idcs[contained], 1]
+    return begs, ends
+
+
+def _window_extrema(signal, begs, ends):
+    """Compute the minimum, its sample, and the maximum of `signal` in each
+    window [begs, ends).
+
+    The windows must not be empty. The samples of all windows are gathered
+    into a single vector of doubles (such that differences of the extrema of
+    integer signals don't overflow), which is reduced at the window
+    boundaries. NaN samples are ignored. The extrema of windows that contain
+    only NaN are NaN and their sample is -1.
+    """
+    lengths = ends - begs
+    offsets = np.r_[0, np.cumsum(lengths)[:-1]]    # start of each window in the gathered samples
+    idcs = np.repeat(begs - offsets, lengths) + np.arange(lengths.sum())
+    samples = signal[idcs].astype(float)
+    lows = np.fmin.reduceat(samples, offsets)
+    highs = np.fmax.reduceat(samples, offsets)
+    # First sample of each window that equals the window's minimum.
+    islow, = np.nonzero(samples == np.repeat(lows, lengths))
+    window = np.repeat(np.arange(begs.size), lengths)[islow]
+    windows, first = np.unique(window, return_index=True)
+    argmin = np.full(begs.size, -1)
+    argmin[windows] = idcs[islow[first]]
+    return lows, argmin, highs
@@ -4,24 +4,82 @@
 Stream the ECG and annotation files from the Glasgow University Database (GUDB),
 hosted at https://berndporr.github.io/ECG-GUDB/experiment_data. You can specify
 `condition`, `channel`, `annotation`, and `tolerance` before running the script.
+
+Instead of the official GUDB server, the records can be streamed from any
+server that mirrors the GUDB directory tree (e.g., the local stand-in in
+`gudb_mirror.py`) or read from a local copy of the GUDB. Specify `base_url`
+accordingly. Set `cache_dir` in order to keep a copy of every streamed file on
+disk, such that repeated benchmark runs don't download the records again. The
+cache is namespaced by `base_url`, such that records from different sources
+(e.g., the synthetic records of `gudb_mirror.py` and the official GUDB) are
+never mixed up.
+
+Scoring and timing the detector is CPU-bound. It is therefore executed in a pool
+of worker processes, such that downloading and scoring overlap, and multiple
+records are scored concurrently.
 """
 
 from biopeaks.heart import ecg_peaks
 import asyncio
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from io import StringIO
-from timeit import default_timer as timer
+from pathlib import Path
+from time import process_time
 import aiohttp
 import numpy as np
 from wfdb.processing import compare_annotations
 
 
+GUDB_URL = "https://berndporr.github.io/ECG-GUDB/experiment_data"
+
+
+def _score_record(detector, record, annotation, sfreq, tolerance):
+    """Score a detector on a record. Executed in a worker process."""
+    detector_annotation = detector(record, sfreq)
+
+    comparitor = compare_annotations(annotation, detector_annotation,
+                                     tolerance)
+    tp = comparitor.tp
+    fp = comparitor.fp
+    fn = comparitor.fn
+    sensitivity = tp / (tp + fn)
+    precision = tp / (tp + fp)
+
+    return precision, sensitivity
+
+
+def _time_record(detector, record, sfreq, n_runs):
+    """Time a detector on a record. Executed in a worker process.
+
+    The CPU time of the worker process is measured (as opposed to wall-clock
+    time), such that the timing of a record isn't inflated by the records that
+    are processed concurrently in other worker processes.
+    """
+    start = process_time()
+
+    for _ in range(n_runs):
+        detector(record, sfreq)
+
+    end = process_time()
+    avg_time = (end - start) / n_runs * 1000
+
+    return avg_time
+
+
 class BenchmarkDetectorGUDB:
     """Evaluate an ECG R-peak detector on datasets from the GUDB database."""
 
     channels = {"cs_V2_V1": 0, "einthoven_II": 1, "einthoven_III": 2}
-    base_url = "https://berndporr.github.io/ECG-GUDB/experiment_data/subject_"
+    experiments = ["sitting", "maths", "walking", "hand_bike", "jogging"]
+    annotations = ["annotation_cs", "annotation_cables"]
+    n_subjects = 25
 
-    def __init__(self, detector, tolerance, sfreq=250, n_runs=100):
+    def __init__(self, detector, tolerance, sfreq=250, n_runs=100,
+                 base_url=GUDB_URL, cache_dir=None, n_workers=None,
+                 queue_size=4):
         """Configure benchmarking for a detector.
 
         Parameters
@@ -30,7 +88,8 @@ class BenchmarkDetectorGUDB:
             A function that takes a vector containing a physiological record
             as first positional argument and an integer sampling rate as second
             positional argument. Must return a vector containing the detected
-            extrema.
+            extrema. Must be picklable (i.e., defined at the top level of a
+            module), since it is executed in worker processes.
         tolerance : int
             Maximum difference in samples that is permitted between the manual
             annotation and the annotation generated by the detector.
@@ -39,11 +98,41 @@ class BenchmarkDetectorGUDB:
         n_runs : int, optional
             The number of runs used for obtaining the average run time of the
             detector. The default is 100.
+        base_url : str or Path, optional
+            Location of the "experiment_data" directory of the GUDB. Either a
+            URL (starting with "http://" or "https://") or a local directory.
+            The default is the official GUDB server.
+        cache_dir : str or Path, optional
+            Directory in which streamed files are stored for re-use in
+            subsequent runs. Files are only downloaded if they are not in
+            `cache_dir` already. Files are stored in a sub-directory named
+            after a hash of `base_url`. The default is None (no caching).
+        n_workers : int, optional
+            The number of worker processes that score and time the detector
+            concurrently. The default is None (number of processors on the
+            machine).
+        queue_size : int, optional
+            The maximum number of fetched records that wait to be scored. Once
+            the queue is full, fetching pauses until a worker process becomes
+            available. The default is 4.
         """
         self.detector = detector
         self.tolerance = tolerance
         self.sfreq = sfreq
         self.n_runs = n_runs
+        self.remote = str(base_url).startswith(("http://", "https://"))
+        self.base_url = (str(base_url).rstrip("/") if self.remote
+                         else Path(base_url))
+        self.cache_dir = None
+        if cache_dir is not None:
+            source = str(self.base_url if self.remote
+                         else self.base_url.resolve())
+            namespace = hashlib.blake2b(source.encode(),
+                                        digest_size=8).hexdigest()
+            self.cache_dir = Path(cache_dir).joinpath(namespace)
+        self.n_workers = n_workers if n_workers is not None else os.cpu_count()
+        self.queue_size = queue_size
+        self.executor = None
         self.session = None
         self.queue = None
         self.channel = None
@@ -67,15 +156,10 @@ class BenchmarkDetectorGUDB:
         sensitivity : float
             The detectors sensitivity on the record given the tolerance.
         """
-        detector_annotation = self.detector(record, self.sfreq)
-
-        comparitor = compare_annotations(annotation, detector_annotation,
-                                         self.tolerance)
-        tp = comparitor.tp
-        fp = comparitor.fp
-        fn = comparitor.fn
-        sensitivity = tp / (tp + fn)
-        precision = tp / (tp + fp)
+        loop = asyncio.get_running_loop()
+        precision, sensitivity = await loop.run_in_executor(
+            self.executor, partial(_score_record, self.detector, record,
+                                   annotation, self.sfreq, self.tolerance))
 
         return precision, sensitivity
 
@@ -90,21 +174,60 @@ class BenchmarkDetectorGUDB:
         Returns
         -------
         avg_time : int
-            The run time of the detector on the record averaged over n_runs. In
+            The CPU time of the detector on the record averaged over n_runs. In
             milliseconds.
         """
-        start = timer()
+        loop = asyncio.get_running_loop()
+        avg_time = await loop.run_in_executor(
+            self.executor, partial(_time_record, self.detector, record,
+                                   self.sfreq, self.n_runs))
 
-        for _ in range(self.n_runs):
-            self.detector(record, self.sfreq)
+        return avg_time
 
-        end = timer()
-        avg_time = (end - start) / self.n_runs * 1000
+    async def fetch_file(self, url):
+        """Get the content of a single file from the GUDB.
 
-        return avg_time
+        Look up the file in the cache first. Otherwise, read it from the local
+        GUDB directory or request it from the GUDB server, and store it in the
+        cache.
+
+        Parameters
+        ----------
+        url : str
+            Location of the file relative to `base_url`. E.g.,
+            "subject_00/maths/ECG.tsv".
+
+        Returns
+        -------
+        content : str or None
+            The content of the file. None if the file is not available.
+        """
+        if self.cache_dir is not None:
+            cached = self.cache_dir.joinpath(url)
+            if cached.exists():
+                return cached.read_text()
+
+        if self.remote:
+            async with self.session.get(f"{self.base_url}/{url}") as response:
+                if response.status != 200:
+                    return None
+                content = await response.text()
+        else:
+            path = self.base_url.joinpath(url)
+            if not path.exists():
+                return None
+            content = path.read_text()
+
+        if self.cache_dir is not None:    # write atomically, such that an interrupted run doesn't leave a truncated file in the cache
+            cached.parent.mkdir(parents=True, exist_ok=True)
+            tmppath = cached.with_name(f"{cached.name}.{os.getpid()}.part")
+            tmppath.write_text(content)
+            os.replace(tmppath, cached)
+
+        return content
 
     async def fetch_record(self, url):
-        """Get a record from the GUDB server.
+        """Get a record from the GUDB.
 
         Fetch the raw physiological data and the corresponding annotation,
         format them, and put them on a queue for further processing.
@@ -112,61 +235,79 @@ class BenchmarkDetectorGUDB:
         Parameters
         ----------
         url : str
-            An experiment directory of the GUDB. The URL must end with the
-            experiment ID. E.g., "URL/maths". The experiment ID can be one of
-            {"maths", "hand_bike", "jogging", "walking", "sitting"}.
+            An experiment directory of the GUDB, relative to `base_url`. The
+            URL must end with the experiment ID. E.g., "subject_00/maths". The
+            experiment ID can be one of {"maths", "hand_bike", "jogging",
+            "walking", "sitting"}.
         """
         print(f"fetching {url}")
-        async with self.session.get(url + "/ECG.tsv") as response:
-            if response.status == 200:
-                physio = await response.text()
-                physio = np.loadtxt(StringIO(physio))
-                physio = np.ravel(physio[:, self.channel])
-            else:
-                physio = None
-        async with self.session.get(url + f"/{self.annotation}.tsv") as response:
-            if response.status == 200:
-                annotation = await response.text()
-                annotation = np.loadtxt(StringIO(annotation))
-                annotation = np.ravel(annotation)
-            else:
-                annotation = None
+        physio = await self.fetch_file(f"{url}/ECG.tsv")
+        if physio is not None:
+            physio = np.loadtxt(StringIO(physio))
+            physio = np.ravel(physio[:, self.channel])
+        annotation = await self.fetch_file(f"{url}/{self.annotation}.tsv")
+        if annotation is not None:
+            annotation = np.loadtxt(StringIO(annotation))
+            annotation = np.ravel(annotation)
         await self.queue.put((physio, annotation, url))
 
+    async def evaluate_record(self, physio, annotation, url, results):
+        """Score and time the detector on a single record.
+
+        Scoring and timing are submitted to the worker processes
+        concurrently.
+        """
+        (precision, sensitivity), avg_time = await asyncio.gather(
+            self.score_record(physio, annotation), self.time_record(physio))
+
+        results["precisions"].append(precision)
+        results["sensitivities"].append(sensitivity)
+        results["avg_times"].append(avg_time)
+
+        print(f"\nResults {url}")
+        print("-" * len(url))
+        print(f"sensitivity = {sensitivity}")
+        print(f"precision = {precision}")
+        print(f"average run time over {self.n_runs} runs = {avg_time}")
+
     async def benchmark_record(self):
-        """Evaluate the performance of the detector on a single record."""
-        n = 0
+        """Evaluate the performance of the detector on all fetched records.
+
+        Take records from the queue as soon as they are fetched and evaluate
+        them concurrently, with at most `n_workers` records being evaluated at
+        any time.
+        """
         n_records = len(self.urls)
-        sensitivities = []
-        precisions = []
-        avg_times = []
+        n_concurrent = asyncio.Semaphore(self.n_workers)
+        results = {"sensitivities": [], "precisions": [], "avg_times": []}
+        evaluations = []
 
-        while n < n_records:
+        async def evaluate(physio, annotation, url):
+            try:
+                await self.evaluate_record(physio, annotation, url, results)
+            finally:
+                n_concurrent.release()
 
+        for _ in range(n_records):
+
+            await n_concurrent.acquire()    # wait for a worker to become available, such that the queue exerts backpressure on fetching
             physio, annotation, url = await self.queue.get()    # wait for a record to be added to the queue
 
-            skip_record = physio is None
-            skip_record = annotation is None
+            skip_record = physio is None or annotation is None
 
             if skip_record:
                 print(f"\nSkipping benchmarking of {url}: missing files.")
-                n += 1
+                n_concurrent.release()
                 continue
 
-            precision, sensitivity = await self.score_record(physio, annotation)
-            avg_time = await self.time_record(physio)
-
-            precisions.append(precision)
-            sensitivities.append(sensitivity)
-            avg_times.append(avg_time)
+            evaluations.append(asyncio.create_task(evaluate(physio, annotation,
+                                                            url)))
 
-            n += 1
+        await asyncio.gather(*evaluations)
 
-            print(f"\nResults {url}")
-            print("-" * len(url))
-            print(f"sensitivity = {sensitivity}")
-            print(f"precision = {precision}")
-            print(f"average run time over {self.n_runs} runs = {avg_time}")
+        sensitivities = results["sensitivities"]
+        precisions = results["precisions"]
+        avg_times = results["avg_times"]
 
         print(f"\nAverage results over {len(precisions)} records")
         print("-" * 31)
@@ -185,13 +326,18 @@ class BenchmarkDetectorGUDB:
 
     async def _benchmark_records(self):
         """Evaluate the performance of the detector on a set of records."""
-        self.session = aiohttp.ClientSession()
-        self.queue = asyncio.Queue()
+        if self.remote:
+            self.session = aiohttp.ClientSession()
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
         fetch_coro = [self.fetch_record(url) for url in self.urls]
         benchmark_coro = self.benchmark_record()
 
-        await asyncio.gather(*fetch_coro, benchmark_coro)
-        await self.session.close()
+        with ProcessPoolExecutor(max_workers=self.n_workers) as self.executor:
+            await asyncio.gather(*fetch_coro, benchmark_coro)
+        self.executor = None
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
 
     def benchmark_records(self, experiment, channel="einthoven_II",
                           annotation="annotation_cables"):
@@ -213,15 +359,16 @@ class BenchmarkDetectorGUDB:
             {"annotation_cs", "annotation_cables"}. The default is
             "annotation_cables".
         """
-        if experiment not in ["sitting", "maths", "walking", "hand_bike", "jogging"]:
+        if experiment not in self.experiments:
             raise ValueError(f"{experiment} is not a valid experiment.")
         if channel not in self.channels.keys():
             raise ValueError(f"{channel} is not a valid channel")
-        if annotation not in ["annotation_cs", "annotation_cables"]:
+        if annotation not in self.annotations:
             raise ValueError(f"{annotation} is not a valid annotation")
         self.channel = self.channels[channel]
         self.annotation = annotation
-        self.urls = [f"{self.base_url}{str(i).zfill(2)}/{experiment}/" for i in range(25)]
+        self.urls = [f"subject_{str(i).zfill(2)}/{experiment}"
+                     for i in range(self.n_subjects)]
         asyncio.run(self._benchmark_records())
 
 
@@ -231,6 +378,9 @@ if __name__ == "__main__":
     channel = "einthoven_II"    # one of {"cs_V2_V1", "einthoven_II", "einthoven_III"}
     annotation = "annotation_cables"    # one of {"annotation_cables", "annotation_cs"}
     tolerance = 1    # in samples
+    base_url = GUDB_URL    # or the URL of a mirror (see gudb_mirror.py), or a local "experiment_data" directory
+    cache_dir = None    # e.g., Path.home().joinpath(".cache", "biopeaks", "gudb") to re-use downloaded records
 
-    pipeline = BenchmarkDetectorGUDB(ecg_peaks, tolerance)
+    pipeline = BenchmarkDetectorGUDB(ecg_peaks, tolerance, base_url=base_url,
+                                     cache_dir=cache_dir)
     pipeline.benchmark_records(condition, channel=channel, annotation=annotation)
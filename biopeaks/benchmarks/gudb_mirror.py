@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""Serve a GUDB-shaped directory tree over HTTP.
+
+Local stand-in for the Glasgow University Database (GUDB) server, that allows
+for running `benchmark_ECG_stream` without network access. Serves any
+directory that is organized like the GUDB "experiment_data" directory, i.e.,
+
+    experiment_data/subject_XX/<experiment>/ECG.tsv
+    experiment_data/subject_XX/<experiment>/annotation_cables.tsv
+    experiment_data/subject_XX/<experiment>/annotation_cs.tsv
+
+If you don't have a local copy of the GUDB, a synthetic directory tree with the
+same layout can be generated with `make_synthetic_gudb` (or with the
+`--synthetic` command line flag). The synthetic records are not suitable for
+assessing the detector's accuracy, but they allow for exercising and timing the
+fetching and scoring pipeline.
+
+Run from the command line with
+
+    python gudb_mirror.py --root <experiment_data directory> [--synthetic]
+
+and pass the printed URL as `base_url` to `BenchmarkDetectorGUDB`.
+"""
+
+import argparse
+import threading
+import numpy as np
+from contextlib import contextmanager
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from pathlib import Path
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    """Serve files without logging every request to stderr."""
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_synthetic_gudb(root, n_subjects=25,
+                        experiments=("sitting", "maths", "walking",
+                                     "hand_bike", "jogging"),
+                        duration=120, sfreq=250, seed=42):
+    """Generate a synthetic GUDB-shaped directory tree.
+
+    Each record consists of three ECG channels (mimicking "cs_V2_V1",
+    "einthoven_II", and "einthoven_III") containing Gaussian QRS-like
+    deflections on a noisy baseline. The samples of the deflections are written
+    to both annotation files.
+
+    Parameters
+    ----------
+    root : str or Path
+        The directory that takes the role of the GUDB "experiment_data"
+        directory. Created if it doesn't exist.
+    n_subjects : int, optional
+        Number of subjects. Default is 25.
+    experiments : tuple of str, optional
+        The experiments generated for each subject. Default are all five GUDB
+        experiments.
+    duration : float, optional
+        Duration of each record in seconds. Default is 120.
+    sfreq : int, optional
+        Sampling frequency of the records. Default is 250.
+    seed : int, optional
+        Seed of the random number generator. Default is 42.
+    """
+    root = Path(root)
+    rng = np.random.default_rng(seed)
+    nsamp = int(duration * sfreq)
+    kernel_width = int(np.rint(.1 * sfreq))
+    kernel_time = np.arange(-kernel_width, kernel_width + 1)
+    kernel = np.exp(-.5 * (kernel_time / (.01 * sfreq)) ** 2)    # QRS-like Gaussian deflection of roughly 40 msec
+
+    for subject in range(n_subjects):
+        for experiment in experiments:
+
+            rr = rng.normal(.8, .05, size=int(duration / .6)) * sfreq
+            peaks = np.cumsum(np.rint(rr)).astype(int)
+            peaks = peaks[peaks < nsamp - kernel_width]
+            impulses = np.zeros(nsamp)
+            impulses[peaks] = 1
+            qrs = np.convolve(impulses, kernel, mode="same")
+            ecg = np.column_stack([gain * qrs + rng.normal(0, .02, nsamp)
+                                   for gain in (1, .8, .6)])
+
+            recorddir = root.joinpath(f"subject_{str(subject).zfill(2)}",
+                                      experiment)
+            recorddir.mkdir(parents=True, exist_ok=True)
+            np.savetxt(recorddir.joinpath("ECG.tsv"), ecg, fmt="%.5f",
+                       delimiter=" ")
+            for annotation in ("annotation_cables", "annotation_cs"):
+                np.savetxt(recorddir.joinpath(f"{annotation}.tsv"), peaks,
+                           fmt="%d")
+
+
+@contextmanager
+def serve_gudb(root, host="127.0.0.1", port=0):
+    """Serve a GUDB-shaped directory tree in a background thread.
+
+    Parameters
+    ----------
+    root : str or Path
+        The directory that takes the role of the GUDB "experiment_data"
+        directory.
+    host : str, optional
+        The interface the server binds to. Default is "127.0.0.1".
+    port : int, optional
+        The port the server listens on. Default is 0 (pick any free port).
+
+    Yields
+    ------
+    base_url : str
+        The URL of the served directory, to be passed as `base_url` to
+        `BenchmarkDetectorGUDB`.
+    """
+    handler = partial(_QuietHandler, directory=str(root))
+    server = ThreadingHTTPServer((host, port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://{host}:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Serve a GUDB-shaped"
+                                     " directory tree over HTTP.")
+    parser.add_argument("--root", required=True,
+                        help="the GUDB 'experiment_data' directory")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--synthetic", action="store_true",
+                        help="populate ROOT with synthetic records first")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        make_synthetic_gudb(args.root)
+
+    with serve_gudb(args.root, port=args.port) as base_url:
+        print(f"Serving {args.root} at {base_url}. Press Ctrl+C to stop.")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
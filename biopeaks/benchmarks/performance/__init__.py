@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+"""Track the run time and memory usage of biopeaks across versions.
+
+Time and memory-profile the detectors, the artifact correction, the statistics,
+and the EDF reader and writer on fixed synthetic inputs of several sizes. The
+results of a run are stored as JSON, keyed by the git commit of the
+biopeaks checkout. Runs of two commits can then be compared in order to flag
+regressions.
+
+Run the suite from the root of the repository with
+
+    python -m biopeaks.benchmarks.performance run
+
+and compare two stored runs with
+
+    python -m biopeaks.benchmarks.performance compare <commit> <commit>
+"""
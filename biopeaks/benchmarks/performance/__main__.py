@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""Command line interface of the performance suite."""
+
+import argparse
+import sys
+from biopeaks.benchmarks.performance.suite import (DURATIONS, RESULTS_DIR,
+                                                   run_suite, save_results,
+                                                   load_results,
+                                                   compare_results,
+                                                   format_report)
+
+
+def main(argv=None):
+    """Run the performance suite or compare stored runs.
+
+    Returns exit status 1 if a comparison found regressions, and 0 otherwise.
+    """
+    parser = argparse.ArgumentParser(prog="python -m"
+                                     " biopeaks.benchmarks.performance",
+                                     description="Track the run time and"
+                                     " memory usage of biopeaks.")
+    parser.add_argument("--results-dir", default=RESULTS_DIR,
+                        help="directory containing the stored runs")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run = subparsers.add_parser("run", help="run the suite and store the"
+                                " results")
+    run.add_argument("--durations", type=float, nargs="+", default=DURATIONS,
+                     help="durations of the synthetic inputs in seconds")
+    run.add_argument("--repeat", type=int, default=5,
+                     help="number of timed runs per benchmark")
+    run.add_argument("--bench", nargs="+", default=None,
+                     help="only run these benchmarks")
+    run.add_argument("--label", default=None,
+                     help="key of the run (default: current git commit)")
+
+    compare = subparsers.add_parser("compare", help="compare two stored runs")
+    compare.add_argument("baseline", help="key of the baseline run")
+    compare.add_argument("contender", help="key of the run to be compared")
+    compare.add_argument("--threshold", type=float, default=.1,
+                         help="relative change flagged as regression, in"
+                         " addition to the noise of the timings")
+    compare.add_argument("--metric", default="time_min",
+                         choices=["time_min", "time_median", "peak_memory"])
+
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        durations = [int(d) if float(d).is_integer() else d
+                     for d in args.durations]
+        results = run_suite(durations=durations, repeat=args.repeat,
+                            names=args.bench)
+        wpath = save_results(results, label=args.label,
+                             results_dir=args.results_dir)
+        print(f"Stored results in {wpath}.")
+        return 0
+
+    baseline = load_results(args.baseline, args.results_dir)
+    contender = load_results(args.contender, args.results_dir)
+    report = compare_results(baseline, contender, threshold=args.threshold,
+                             metric=args.metric)
+    print(format_report(report, baseline, contender, metric=args.metric))
+
+    return int(any(row["flag"] == "regression" for row in report))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks, synthetic inputs, and result storage of the performance suite."""
+
+import os
+import json
+import platform
+import subprocess
+import tempfile
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from timeit import default_timer as timer
+import numpy as np
+import scipy
+from biopeaks.heart import ecg_peaks, ppg_peaks, correct_peaks, heart_stats
+from biopeaks.resp import resp_extrema, resp_stats
+from biopeaks.io_utils import read_edf, write_edf, _padtrim
+from biopeaks.analysis_utils import DetectorWorkspace
+from biopeaks.chunked import process_long_recording
+from biopeaks.filters import butter_highpass_filter
+
+
+DURATIONS = [60, 600, 3600]    # in seconds
+SFREQS = {"ECG": 1000, "PPG": 125, "RESP": 50}
+# Stored runs are kept out of the source tree, in a directory that is ignored
+# by git (relative to the working directory, i.e., usually the root of the
+# repository). Override with the environment variable
+# BIOPEAKS_BENCHMARK_RESULTS or the `results_dir` arguments.
+RESULTS_DIR = Path(os.environ.get("BIOPEAKS_BENCHMARK_RESULTS",
+                                  ".benchmark_results"))
+
+
+def synthetic_ecg(duration, sfreq=SFREQS["ECG"], seed=42):
+    """Simulate an ECG with Gaussian QRS complexes on a noisy baseline.
+
+    Returns the signal and the samples of the simulated R-peaks.
+    """
+    rng = np.random.default_rng(seed)
+    nsamp = int(duration * sfreq)
+    rr = rng.normal(.8, .05, size=int(duration / .6)) * sfreq
+    peaks = np.cumsum(np.rint(rr)).astype(int)
+    peaks = peaks[peaks < nsamp - sfreq]
+    impulses = np.zeros(nsamp)
+    impulses[peaks] = 1
+    kernel_time = np.arange(-int(.1 * sfreq), int(.1 * sfreq) + 1)
+    kernel = np.exp(-.5 * (kernel_time / (.01 * sfreq)) ** 2)
+    drift = .5 * np.sin(2 * np.pi * .1 * np.arange(nsamp) / sfreq)
+    ecg = (np.convolve(impulses, kernel, mode="same") + drift +
+           rng.normal(0, .02, nsamp))
+
+    return ecg, peaks
+
+
+def synthetic_ppg(duration, sfreq=SFREQS["PPG"], seed=42):
+    """Simulate a PPG as a sequence of asymmetric pulse waves."""
+    rng = np.random.default_rng(seed)
+    nsamp = int(duration * sfreq)
+    rr = rng.normal(.8, .05, size=int(duration / .6)) * sfreq
+    onsets = np.cumsum(np.rint(rr)).astype(int)
+    onsets = onsets[onsets < nsamp - sfreq]
+    impulses = np.zeros(nsamp)
+    impulses[onsets] = 1
+    kernel_time = np.arange(int(.6 * sfreq)) / sfreq
+    kernel = kernel_time * np.exp(-kernel_time / .1)    # fast rise, slow decay
+    ppg = np.convolve(impulses, kernel)[:nsamp] + rng.normal(0, .001, nsamp)
+
+    return ppg
+
+
+def synthetic_resp(duration, sfreq=SFREQS["RESP"], seed=42):
+    """Simulate a breathing signal with slowly varying breathing rate."""
+    rng = np.random.default_rng(seed)
+    sec = np.arange(int(duration * sfreq)) / sfreq
+    rate = .25 + .05 * np.sin(2 * np.pi * .01 * sec)    # in Hz
+    phase = 2 * np.pi * np.cumsum(rate) / sfreq
+    resp = np.sin(phase) + rng.normal(0, .05, sec.size)
+
+    return resp
+
+
+def write_synthetic_edf(wpath, channels, sfreq, duration_epoch=1):
+    """Write channels sampled at the same rate to a minimal EDF file."""
+    n_channels = len(channels)
+    n_samples = int(sfreq * duration_epoch)
+    n_epochs = min(channel.size for channel in channels) // n_samples
+    end_header = 256 * (n_channels + 1)
+
+    header = b"".join([_padtrim(0, 8), _padtrim("", 80), _padtrim("", 80),
+                       _padtrim("01.01.00", 8), _padtrim("00.00.00", 8),
+                       _padtrim(end_header, 8), _padtrim("", 44),
+                       _padtrim(n_epochs, 8), _padtrim(duration_epoch, 8),
+                       _padtrim(n_channels, 4)])
+    fields = [(16, "synthetic"), (80, ""), (8, "uV"), (8, -32768),
+              (8, 32767), (8, -32768), (8, 32767), (80, ""),
+              (8, n_samples), (32, "")]
+    for n_bytes, value in fields:    # channel specific fields are grouped by field, not by channel
+        header += b"".join(_padtrim(value, n_bytes) for _ in range(n_channels))
+
+    data = np.stack([np.clip(channel[:n_epochs * n_samples], -32768, 32767)
+                     .astype(np.int16).reshape(n_epochs, n_samples)
+                     for channel in channels], axis=1)    # epochs x channels x samples
+
+    with open(wpath, "wb") as f:
+        f.write(header)
+        f.write(data.tobytes())
+
+
+def make_benchmarks(duration, tmpdir):
+    """Set up the benchmarks for inputs of a given duration.
+
+    Parameters
+    ----------
+    duration : float
+        Duration of the synthetic inputs in seconds.
+    tmpdir : Path
+        Directory for files required by the I/O benchmarks.
+
+    Returns
+    -------
+    benchmarks : dict
+        Maps the name of each benchmark to a function without arguments.
+    """
+    ecg, ecgpeaks = synthetic_ecg(duration)
+    ppg = synthetic_ppg(duration)
+    resp = synthetic_resp(duration)
+    respextrema = resp_extrema(resp, SFREQS["RESP"])
+    ecg32, ppg32, resp32 = (x.astype(np.float32) for x in (ecg, ppg, resp))
+    workspace = DetectorWorkspace(ecg.size)
+    ecg_peaks(ecg, SFREQS["ECG"], workspace=workspace)    # allocate buffers
+
+    noisypeaks = ecgpeaks.copy()
+    noisypeaks[10::50] -= int(.2 * SFREQS["ECG"])    # misaligned peaks
+    noisypeaks = np.delete(noisypeaks, np.arange(25, noisypeaks.size, 50))    # missed peaks
+
+    edfpath = tmpdir.joinpath(f"synthetic_{duration}.edf")
+    write_synthetic_edf(edfpath, [ecg * 1000, ecg * 500], SFREQS["ECG"])
+    segmentpath = tmpdir.joinpath(f"synthetic_{duration}_segment.edf")
+
+    benchmarks = {
+        "ecg_peaks": lambda: ecg_peaks(ecg, SFREQS["ECG"]),
+        "ecg_peaks_f32": lambda: ecg_peaks(ecg32, SFREQS["ECG"],
+                                           dtype=np.float32),
+        "ecg_peaks_ws": lambda: ecg_peaks(ecg, SFREQS["ECG"],
+                                          workspace=workspace),
+        "ecg_peaks_decimate": lambda: ecg_peaks(ecg, SFREQS["ECG"],
+                                                decimate=True),
+        "ecg_chunked": lambda: process_long_recording(ecg, SFREQS["ECG"],
+                                                      "ECG", chunksize=60,
+                                                      correct=False,
+                                                      stats=False),
+        "highpass": lambda: butter_highpass_filter(ecg, .5, SFREQS["ECG"]),
+        "highpass_fft": lambda: butter_highpass_filter(ecg, .5, SFREQS["ECG"],
+                                                       backend="fft"),
+        "ppg_peaks": lambda: ppg_peaks(ppg, SFREQS["PPG"]),
+        "ppg_peaks_f32": lambda: ppg_peaks(ppg32, SFREQS["PPG"],
+                                           dtype=np.float32),
+        "ppg_peaks_decimate": lambda: ppg_peaks(ppg, SFREQS["PPG"],
+                                                decimate=True),
+        "resp_extrema": lambda: resp_extrema(resp, SFREQS["RESP"]),
+        "resp_extrema_f32": lambda: resp_extrema(resp32, SFREQS["RESP"],
+                                                 dtype=np.float32),
+        "correct_peaks": lambda: correct_peaks(noisypeaks, SFREQS["ECG"]),
+        "heart_stats": lambda: heart_stats(ecgpeaks, SFREQS["ECG"], ecg.size),
+        "resp_stats": lambda: resp_stats(respextrema, resp, SFREQS["RESP"]),
+        "read_edf": lambda: read_edf(edfpath, "A1", "signal"),
+        "write_edf": lambda: write_edf(edfpath, segmentpath,
+                                       [0, duration / 2]),
+    }
+
+    return benchmarks
+
+
+def time_benchmark(func, repeat):
+    """Time a benchmark.
+
+    Returns the minimum and median wall-clock time over `repeat` runs in
+    seconds.
+    """
+    times = []
+    for _ in range(repeat):
+        start = timer()
+        func()
+        times.append(timer() - start)
+
+    return min(times), float(np.median(times))
+
+
+def memory_benchmark(func):
+    """Return the peak memory allocated during a benchmark in bytes."""
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return peak
+
+
+def current_commit():
+    """Return the git commit of the biopeaks checkout.
+
+    Appends "-dirty" if the checkout has uncommitted changes. Returns None if
+    biopeaks isn't run from a git checkout.
+    """
+    repo = Path(__file__).parents[3]
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                                cwd=repo, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain",
+                                 "--untracked-files=no"], cwd=repo,
+                                capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return f"{commit}-dirty" if status else commit
+
+
+def run_suite(durations=DURATIONS, repeat=5, names=None, verbose=True):
+    """Run the performance suite.
+
+    Parameters
+    ----------
+    durations : list of float, optional
+        Durations of the synthetic inputs in seconds. Default is DURATIONS.
+    repeat : int, optional
+        Number of timed runs of each benchmark. Default is 5.
+    names : list of str, optional
+        Only run the benchmarks with these names. Default is None (run all
+        benchmarks).
+    verbose : bool, optional
+        Print the results of each benchmark. Default is True.
+
+    Returns
+    -------
+    results : dict
+        Maps the name of each benchmark to a dictionary, that maps the input
+        duration to the timing ("time_min", "time_median" in seconds) and
+        memory usage ("peak_memory" in bytes).
+    """
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for duration in durations:
+
+            benchmarks = make_benchmarks(duration, Path(tmpdir))
+
+            for name, func in benchmarks.items():
+
+                if names and name not in names:
+                    continue
+                func()    # warm-up
+                time_min, time_median = time_benchmark(func, repeat)
+                peak_memory = memory_benchmark(func)
+                results.setdefault(name, {})[str(duration)] = {
+                    "time_min": time_min, "time_median": time_median,
+                    "peak_memory": peak_memory}
+
+                if verbose:
+                    print(f"{name:<18}{duration:>8} s{time_min * 1000:>12.2f}"
+                          f" msec{peak_memory / 2 ** 20:>12.2f} MiB")
+
+    return results
+
+
+def save_results(results, label=None, results_dir=RESULTS_DIR):
+    """Store the results of a run as JSON.
+
+    Parameters
+    ----------
+    results : dict
+        As returned by `run_suite`.
+    label : str, optional
+        Key of the run. Default is None (use the current git commit).
+    results_dir : Path, optional
+        Directory containing the stored runs. Default is RESULTS_DIR.
+
+    Returns
+    -------
+    wpath : Path
+        File system location of the stored run.
+    """
+    label = label or current_commit()
+    if label is None:
+        raise ValueError("Cannot determine the git commit. Please provide a"
+                         " label for the run.")
+    results_dir = Path(results_dir)
+    results_dir.mkdir(parents=True, exist_ok=True)
+    run = {"commit": label,
+           "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+           "machine": platform.node(),
+           "python": platform.python_version(),
+           "numpy": np.__version__,
+           "scipy": scipy.__version__,
+           "results": results}
+    wpath = results_dir.joinpath(f"{label}.json")
+    with open(wpath, "w") as f:
+        json.dump(run, f, indent=2)
+
+    return wpath
+
+
+def load_results(label, results_dir=RESULTS_DIR):
+    """Load a stored run."""
+    with open(Path(results_dir).joinpath(f"{label}.json")) as f:
+        return json.load(f)
+
+
+def compare_results(baseline, contender, threshold=.1,
+                    metric="time_min"):
+    """Compare two runs and flag regressions.
+
+    A benchmark is flagged if `metric` changed by more than the relative
+    tolerance `threshold` plus the noise of the timings. The noise of a run is
+    the spread of its repeated timings (i.e., "time_median" minus "time_min"),
+    and the larger noise of both runs is used. Memory usage is deterministic
+    and compared without noise margin.
+
+    Parameters
+    ----------
+    baseline, contender : dict
+        Runs as returned by `load_results`.
+    threshold : float, optional
+        Relative change of `metric` beyond which a benchmark is flagged as
+        regression (or improvement), in addition to the noise of the timings.
+        Default is .1 (i.e., 10 percent).
+    metric : str, optional
+        The metric to compare. One of {"time_min", "time_median",
+        "peak_memory"}. Default is "time_min".
+
+    Returns
+    -------
+    report : list of dict
+        One entry per benchmark and input duration that is present in both
+        runs, containing the values of `metric` in both runs, their ratio, the
+        noise margin (in units of `metric`), and a flag (one of {"regression",
+        "improvement", ""}).
+    """
+    report = []
+    for name, durations in contender["results"].items():
+        for duration, values in durations.items():
+
+            try:
+                referencevalues = baseline["results"][name][duration]
+            except KeyError:
+                continue
+            reference = referencevalues[metric]
+            noise = 0.
+            if metric != "peak_memory":
+                noise = max(_spread(referencevalues), _spread(values))
+            ratio = values[metric] / reference if reference else np.nan
+            if values[metric] > reference * (1 + threshold) + noise:
+                flag = "regression"
+            elif values[metric] < reference * (1 - threshold) - noise:
+                flag = "improvement"
+            else:
+                flag = ""
+            report.append({"benchmark": name, "duration": duration,
+                           "baseline": reference, "contender": values[metric],
+                           "ratio": ratio, "noise": noise, "flag": flag})
+
+    return report
+
+
+def _spread(values):
+    """Spread of the repeated timings of a benchmark in seconds."""
+    return max(values["time_median"] - values["time_min"], 0.)
+
+
+def format_report(report, baseline, contender, metric="time_min"):
+    """Format a comparison report as plain text."""
+    lines = [f"{metric}: {baseline['commit']} -> {contender['commit']}",
+             f"{'benchmark':<18}{'duration':>10}{'baseline':>14}"
+             f"{'contender':>14}{'ratio':>8}  flag"]
+    for row in report:
+        lines.append(f"{row['benchmark']:<18}{row['duration']:>10}"
+                     f"{row['baseline']:>14.6g}{row['contender']:>14.6g}"
+                     f"{row['ratio']:>8.2f}  {row['flag']}")
+    n_regressions = sum(row["flag"] == "regression" for row in report)
+    lines.append(f"{n_regressions} regression(s) found.")
+
+    return "\n".join(lines)
@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+"""Content-addressed cache of extrema and statistics.
+
+Results are stored on disk under a key that is a hash of the inputs of each
+processing step, rather than of the file they originate from. Extrema are
+keyed by the signal's bytes, the sampling frequency, the modality, and all
+parameters of the detector (including defaults). Corrected extrema and
+statistics are keyed by the extrema they are computed from. Hence, changing
+the correction leaves the detection cached, and statistics of manually edited
+extrema are not confused with those of the detected extrema.
+
+Examples
+--------
+>>> cache = ResultCache("biopeaks_cache", max_bytes=2 ** 30)
+>>> peaks = cache.detect(signal, sfreq, "ECG")
+>>> peaks = cache.correct(peaks, sfreq)
+>>> stats = cache.stats(peaks, signal, sfreq, "ECG")
+"""
+
+import os
+import json
+import inspect
+import hashlib
+import numpy as np
+from pathlib import Path
+from biopeaks.heart import correct_peaks, heart_stats
+from biopeaks.resp import resp_stats
+from biopeaks.detectors import peakfuncs
+from biopeaks.profiling import stage
+
+
+# Increment to invalidate existing entries if the algorithms change their
+# results.
+CACHE_VERSION = 1
+
+# Parameters that do not influence the results.
+_ignored_params = {"signal", "sfreq", "peaks", "workspace", "workers",
+                   "return_segments"}
+
+
+class ResultCache:
+    """Cache extrema and statistics on disk.
+
+    Each entry is an .npz file in `cachedir`, named after its key. Once the
+    entries exceed `max_bytes`, the least recently used entries (according to
+    their modification time, which is updated on every hit) are deleted.
+    Entries are written atomically, such that multiple processes can share a
+    cache.
+    """
+
+    def __init__(self, cachedir, max_bytes=2 ** 30):
+        """Create the cache directory if necessary.
+
+        Parameters
+        ----------
+        cachedir : str
+            Directory containing the entries.
+        max_bytes : int, optional
+            Size limit of all entries in bytes. By default 1 GiB.
+        """
+        self.cachedir = Path(cachedir)
+        self.cachedir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def detect(self, signal, sfreq, modality, **kwargs):
+        """Detect extrema, or retrieve them if they have been detected before.
+
+        Parameters
+        ----------
+        signal : ndarray
+            The signal.
+        sfreq : int
+            The sampling frequency of `signal`.
+        modality : str
+            One of {"ECG", "PPG", "RESP"}.
+        **kwargs
+            Keyword arguments passed on to the detector.
+
+        Returns
+        -------
+        peaks : ndarray
+            The extrema (see `ecg_peaks`, `ppg_peaks`, `resp_extrema`).
+        segments : ndarray
+            Only returned if `return_segments` is passed on to the detector
+            (see `ecg_peaks`, `ppg_peaks`).
+        """
+        peakfunc = peakfuncs[modality]
+        key = self.key("detect", (signal,),
+                       params={"modality": modality, "sfreq": sfreq,
+                               **_bind_params(peakfunc, kwargs)})
+        return_segments = kwargs.get("return_segments", False)
+        entry = self.get(key)
+        if entry is None or (return_segments and "segments" not in entry):    # entries without segments are replaced
+            if return_segments:
+                peaks, segments = peakfunc(signal, sfreq, **kwargs)
+                entry = {"peaks": peaks, "segments": segments}
+            else:
+                entry = {"peaks": peakfunc(signal, sfreq, **kwargs)}
+            self.put(key, entry)
+
+        if return_segments:
+            return entry["peaks"], entry["segments"]
+        return entry["peaks"]
+
+    def correct(self, peaks, sfreq, **kwargs):
+        """Correct cardiac extrema, or retrieve them if they have been
+        corrected before.
+
+        Parameters
+        ----------
+        peaks : ndarray
+            Cardiac extrema.
+        sfreq : int
+            The sampling frequency of the signal containing `peaks`.
+        **kwargs
+            Keyword arguments passed on to `correct_peaks`.
+
+        Returns
+        -------
+        peaks : ndarray
+            The corrected extrema.
+        """
+        key = self.key("correct", (peaks,),
+                       params={"sfreq": sfreq,
+                               **_bind_params(correct_peaks, kwargs)})
+        entry = self.get(key)
+        if entry is None:
+            entry = {"peaks": correct_peaks(peaks, sfreq, **kwargs)}
+            self.put(key, entry)
+
+        return entry["peaks"]
+
+    def stats(self, peaks, signal, sfreq, modality):
+        """Compute statistics, or retrieve them if they have been computed
+        before.
+
+        Parameters
+        ----------
+        peaks : ndarray
+            The extrema.
+        signal : ndarray
+            The signal containing `peaks`.
+        sfreq : int
+            The sampling frequency of `signal`.
+        modality : str
+            One of {"ECG", "PPG", "RESP"}.
+
+        Returns
+        -------
+        stats : dict
+            The instantaneous "period" and "rate" (and "tidalamp" for RESP).
+        """
+        if modality == "RESP":    # tidal amplitude depends on the signal
+            key = self.key("stats", (peaks, signal),
+                           params={"modality": modality, "sfreq": sfreq})
+        else:
+            key = self.key("stats", (peaks,),
+                           params={"modality": modality, "sfreq": sfreq,
+                                   "nsamp": signal.size})
+        entry = self.get(key)
+        if entry is not None:
+            return entry
+
+        if modality == "RESP":
+            period, rate, tidalamp = resp_stats(peaks, signal, sfreq)
+            entry = {"period": period, "rate": rate, "tidalamp": tidalamp}
+        else:
+            period, rate = heart_stats(peaks, sfreq, signal.size)
+            entry = {"period": period, "rate": rate}
+        self.put(key, entry)
+
+        return entry
+
+    def key(self, step, arrays, params):
+        """Hash the inputs of a processing step.
+
+        Parameters
+        ----------
+        step : str
+            Name of the processing step.
+        arrays : tuple of ndarray
+            The array inputs. Their dtype, shape and bytes are hashed.
+        params : dict
+            The remaining inputs. Must be JSON-serializable, with the
+            exception of NumPy scalars and dtypes.
+
+        Returns
+        -------
+        key : str
+            Hexadecimal BLAKE2b hash.
+        """
+        with stage("cache.key"):
+            digest = hashlib.blake2b(digest_size=20)
+            header = {"version": CACHE_VERSION, "step": step,
+                      "params": params}
+            digest.update(json.dumps(header, sort_keys=True,
+                                     default=_jsonable).encode())
+            for array in arrays:
+                array = np.ascontiguousarray(array)
+                digest.update(f"{array.dtype.str}{array.shape}".encode())
+                digest.update(memoryview(array).cast("B"))
+
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Retrieve an entry.
+
+        Parameters
+        ----------
+        key : str
+            The key of the entry.
+
+        Returns
+        -------
+        entry : dict or None
+            Maps names to arrays. None if there is no (readable) entry.
+        """
+        path = self._path(key)
+        try:
+            with np.load(path) as npz:
+                entry = {name: npz[name] for name in npz.files}
+            os.utime(path)    # mark as recently used
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, ValueError):    # truncated or otherwise corrupted entry
+            path.unlink(missing_ok=True)
+            self.misses += 1
+            return None
+        self.hits += 1
+
+        return entry
+
+    def put(self, key, entry):
+        """Store an entry and evict entries if the cache exceeds its limit.
+
+        Parameters
+        ----------
+        key : str
+            The key of the entry.
+        entry : dict
+            Maps names to arrays.
+        """
+        path = self._path(key)
+        tmppath = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmppath, "wb") as f:
+            np.savez(f, **entry)
+        os.replace(tmppath, path)
+        self.evict()
+
+    def evict(self):
+        """Delete the least recently used entries until the size limit is
+        met."""
+        entries = []
+        for path in self.cachedir.glob("*.npz"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:    # evicted by another process
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+        nbytes = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+            if nbytes <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            nbytes -= size
+
+    @property
+    def nbytes(self):
+        """int: Size of all entries in bytes."""
+        return sum(path.stat().st_size for path in self.cachedir.glob("*.npz"))
+
+    def clear(self):
+        """Delete all entries."""
+        for path in self.cachedir.glob("*.npz"):
+            path.unlink(missing_ok=True)
+
+    def _path(self, key):
+        return self.cachedir.joinpath(f"{key}.npz")
+
+
+def _bind_params(func, kwargs):
+    """Complete keyword arguments with the defaults of `func`."""
+    bound = inspect.signature(func).bind_partial(**kwargs)
+    bound.apply_defaults()
+    return {name: value for name, value in bound.arguments.items()
+            if name not in _ignored_params}
+
+
+def _jsonable(value):
+    """Convert NumPy scalars and dtypes for JSON serialization."""
+    if isinstance(value, np.generic):
+        return value.item()
+    try:
+        return np.dtype(value).str
+    except TypeError:
+        return repr(value)
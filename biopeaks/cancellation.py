@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""Cooperative cancellation of long-running processing.
+
+A `CancellationToken` is activated for the current thread with `cancellable`.
+Processing checks the active token at every stage boundary (see
+`biopeaks.profiling.stage`), as well as inside loops over segments, chunks,
+and files (see `check_cancelled`). Once the token has been cancelled (usually
+from another thread), the next check raises `Cancelled`. Since results are
+only returned (or written to the Model) once processing has finished,
+cancellation leaves previous results untouched. When no token is active,
+checks do nothing.
+
+Examples
+--------
+>>> token = CancellationToken()
+>>> with cancellable(token):
+...     peaks = ecg_peaks(signal, sfreq)    # token.cancel() from another thread
+Traceback (most recent call last):
+    ...
+Cancelled
+"""
+
+import threading
+from contextlib import contextmanager
+
+
+_local = threading.local()    # the token that is active in each thread
+
+
+class Cancelled(Exception):
+    """Raised by `check_cancelled` once the active token has been
+    cancelled."""
+
+
+class CancellationToken:
+    """Flag that requests the cancellation of processing.
+
+    The token is thread-safe: it can be cancelled from any thread.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        """Request cancellation."""
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        """bool: Whether or not cancellation has been requested."""
+        return self._event.is_set()
+
+    def check(self):
+        """Raise `Cancelled` if cancellation has been requested."""
+        if self._event.is_set():
+            raise Cancelled()
+
+
+@contextmanager
+def cancellable(token):
+    """Activate a token for the current thread.
+
+    Parameters
+    ----------
+    token : CancellationToken or None
+        The token that is checked within the context. None deactivates
+        cancellation within the context.
+
+    Yields
+    ------
+    token : CancellationToken or None
+    """
+    previous = getattr(_local, "token", None)
+    _local.token = token
+    try:
+        yield token
+    finally:
+        _local.token = previous
+
+
+def current_token():
+    """Return the token that is active in the current thread, or None."""
+    return getattr(_local, "token", None)
+
+
+def check_cancelled():
+    """Raise `Cancelled` if the active token has been cancelled."""
+    token = getattr(_local, "token", None)
+    if token is not None and token._event.is_set():
+        raise Cancelled()
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""Process recordings that are larger than the available memory.
+
+The detectors need the entire signal in memory (and the filters need multiple
+copies of it). `process_long_recording` instead reads the signal in chunks
+from any object that supports slicing, e.g., a memory-mapped EDF channel (see
+`biopeaks.io_utils.memmap_edf`) or a cached text channel (see
+`biopeaks.io_utils.memmap_text`). Each chunk is extended by a margin on both
+sides, such that filter transients and moving averages have settled within
+the chunk's core. Only the extrema located in the core are retained, and the
+cores of consecutive chunks tile the recording without gaps or overlap.
+
+The statistics have as many elements as the signal. In order to keep them out
+of memory as well, cardiac statistics can be written into preallocated arrays
+such as memory-mapped files (see the `out` argument of
+`process_long_recording`).
+"""
+
+import numpy as np
+from biopeaks.heart import correct_peaks, heart_stats
+from biopeaks.resp import resp_stats, ensure_peak_trough_alternation
+from biopeaks.detectors import peakfuncs
+from biopeaks.analysis_utils import DetectorWorkspace, interp_stats
+from biopeaks.profiling import stage, profiled
+from biopeaks.progress import report_progress
+
+
+# Margins in seconds. The margins cover the transients of the high-pass filters
+# (.5 Hz for ECG and PPG, .05 Hz for RESP), as well as the moving averages.
+margins = {"ECG": 5.,
+           "PPG": 5.,
+           "RESP": 60.}
+
+
+@profiled("process_long_recording")
+def process_long_recording(signal, sfreq, modality, chunksize=600.,
+                           margin=None, correct=True, stats=True, out=None,
+                           **kwargs):
+    """Detect extrema and compute statistics chunk by chunk.
+
+    Parameters
+    ----------
+    signal : ndarray, np.memmap, or EDFChannel
+        The signal. Any one-dimensional object with a `size` attribute that
+        returns an array when sliced.
+    sfreq : int
+        The sampling frequency of `signal`.
+    modality : str
+        One of {"ECG", "PPG", "RESP"}.
+    chunksize : float, optional
+        Duration of the core of each chunk in seconds. Peak memory is
+        proportional to `chunksize` + 2 * `margin`. Default is 600.
+    margin : float, optional
+        Duration of the margins that are added to both sides of each chunk's
+        core. In seconds. Default is None (see `margins`).
+    correct : bool, optional
+        Apply `correct_peaks` to the stitched cardiac peaks. Ignored for
+        RESP. Default is True.
+    stats : bool, optional
+        Compute the modality-specific statistics. Note that each statistic has
+        as many elements as `signal` and is allocated in memory (in double
+        precision) unless `out` is provided. Default is True.
+    out : dict, optional
+        Only used if `stats` is True. Maps the name of each statistic
+        ("period", "rate", and "tidalamp" for RESP) to a float64 array with
+        as many elements as `signal` that the statistic is written to, e.g.,
+        an np.memmap. Cardiac statistics are interpolated into `out` block by
+        block, such that they never reside in memory entirely. Breathing
+        statistics are computed in memory and copied to `out`. Default is None
+        (allocate the statistics in memory).
+    **kwargs
+        Keyword arguments passed on to the detector (e.g., `dtype`, which is
+        also the precision that the chunks are read in).
+
+    Returns
+    -------
+    results : dict
+        Contains the extrema ("peaks"), and, if `stats` is True, the
+        instantaneous "period" and "rate" (and "tidalamp" for RESP).
+
+    Notes
+    -----
+    The extrema can differ from those obtained by processing the entire
+    signal at once for two reasons. First, the detectors use a few statistics
+    that are computed over their entire input (e.g., the average QRS duration
+    of ECG, the mean signal power of PPG, or the median amplitude difference
+    of breathing extrema), which are computed per chunk instead. Second,
+    beats within one `mindelay` of a seam between cores are only retained in
+    the earlier chunk. On the benchmark recordings, cardiac peaks are identical
+    to whole-signal processing, whereas breathing extrema are shifted by at
+    most one sample (breathing extrema are flat, such that the residual
+    filter transient can move the maximum to a neighboring sample).
+    """
+    peakfunc = peakfuncs[modality]
+    nsamp = signal.size
+    margin = margins[modality] if margin is None else margin
+    coresamp = max(int(np.rint(chunksize * sfreq)), 1)
+    marginsamp = int(np.rint(margin * sfreq))
+
+    dtype = kwargs.get("dtype")
+    if dtype is None:
+        dtype = np.float64
+    kwargs.setdefault("workspace",
+                      DetectorWorkspace(coresamp + 2 * marginsamp,
+                                        dtype=dtype))
+    mindelay = int(np.rint(kwargs.get("mindelay", .3) * sfreq))
+
+    peaks = []
+    lastpeak = None
+    for corebeg in range(0, nsamp, coresamp):
+
+        coreend = min(corebeg + coresamp, nsamp)
+        chunkbeg = max(corebeg - marginsamp, 0)
+        chunkend = min(coreend + marginsamp, nsamp)
+
+        with stage("process_long_recording.read"):
+            chunk = np.asarray(signal[chunkbeg:chunkend], dtype=dtype)
+        chunkpeaks = peakfunc(chunk, sfreq, **kwargs) + chunkbeg
+        chunkpeaks = chunkpeaks[(chunkpeaks >= corebeg) &
+                                (chunkpeaks < coreend)]    # retain extrema in core
+
+        if modality != "RESP" and lastpeak is not None:
+            # The same beat can be detected on both sides of a seam.
+            chunkpeaks = chunkpeaks[chunkpeaks - lastpeak > mindelay]
+        if chunkpeaks.size:
+            lastpeak = chunkpeaks[-1]
+        peaks.append(chunkpeaks)
+        report_progress(fraction=coreend / nsamp)
+
+    peaks = np.concatenate(peaks).astype(int)
+
+    if modality == "RESP":
+        peaks = ensure_peak_trough_alternation(peaks, signal)
+    elif correct:
+        peaks = correct_peaks(peaks, sfreq)
+
+    results = {"peaks": peaks}
+    if not stats:
+        return results
+
+    if modality == "RESP":
+        period, rate, tidalamp = resp_stats(peaks, signal, sfreq)
+        results["tidalamp"] = tidalamp
+    elif out is not None:
+        period, rate = _heart_stats_out(peaks, sfreq, nsamp, out)
+    else:
+        period, rate = heart_stats(peaks, sfreq, nsamp)
+    results["period"] = period
+    results["rate"] = rate
+    if out is not None:
+        for key, value in results.items():
+            if key in out and out[key] is not value:
+                out[key][:] = value
+                results[key] = out[key]
+
+    return results
+
+
+def _heart_stats_out(peaks, sfreq, nsamp, out):
+    """Compute the cardiac statistics (see `heart_stats`) into `out`."""
+    rr = np.ediff1d(peaks, to_begin=0) / sfreq
+    rr[0] = np.mean(rr[1:])
+    period = interp_stats(peaks, rr, nsamp, out=out["period"])
+    rate = np.divide(60, period, out=out["rate"])
+    return period, rate
@@ -5,11 +5,19 @@ import sys
 import threading
 import pandas as pd
 import numpy as np
-from functools import wraps
-from biopeaks.heart import ecg_peaks, ppg_peaks, correct_peaks, heart_stats
-from biopeaks.resp import ensure_peak_trough_alternation, resp_extrema, resp_stats
+from functools import wraps, partial
+from biopeaks.heart import correct_peaks, heart_stats, update_heart_stats
+from biopeaks.resp import resp_stats
+from biopeaks.detectors import peakfuncs
 from biopeaks.io_utils import (read_custom, read_opensignals, read_edf,
-                               write_custom, write_opensignals, write_edf)
+                               write_custom, write_opensignals, write_edf,
+                               write_peaks, write_stats)
+from biopeaks.batch import (Prefetcher, BatchManifest, batch_params,
+                            read_channels, read_and_fingerprint, filesize)
+from biopeaks.cancellation import CancellationToken, Cancelled, cancellable
+from biopeaks.progress import ProgressTracker, tracking
+from biopeaks.timeaxis import TimeAxis
+from biopeaks.peakset import PeakSet
 from pathlib import Path
 from scipy.signal import find_peaks as find_peaks_scipy
 from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
@@ -19,10 +27,6 @@ getOpenFileNames = QFileDialog.getOpenFileNames
 getSaveFileName = QFileDialog.getSaveFileName
 getExistingDirectory = QFileDialog.getExistingDirectory
 
-peakfuncs = {"ECG": ecg_peaks,
-             "PPG": ppg_peaks,
-             "RESP": resp_extrema}
-
 readfuncs = {"Custom": read_custom,
              "OpenSignals": read_opensignals,
              "EDF": read_edf}
@@ -54,7 +58,13 @@ class WorkerSignal(QObject):
 
 
 class Worker(QRunnable):
-    """Execute a Controller method."""
+    """Execute a Controller method.
+
+    The method is executed with the Controller's cancellation token at the
+    time the Worker is created (see Controller.cancel). During batch
+    processing, the method reports its progress to the batch's progress
+    tracker.
+    """
 
     def __init__(self, method, controller, **kwargs):
         """Initiate with Controller instance, and -method, as well as signal.
@@ -71,13 +81,19 @@ class Worker(QRunnable):
         self.kwargs = kwargs
         self.signals = WorkerSignal()
         self.controller = controller
+        self.token = controller._token
+        self.tracker = controller._tracker
 
     def run(self):
         """Execute method."""
         self.signals.progress.emit(0)
         if running_coverage:
             sys.settrace(threading._trace_hook)
-        self.method(self.controller, **self.kwargs)
+        try:
+            with cancellable(self.token), tracking(self.tracker):
+                self.method(self.controller, **self.kwargs)
+        except Cancelled:
+            self.controller._model.status = "Cancelled."
         self.signals.progress.emit(1)
 
 
@@ -108,19 +124,30 @@ class Controller(QObject):
 
     """
 
-    def __init__(self, model):
+    def __init__(self, model, cache=None):
         """Initiate with Model and threadpool.
 
         Parameters
         ----------
         model : QObject
             Model component of the MVC application.
+        cache : ResultCache, optional
+            Cache for extrema and statistics. By default None (results are
+            not cached).
         """
         super().__init__()
 
         self._model = model
+        self.cache = cache
         self.threadpool = QThreadPool()
         self.threadpool.setMaxThreadCount(1)
+        self._prefetcher = None
+        self._manifest = None
+        self._fprint = None    # fingerprint of the current file of a batch, computed when the file is read
+        self._token = CancellationToken()
+        self._batchtoken = None
+        self._tracker = None
+        self._peakset = None
 
     def load_channels(self):
         """Load channels from file.
@@ -243,6 +270,7 @@ class Controller(QObject):
         the local extreme that is closest to the current cursor position.
         If the user pressed the "a" key, search the local extreme that is
         closest to the current cursor position and add it to the extrema.
+        The "ctrl+z" and "ctrl+y" keys undo and redo the edits.
 
         Parameters
         ----------
@@ -253,35 +281,26 @@ class Controller(QObject):
         See Also
         --------
         matplotlib.backend_bases.KeyEvent
+        peakset.PeakSet
         """
         if not self._model.peakseditable:
             return
         if self._model.peaks is None:
             return
-        cursor = int(np.rint(key_event.xdata * self._model.sfreq))
-        extend = int(np.rint(self._model.sfreq * 0.1))
-        searchrange = np.arange(cursor - extend, cursor + extend)    # search peak in a window of 200 msec, centered on selected x coordinate of cursor position
-        retainidcs = np.logical_and(searchrange > 0,
-                                    searchrange < self._model.signal.size)    # make sure that searchrange doesn't extend beyond signal
-        searchrange = searchrange[retainidcs]
-        if key_event.key == 'd':
-            peakidx = np.argmin(np.abs(self._model.peaks - cursor))
-            if np.any(searchrange == self._model.peaks[peakidx]):    # only delete peaks that are within search range
-                self._model.peaks = np.delete(self._model.peaks, peakidx)
-        elif key_event.key == 'a':
-            searchsignal = self._model.signal[searchrange]
-            locmax, _ = find_peaks_scipy(searchsignal)    # use Scipy's find_peaks to also detect local extrema that are plateaus
-            locmin, _ = find_peaks_scipy(searchsignal * -1)
-            locext = np.concatenate((locmax, locmin))
-            locext.sort(kind='mergesort')
-            if locext.size < 1:
-                return
-            peakidx = np.argmin(np.abs(searchrange[locext] - cursor))
-            newpeak = searchrange[0] + locext[peakidx]
-            if np.all(self._model.peaks != newpeak):    # only add new peak if it doesn't exist already
-                insertidx = np.searchsorted(self._model.peaks, newpeak)
-                self._model.peaks = np.insert(self._model.peaks, insertidx,
-                                              [newpeak])
+        if (self._peakset is None or
+                np.asarray(self._peakset) is not self._model.peaks):    # peaks have been replaced since the last edit (e.g., by auto-correction), start a new edit log
+            self._peakset = PeakSet(self._model.peaks)
+        if key_event.key == "ctrl+z":
+            edited = self._peakset.undo()
+        elif key_event.key == "ctrl+y":
+            edited = self._peakset.redo()
+        elif key_event.key in ["d", "a"]:
+            edited = self._edit_peakset(key_event)
+        else:
+            return
+        if edited:
+            self._model.peaks = np.asarray(self._peakset)
+            self._update_stats(self._peakset.changed)
 
     @threaded
     def segment_dataset(self):
@@ -289,23 +308,40 @@ class Controller(QObject):
 
         Limit the dataset (biosignal and/or marker -channel as well as extrema)
         to the user-selected segment. I.e., retain the portion of the dataset
-        that corresponds to the segment and discard the portion(s) outside the
-        segment.
+        that corresponds to the segment. Only the channels and the statistics
+        of the segment are views on the original dataset (the time axis is
+        computed on demand), which is kept in memory such that the
+        segmentation can be undone without reloading the file (see
+        undo_segment and revert_segment). The extrema of the segment are a
+        copy, shifted to the start of the segment, since they can be edited
+        independently of the original extrema. The copy holds a value per
+        extremum (i.e., per beat or breath), which is small compared to the
+        channels.
         """
         self._model.status = "Segmenting signal."
-        begsamp = int(np.rint(self._model.segment[0] * self._model.sfreq))    # convert from seconds to samples
-        endsamp = int(np.rint(self._model.segment[1] * self._model.sfreq))
-        siglen = endsamp - begsamp
-        sec = np.linspace(0, siglen / self._model.sfreq, siglen)
-        self._model.sec = sec
+        if self._model.original is None:
+            self._model.original = {"signal": self._model.signal,
+                                    "marker": self._model.marker,
+                                    "peaks": self._model.peaks,
+                                    "periodintp": self._model.periodintp,
+                                    "rateintp": self._model.rateintp,
+                                    "tidalampintp": self._model.tidalampintp}
+            self._model.segments = []
+            offset, markeroffset = 0, 0
+        else:
+            offset = self._model.segments[-1]["signal"][0]    # the active segment's start in the original dataset
+            markeroffset = (self._model.segments[-1]["marker"] or (0,))[0]
+        begsamp, endsamp = self._model.sec.sample(self._model.segment).tolist()    # convert from seconds to samples
+        segment = {"seconds": [offset / self._model.sfreq + t
+                               for t in self._model.segment],
+                   "signal": (offset + begsamp, offset + endsamp),
+                   "marker": None}
+        self._model.sec = TimeAxis(endsamp - begsamp, self._model.sfreq)
         self._model.signal = self._model.signal[begsamp:endsamp]
 
         if self._model.peaks is not None:
-            peakidcs = np.where((self._model.peaks > begsamp) &
-                                (self._model.peaks < endsamp))[0]
-            peaks = self._model.peaks[peakidcs]
-            peaks -= begsamp
-            self._model.peaks = peaks
+            self._model.peaks = self._segment_peaks(self._model.peaks, begsamp,
+                                                    endsamp)
         if self._model.periodintp is not None:
             self._model.periodintp = self._model.periodintp[begsamp:endsamp]
         if self._model.rateintp is not None:
@@ -314,18 +350,48 @@ class Controller(QObject):
             self._model.tidalampintp = self._model.tidalampintp[begsamp:
                                                                 endsamp]
 
-        if self._model.marker is None:
+        if self._model.marker is not None:
+            if self._model.filetype == "EDF":    # since marker channel might be sampled at a different rate segment it separately
+                sfreq = self._model.sfreqmarker
+            else:
+                sfreq = self._model.sfreq
+            markersec = TimeAxis(self._model.marker.size, sfreq)
+            begsamp, endsamp = markersec.sample(self._model.segment).tolist()
+            segment["marker"] = (markeroffset + begsamp, markeroffset + endsamp)
+            self._model.marker = self._model.marker[begsamp:endsamp]
+            if endsamp - begsamp <= 1:
+                self._model.status = "Error: There are not enough samples in" \
+                                     " the marker channel to resolve this" \
+                                     " segment."
+        self._model.segments = self._model.segments + [segment]
+
+    @threaded
+    def undo_segment(self):
+        """Undo the most recent segmentation.
+
+        Restore the previous segment, or the entire dataset if there is no
+        previous segment, from the original dataset (i.e., without reloading
+        the file). Extrema that have been found or edited in the current
+        segment are retained. Statistics are retained if the extrema didn't
+        change, otherwise they must be re-calculated.
+        """
+        if not self._model.segments:
+            self._model.status = "Error: no segmentation to undo."
+            return
+        self._model.status = "Undoing segmentation."
+        self._restore_segments(self._model.segments[:-1])
+
+    @threaded
+    def revert_segment(self):
+        """Revert to the entire dataset, undoing all segmentations.
+
+        See undo_segment.
+        """
+        if not self._model.segments:
+            self._model.status = "Error: no segmentation to undo."
             return
-        if self._model.filetype == "EDF":    # since marker channel might be sampled at a different rate segment it separately
-            sfreq = self._model.sfreqmarker
-        else:
-            sfreq = self._model.sfreq
-        begsamp = int(np.rint(self._model.segment[0] * sfreq))
-        endsamp = int(np.rint(self._model.segment[1] * sfreq))
-        self._model.marker = self._model.marker[begsamp:endsamp]
-        if endsamp - begsamp <= 1:
-            self._model.status = "Error: There are not enough samples in the" \
-                                 " marker channel to resolve this segment."
+        self._model.status = "Reverting to the entire signal."
+        self._restore_segments([])
 
     @threaded
     def find_peaks(self):
@@ -337,6 +403,11 @@ class Controller(QObject):
         if self._model.peaks is not None:
             self._model.status = "Error: peaks already in memory."
             return
+        if self.cache is not None:
+            self._model.peaks = self.cache.detect(self._model.signal,
+                                                  self._model.sfreq,
+                                                  self._model.modality)
+            return
         peakfunc = peakfuncs[self._model.modality]
         self._model.peaks = peakfunc(self._model.signal, self._model.sfreq)
 
@@ -353,6 +424,10 @@ class Controller(QObject):
             not self._model.correctbatchpeaks):
             return
         self._model.status = f"Auto-correcting {self._model.modality} peaks"
+        if self.cache is not None:
+            self._model.peaks = self.cache.correct(self._model.peaks,
+                                                   self._model.sfreq)
+            return
         self._model.peaks = correct_peaks(self._model.peaks, self._model.sfreq)
 
     @threaded
@@ -362,6 +437,14 @@ class Controller(QObject):
         if (self._model.peaks is None) or (np.size(self._model.peaks) < 2):
             self._model.status = "Error: no peaks available."
             return
+        if self.cache is not None:
+            stats = self.cache.stats(self._model.peaks, self._model.signal,
+                                     self._model.sfreq, self._model.modality)
+            self._model.periodintp = stats["period"]
+            self._model.rateintp = stats["rate"]
+            if self._model.modality == "RESP":
+                self._model.tidalampintp = stats["tidalamp"]
+            return
         if self._model.modality in ["ECG", "PPG"]:
             (self._model.periodintp,
              self._model.rateintp) = heart_stats(peaks=self._model.peaks,
@@ -374,6 +457,21 @@ class Controller(QObject):
                                                     signal=self._model.signal,
                                                     sfreq=self._model.sfreq)
 
+    def cancel(self):
+        """Cancel the running method, as well as queued methods.
+
+        Cancellation is cooperative: the running method stops at its next
+        cancellation check (see biopeaks.cancellation), before writing its
+        results to the Model. Batch processing stops once the running method
+        has stopped, and the Model is reset.
+        """
+        if not self.threadpool.activeThreadCount() and self._batchtoken is None:
+            return
+        self._model.status = "Cancelling."
+        self._token.cancel()
+        self._token = CancellationToken()    # for subsequent methods
+        self.threadpool.clear()
+
     def _batch_processor(self):
         """Process a set of files.
 
@@ -403,7 +501,21 @@ class Controller(QObject):
             self._model.status = "No statistics selected for saving."
             return
 
-        self._model.status = "Processing files."
+        self._manifest = BatchManifest(self._model.wdirstats)
+        if self._model.resumebatch:
+            nfiles = len(self._model.fpaths)
+            self._model.fpaths = self._manifest.pending(self._model.fpaths,
+                                                        self._batchparams())
+            nskipped = nfiles - len(self._model.fpaths)
+            if not self._model.fpaths:
+                self._model.status = "All files have already been processed."
+                self._manifest = None
+                self._model.wdirpeaks = None
+                self._model.wdirstats = None
+                return
+            self._model.status = f"Processing files ({nskipped} already processed)."
+        else:
+            self._model.status = "Processing files."
         self._model.plotting = False
 
         self.batchmethods = [self._load_channels, self.find_peaks,
@@ -411,6 +523,7 @@ class Controller(QObject):
                              self._save_stats]
         if self._model.wdirpeaks:    # optional
             self.batchmethods.append(self._save_peaks)
+        self.batchmethods.append(self._update_manifest)
 
         self.iterbatchmethods = iter(self.batchmethods)
 
@@ -421,6 +534,11 @@ class Controller(QObject):
     def _dispatcher(self, progress):
         if not progress:
             return
+        if self._batchtoken is not None and self._batchtoken.cancelled:
+            self._model.reset()
+            self._finish_batch()
+            self._model.status = "Cancelled batch processing."
+            return
 
         try:
             batchmethod = next(self.iterbatchmethods)
@@ -429,15 +547,27 @@ class Controller(QObject):
             self.iterbatchmethods = iter(self.batchmethods)    # restart cycling through batch methods
             batchmethod = next(self.iterbatchmethods)
             self._model.fpaths.pop(0)    # go to next file
+            self._tracker.finish_file()
 
             if not self._model.fpaths:    # all files have been processed
-                self._model.plotting = True
-                self._model.progress_changed.disconnect(self._dispatcher)
-                self._model.wdirpeaks = None
-                self._model.wdirstats = None
+                self._finish_batch()
                 return
 
         if batchmethod.__name__ == "_load_channels":    # set paths prior to calling first method
+            if self._prefetcher is None:    # read files ahead of their analysis
+                self._batchtoken = self._token
+                sizes = [filesize(path) for path in self._model.fpaths]
+                self._tracker = ProgressTracker(files_total=len(sizes),
+                                                bytes_total=sum(sizes),
+                                                callback=self._report_progress)
+                readfunc = partial(read_and_fingerprint,
+                                   partial(read_channels,
+                                           **self._channelinfo()))    # fingerprint on the I/O threads, such that inputs are read only once
+                self._prefetcher = Prefetcher(list(self._model.fpaths),
+                                              readfunc,
+                                              token=self._batchtoken,
+                                              tracker=self._tracker)
+            self._tracker.start_file(filesize(self._model.fpaths[0]))
             fname = Path(self._model.fpaths[0]).stem
             self._model.wpathstats = Path(self._model.wdirstats).joinpath(f"{fname}_stats.csv")
             if self._model.wdirpeaks:    # optional
@@ -445,17 +575,32 @@ class Controller(QObject):
 
         batchmethod()
 
+    def _finish_batch(self):
+        self._prefetcher.close()
+        self._prefetcher = None
+        self._manifest = None
+        self._fprint = None
+        self._batchtoken = None
+        self._tracker.callback = None    # ignore reports of remaining reads
+        self._tracker = None
+        self._model.progressevent = None
+        self._model.plotting = True
+        self._model.progress_changed.disconnect(self._dispatcher)
+        self._model.wdirpeaks = None
+        self._model.wdirstats = None
+
+    def _report_progress(self, event):
+        self._model.progressevent = event
+
     @threaded
     def _load_channels(self):
         self._model.status = "Loading file."
 
         path = self._model.fpaths[0]
-        filetype = self._model.filetype
-        readfunc = readfuncs[filetype]
-
-        biosignalinfo = (self._model.customheader if filetype == "Custom"
-                         else self._model.signalchan)
-        biosignal = readfunc(path, biosignalinfo, channeltype="signal")
+        if self._prefetcher is not None:    # batch processing
+            _, ((biosignal, marker), self._fprint) = self._prefetcher.get(path)
+        else:
+            biosignal, marker = read_channels(path, **self._channelinfo())
 
         if biosignal["error"]:
             self._model.status = biosignal["error"]
@@ -469,13 +614,8 @@ class Controller(QObject):
         self._model.loaded = True
         self._model.rpathsignal = path
 
-        markerinfo = (self._model.customheader if filetype == "Custom"
-                      else self._model.markerchan)
-        if filetype == "Custom" and markerinfo["markeridx"] is None:
+        if marker is None:
             return
-        if markerinfo == "none":
-            return
-        marker = readfunc(path, markerinfo, channeltype="marker")
 
         if marker["error"]:
             self._model.status = marker["error"]
@@ -484,13 +624,169 @@ class Controller(QObject):
         self._model.sfreqmarker = marker["sfreq"]    # only not set to None in case of EDF
         self._model.marker = marker["signal"]
 
+    @threaded
+    def _update_manifest(self):
+        """Record the current file in the manifest of the batch.
+
+        The file is recorded with the fingerprint that has been computed when
+        it was read (see _load_channels), i.e., the fingerprint of the content
+        that the outputs have been computed from.
+        """
+        if self._manifest is None:
+            return
+        path = self._model.fpaths[0]
+        outputs = [self._model.wpathstats]
+        if self._model.wdirpeaks:
+            outputs.append(self._model.wpathpeaks)
+        complete = (self._model.rateintp is not None and
+                    all(Path(output).exists() for output in outputs))
+        try:
+            if complete:
+                self._manifest.record(path, self._batchparams(),
+                                      outputs=outputs, fprint=self._fprint)
+            else:
+                self._manifest.record(path, self._batchparams(),
+                                      status="error",
+                                      error=self._model.status,
+                                      fprint=self._fprint)
+        except OSError:    # file has been moved or deleted
+            pass
+
+    def _batchparams(self):
+        """Collect the parameters of the batch from the Model."""
+        channelinfo = self._channelinfo()
+        savestats = [key for key, value in self._model.savestats.items()
+                     if value]
+        return batch_params(self._model.modality, channelinfo["filetype"],
+                            channelinfo["signalinfo"], savestats,
+                            self._model.correctbatchpeaks,
+                            self._model.wdirpeaks)
+
+    def _channelinfo(self):
+        """Collect the arguments of read_channels from the Model."""
+        filetype = self._model.filetype
+        if filetype == "Custom":
+            customheader = dict(self._model.customheader)
+            return {"filetype": filetype, "signalinfo": customheader,
+                    "markerinfo": customheader}
+        return {"filetype": filetype, "signalinfo": self._model.signalchan,
+                "markerinfo": self._model.markerchan}
+
+    def _edit_peakset(self, key_event):
+        """Delete or add the extremum closest to the cursor.
+
+        Returns whether the extrema changed.
+        """
+        cursor = self._model.sec.sample(key_event.xdata)
+        extend = int(np.rint(self._model.sfreq * 0.1))
+        searchrange = np.arange(cursor - extend, cursor + extend)    # search peak in a window of 200 msec, centered on selected x coordinate of cursor position
+        retainidcs = np.logical_and(searchrange > 0,
+                                    searchrange < self._model.signal.size)    # make sure that searchrange doesn't extend beyond signal
+        searchrange = searchrange[retainidcs]
+        if searchrange.size < 1:
+            return False
+        if key_event.key == 'd':
+            peak = self._peakset.nearest(cursor)
+            if peak is None or not searchrange[0] <= peak <= searchrange[-1]:    # only delete peaks that are within search range
+                return False
+            return self._peakset.remove(peak)
+        searchsignal = self._model.signal[searchrange]
+        locmax, _ = find_peaks_scipy(searchsignal)    # use Scipy's find_peaks to also detect local extrema that are plateaus
+        locmin, _ = find_peaks_scipy(searchsignal * -1)
+        locext = np.concatenate((locmax, locmin))
+        locext.sort(kind='mergesort')
+        if locext.size < 1:
+            return False
+        peakidx = np.argmin(np.abs(searchrange[locext] - cursor))
+        newpeak = searchrange[0] + locext[peakidx]
+        return self._peakset.add(newpeak)    # only adds new peak if it doesn't exist already
+
+    def _update_stats(self, edited):
+        """Update the statistics in place after the extrema have been edited.
+
+        Only updates cardiac statistics. Breathing statistics must be
+        re-calculated, since the alternation of breathing extrema is enforced
+        across all extrema (see resp.resp_stats).
+        """
+        if self._model.modality not in ["ECG", "PPG"]:
+            return
+        peaks = np.asarray(self._peakset)
+        periodintp, rateintp = self._model.periodintp, self._model.rateintp
+        if periodintp is None or rateintp is None or peaks.size < 2:
+            return
+        if periodintp.size != self._model.signal.size:
+            return
+        original = self._model.original
+        if original is not None and original["periodintp"] is not None:
+            if np.may_share_memory(periodintp, original["periodintp"]):    # don't modify the original statistics of a segmented dataset
+                periodintp, rateintp = periodintp.copy(), rateintp.copy()
+        update_heart_stats(periodintp, rateintp, peaks, self._model.sfreq,
+                           edited)
+        self._model.periodintp = periodintp
+        self._model.rateintp = rateintp
+
+    def _segment_peaks(self, peaks, begsamp, endsamp):
+        """Return the (sorted) extrema within a segment, relative to its start.
+
+        Extrema at the segment boundaries are excluded.
+        """
+        start = np.searchsorted(peaks, begsamp, side="right")
+        stop = np.searchsorted(peaks, endsamp, side="left")
+        return peaks[start:stop] - begsamp
+
+    def _restore_segments(self, segments):
+        """Restore the last of the segments from the original dataset.
+
+        If segments is empty, restore the entire original dataset.
+        """
+        original = self._model.original
+        peaks = self._model.peaks
+        if peaks is not None:    # merge extrema of current segment into the original extrema
+            begsamp, endsamp = self._model.segments[-1]["signal"]
+            peaks = peaks + begsamp
+            originalpeaks = original["peaks"]
+            if originalpeaks is not None:
+                head = np.searchsorted(originalpeaks, begsamp, side="right")
+                tail = np.searchsorted(originalpeaks, endsamp, side="left")
+                peaks = np.concatenate((originalpeaks[:head], peaks,
+                                        originalpeaks[tail:]))
+            if originalpeaks is None or not np.array_equal(peaks, originalpeaks):
+                original.update(peaks=peaks, periodintp=None, rateintp=None,
+                                tidalampintp=None)    # statistics don't match the extrema anymore
+
+        if segments:
+            begsamp, endsamp = segments[-1]["signal"]
+        else:
+            begsamp, endsamp = 0, original["signal"].size
+        self._model.segments = segments if segments else None
+        self._model.sec = TimeAxis(endsamp - begsamp, self._model.sfreq)
+        self._model.signal = original["signal"][begsamp:endsamp]
+        if original["peaks"] is not None:
+            self._model.peaks = (self._segment_peaks(original["peaks"],
+                                                     begsamp, endsamp)
+                                 if segments else original["peaks"])
+        for key in ["periodintp", "rateintp", "tidalampintp"]:
+            if original[key] is not None:
+                setattr(self._model, key, original[key][begsamp:endsamp])
+            elif getattr(self._model, key) is not None:
+                setattr(self._model, key, None)
+        if original["marker"] is not None:
+            begsamp, endsamp = (segments[-1]["marker"] if segments
+                                else (0, original["marker"].size))
+            self._model.marker = original["marker"][begsamp:endsamp]
+        if not segments:
+            self._model.original = None
+        self._model.status = ("Restored the previous segment." if segments
+                              else "Restored the entire signal.")
+
     @threaded
     def _save_channels(self):
         self._model.status = "Saving signal."
 
-        if self._model.segment is None:
+        if not self._model.segments:
             self._model.status = "Error: Cannot save non-segmented file."
             return
+        segment = self._model.segments[-1]["seconds"]    # relative to the original file
 
         filetype = self._model.filetype
         writefunc = writefuncs[filetype]
@@ -499,7 +795,7 @@ class Controller(QObject):
                       else self._model.sfreq)
 
         status = writefunc(self._model.rpathsignal, self._model.wpathsignal,
-                           self._model.segment, headerinfo)    # only io_utils.write_edf returns status, other write functions return None (no return)
+                           segment, headerinfo)    # only io_utils.write_edf returns status, other write functions return None (no return)
 
         if status:
             self._model.status = status
@@ -526,42 +822,15 @@ class Controller(QObject):
     @threaded
     def _save_peaks(self):
         self._model.status = "Saving peaks."
-
-        if self._model.modality != "RESP":
-            savearray = pd.DataFrame(self._model.peaks / self._model.sfreq)    # convert to seconds
-            savearray.to_csv(self._model.wpathpeaks, index=False,
-                             header=['peaks'])
-        elif self._model.modality == 'RESP':
-            extrema = ensure_peak_trough_alternation(self._model.peaks,
-                                                     self._model.signal)    # work on local copy of extrema to avoid call to plotting function
-            amps = self._model.signal[extrema]
-
-            if np.remainder(extrema.size, 2) != 0:
-                extrema = np.append(extrema, np.nan)    # pad extrema with NAN in order to ensure equal number of peaks and troughs
-
-            if amps[0] > amps[1]:    # determine if series starts with peak or trough to be able to save peaks and troughs separately
-                peaks = extrema[0:-1:2]
-                troughs = extrema[1::2]
-            elif amps[0] < amps[1]:
-                peaks = extrema[1::2]
-                troughs = extrema[0:-1:2]
-            savearray = np.column_stack((peaks / self._model.sfreq,
-                                         troughs / self._model.sfreq))    # make sure extrema are float: IMPORTANT, if seconds are saved as int, rounding errors (i.e. misplaced peaks) occur
-            savearray = pd.DataFrame(savearray)
-            savearray.to_csv(self._model.wpathpeaks, index=False,
-                             header=['peaks', 'troughs'], na_rep='nan')
+        write_peaks(self._model.wpathpeaks, self._model.peaks,
+                    self._model.sfreq, self._model.modality,
+                    signal=self._model.signal)
 
     @threaded
     def _save_stats(self):
-        savekeys = [key for key, value in self._model.savestats.items() if value]
-        savearray = np.zeros((self._model.signal.size, len(savekeys)))
-        for i, key in enumerate(savekeys):
-            if key == 'period':
-                savearray[:, i] = self._model.periodintp
-            if key == 'rate':
-                savearray[:, i] = self._model.rateintp
-            if key == 'tidalamp':
-                savearray[:, i] = self._model.tidalampintp
-        savearray = pd.DataFrame(savearray)
-        savearray.to_csv(self._model.wpathstats, index=False, header=savekeys,
-                         float_format="%.4f")
+        stats = {"period": self._model.periodintp,
+                 "rate": self._model.rateintp,
+                 "tidalamp": self._model.tidalampintp}
+        write_stats(self._model.wpathstats,
+                    {key: stats[key] for key, value
+                     in self._model.savestats.items() if value})
@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+"""The extrema detectors of each modality.
+
+Shared by the GUI (`controller`), the batch engine (`batch`), the
+processing of long recordings (`chunked`), and the result cache (`cache`).
+"""
+
+from biopeaks.heart import ecg_peaks, ppg_peaks
+from biopeaks.resp import resp_extrema
+
+
+peakfuncs = {"ECG": ecg_peaks,
+             "PPG": ppg_peaks,
+             "RESP": resp_extrema}
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""Event-related analysis of the statistics.
+
+Events are the onsets of the marker channel, i.e., the samples at which the
+marker rises above a threshold (see `marker_onsets`). Epochs are windows of an
+instantaneous statistic (e.g., the heart rate) that are time-locked to the
+events. The epochs of all events are gathered at once from a strided view of
+the statistic (see `epochs`). For each event, the statistic is averaged after
+the event and corrected for its baseline, i.e., its average preceding the
+event (see `event_stats`).
+
+Examples
+--------
+>>> onsets = marker_onsets(marker, sfreqmarker=200, sfreq=1000)
+>>> rateepochs, onsets = epochs(rateintp, onsets, 1000, tmin=-1, tmax=10)
+>>> events = event_stats({"period": periodintp, "rate": rateintp}, onsets,
+...                      1000, tmin=-1, tmax=10)
+"""
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def marker_onsets(marker, sfreqmarker=None, sfreq=None, threshold=None,
+                  mininterval=0.):
+    """Detect the onsets of events in a marker channel.
+
+    Parameters
+    ----------
+    marker : ndarray
+        Vector representing the marker channel.
+    sfreqmarker : float, optional
+        Sampling frequency of the marker channel. Default is None (same as
+        `sfreq`).
+    sfreq : float, optional
+        Sampling frequency of the signal the onsets refer to. Can differ from
+        `sfreqmarker` (e.g., in case of EDF files). Default is None (same as
+        `sfreqmarker`, i.e., onsets are returned in samples of the marker).
+    threshold : float, optional
+        An onset is the first sample above `threshold` after a sample at or
+        below `threshold`. Default is None (halfway between the minimum and
+        maximum of the marker).
+    mininterval : float, optional
+        Onsets that follow the preceding onset within less than `mininterval`
+        seconds are discarded (e.g., to debounce a noisy marker). Default is 0.
+
+    Returns
+    -------
+    onsets : ndarray of int
+        The onsets in samples of the signal.
+    """
+    marker = np.asarray(marker)
+    if marker.size < 2:
+        return np.empty(0, dtype=int)
+    if threshold is None:
+        threshold = (marker.min() + marker.max()) / 2
+    above = marker > threshold
+    onsets = np.flatnonzero(~above[:-1] & above[1:]) + 1
+
+    if sfreqmarker is None:
+        sfreqmarker = sfreq
+    if mininterval > 0 and sfreqmarker is not None:
+        intervals = np.diff(onsets, prepend=-np.inf)
+        onsets = onsets[intervals >= mininterval * sfreqmarker]
+    if sfreq is not None and sfreqmarker != sfreq:
+        onsets = np.rint(onsets * sfreq / sfreqmarker).astype(int)
+
+    return onsets
+
+
+def epochs(x, onsets, sfreq, tmin=-1., tmax=10.):
+    """Extract the windows of a signal around events.
+
+    Parameters
+    ----------
+    x : ndarray
+        The signal, e.g., an instantaneous statistic.
+    onsets : ndarray of int
+        The onsets of the events in samples of `x`.
+    sfreq : float
+        Sampling frequency of `x`.
+    tmin, tmax : float, optional
+        Start and end of the window relative to the onset in seconds (the end
+        is exclusive). Defaults are -1 and 10.
+
+    Returns
+    -------
+    epochs : ndarray
+        The windows, an event per row (n_events x n_samples). Column `i`
+        corresponds to `tmin + i / sfreq` seconds relative to the onset.
+    onsets : ndarray of int
+        The onsets of the events in `epochs`. Events whose window extends
+        beyond `x` are discarded.
+    """
+    x = np.asarray(x)
+    onsets = np.asarray(onsets, dtype=int)
+    first = int(np.rint(tmin * sfreq))
+    nsamp = int(np.rint(tmax * sfreq)) - first
+    if nsamp <= 0:
+        raise ValueError(f"tmax must be larger than tmin, got tmin={tmin} and"
+                         f" tmax={tmax}.")
+    starts = onsets + first
+    valid = (starts >= 0) & (starts + nsamp <= x.size)
+    if x.size < nsamp:
+        return np.empty((0, nsamp), dtype=x.dtype), onsets[valid]
+    windows = sliding_window_view(x, nsamp)    # view, a window per sample
+
+    return windows[starts[valid]], onsets[valid]
+
+
+def event_stats(stats, onsets, sfreq, tmin=-1., tmax=10.):
+    """Compute baseline-corrected averages of statistics for each event.
+
+    The baseline of an event is the average of a statistic in [tmin, 0)
+    seconds relative to the onset, the response is the average in [0, tmax)
+    minus the baseline.
+
+    Parameters
+    ----------
+    stats : dict
+        Maps the name of each statistic (e.g., "rate") to a vector containing
+        the instantaneous statistic. All vectors must have the same number of
+        elements.
+    onsets : ndarray of int
+        The onsets of the events in samples of the statistics.
+    sfreq : float
+        Sampling frequency of the statistics.
+    tmin : float, optional
+        Start of the baseline relative to the onset in seconds. Must be
+        negative. Default is -1.
+    tmax : float, optional
+        End of the response relative to the onset in seconds. Must be
+        positive. Default is 10.
+
+    Returns
+    -------
+    events : DataFrame
+        A row per event, containing the "onset" in seconds as well as the
+        "<statistic>_baseline" and "<statistic>_response" of each statistic.
+        Events whose window extends beyond the statistics are discarded.
+    """
+    first = int(np.rint(tmin * sfreq))
+    last = int(np.rint(tmax * sfreq))
+    if first >= 0 or last <= 0:
+        raise ValueError(f"tmin must be negative and tmax positive, got "
+                         f"tmin={tmin} and tmax={tmax}.")
+    onsets = np.asarray(onsets, dtype=int)
+    nsamp = min((np.size(x) for x in stats.values()), default=0)
+    onsets = onsets[(onsets + first >= 0) & (onsets + last <= nsamp)]
+
+    # Average the windows with cumulative sums instead of gathering the
+    # epochs, which is linear in the number of samples and events,
+    # independent of the window size.
+    events = {}
+    for key, x in stats.items():
+        baseline = _window_means(x, onsets + first, onsets)
+        events[f"{key}_baseline"] = baseline
+        events[f"{key}_response"] = (_window_means(x, onsets, onsets + last) -
+                                     baseline)
+    events = pd.DataFrame(events, index=pd.RangeIndex(onsets.size))
+    events.insert(0, "onset", onsets / sfreq)
+
+    return events
+
+
+def _window_means(x, starts, stops):
+    """Average x in the windows [starts, stops)."""
+    x = np.asarray(x, dtype=float)
+    offset = x.mean() if x.size else 0.    # center to limit the rounding errors of the cumulative sum
+    csum = np.concatenate(([0.], np.cumsum(x - offset)))
+    return (csum[stops] - csum[starts]) / (stops - starts) + offset
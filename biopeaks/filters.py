@@ -8,9 +8,32 @@ to the original signal since the filtering is performed in both directions
 
 Following SciPy recommendations, the second-order sections format is used to
 avoid numerical error with transfer function (ba) format.
+
+By default, signals are filtered in double precision. All filters accept a
+`dtype` argument (e.g., `np.float32`), that casts the signal as well as the
+filter coefficients to that type, such that the filtered signal and all
+intermediate results are computed in that precision.
+
+The IIR filters accept a `backend` argument. "sos" (default) uses
+scipy.signal.sosfiltfilt. "fft" applies the squared magnitude response of
+the filter (i.e., the response of the forward-backward filter) in the
+frequency domain, using overlap-add blocks whose FFTs are distributed across
+`workers` threads. The impulse response of the filter is truncated once it
+has decayed to 1e-10 of its maximum. Beyond one impulse response length from
+the edges of the signal, the "fft" backend matches sosfiltfilt to a relative
+error of about 1e-8. Within one impulse response length of the edges (e.g.,
+about 17 s for the .5 Hz high-pass filter of the ECG), the two backends
+handle the edges differently and their outputs differ. The "fft" backend
+is strictly opt-in: "auto" selects "sos". On a single CPU, "fft" was about
+20x slower than sosfiltfilt on 30 s of ECG at 1000 Hz, and still about 2x
+slower on 2 ** 22 and 2 ** 24 samples (.5 Hz high-pass), such that there is
+no measured signal length for which "fft" is the better default.
 """
 
-from scipy.signal import butter, sosfiltfilt, filtfilt
+import os
+from scipy.signal import (butter, sosfilt, sosfiltfilt, filtfilt,
+                          resample_poly, iirnotch, tf2sos)
+from scipy.fft import rfft, irfft, next_fast_len
 import numpy as np
 
 
@@ -37,7 +60,8 @@ def _butter_lowpass(cutoff, sfreq, order=5):
     return sos
 
 
-def butter_lowpass_filter(signal, cutoff, sfreq, order=5):
+def butter_lowpass_filter(signal, cutoff, sfreq, order=5, dtype=None,
+                          backend="sos", workers=None):
     """Apply IIR low-pass Butterworth filter.
 
     Parameters
@@ -50,6 +74,15 @@ def butter_lowpass_filter(signal, cutoff, sfreq, order=5):
         Sampling frequency of `signal`.
     order : int, optional
         Filter order, by default 5.
+    dtype : data-type, optional
+        Precision of the filtering (e.g., np.float32). By default None (double
+        precision).
+    backend : str, optional
+        One of {"sos", "fft", "auto"}. See module documentation. By default
+        "sos".
+    workers : int, optional
+        Number of threads used by the "fft" backend. By default None (all
+        CPUs).
 
     Returns
     -------
@@ -57,7 +90,8 @@ def butter_lowpass_filter(signal, cutoff, sfreq, order=5):
         The filtered signal.
     """
     sos = _butter_lowpass(cutoff, sfreq, order=order)
-    y = sosfiltfilt(sos, signal)
+    signal, sos = _cast(signal, sos, dtype=dtype)
+    y = _zero_phase_filter(sos, signal, backend=backend, workers=workers)
     return y
 
 
@@ -84,7 +118,8 @@ def _butter_highpass(cutoff, sfreq, order=5):
     return sos
 
 
-def butter_highpass_filter(signal, cutoff, sfreq, order=5):
+def butter_highpass_filter(signal, cutoff, sfreq, order=5, dtype=None,
+                           backend="sos", workers=None):
     """Apply IIR high-pass Butterworth filter.
 
     Parameters
@@ -97,6 +132,15 @@ def butter_highpass_filter(signal, cutoff, sfreq, order=5):
         Sampling frequency of `signal`.
     order : int, optional
         Filter order, by default 5.
+    dtype : data-type, optional
+        Precision of the filtering (e.g., np.float32). By default None (double
+        precision).
+    backend : str, optional
+        One of {"sos", "fft", "auto"}. See module documentation. By default
+        "sos".
+    workers : int, optional
+        Number of threads used by the "fft" backend. By default None (all
+        CPUs).
 
     Returns
     -------
@@ -104,7 +148,8 @@ def butter_highpass_filter(signal, cutoff, sfreq, order=5):
         The filtered signal.
     """
     sos = _butter_highpass(cutoff, sfreq, order=order)
-    y = sosfiltfilt(sos, signal)
+    signal, sos = _cast(signal, sos, dtype=dtype)
+    y = _zero_phase_filter(sos, signal, backend=backend, workers=workers)
     return y
 
 
@@ -132,7 +177,8 @@ def _butter_bandpass(lowcut, highcut, sfreq, order=5):
     return sos
 
 
-def butter_bandpass_filter(signal, lowcut, highcut, sfreq, order=5):
+def butter_bandpass_filter(signal, lowcut, highcut, sfreq, order=5,
+                           dtype=None, backend="sos", workers=None):
     """Apply IIR band-pass Butterworth filter.
 
     Parameters
@@ -145,6 +191,15 @@ def butter_bandpass_filter(signal, lowcut, highcut, sfreq, order=5):
         Sampling frequency of `signal`.
     order : int, optional
         Filter order, by default 5.
+    dtype : data-type, optional
+        Precision of the filtering (e.g., np.float32). By default None (double
+        precision).
+    backend : str, optional
+        One of {"sos", "fft", "auto"}. See module documentation. By default
+        "sos".
+    workers : int, optional
+        Number of threads used by the "fft" backend. By default None (all
+        CPUs).
 
     Returns
     -------
@@ -152,11 +207,13 @@ def butter_bandpass_filter(signal, lowcut, highcut, sfreq, order=5):
         The filtered signal.
     """
     sos = _butter_bandpass(lowcut, highcut, sfreq, order=order)
-    y = sosfiltfilt(sos, signal)
+    signal, sos = _cast(signal, sos, dtype=dtype)
+    y = _zero_phase_filter(sos, signal, backend=backend, workers=workers)
     return y
 
 
-def moving_average(signal, window_size):
+def moving_average(signal, window_size, dtype=None, workspace=None,
+                   out=None):
     """Apply a moving average filter.
 
     Parameters
@@ -165,21 +222,70 @@ def moving_average(signal, window_size):
         The signal to be filtered.
     window_size : int
         The width of the filter kernel in samples.
+    dtype : data-type, optional
+        Precision of the filtering (e.g., np.float32). By default None (double
+        precision).
+    workspace : DetectorWorkspace, optional
+        If provided, the average is computed from a running sum (in double
+        precision) that is stored in `workspace`, such that the run time does
+        not depend on `window_size`. By default None (convolve `signal` with
+        the kernel). Ignored if `window_size` exceeds the length of `signal`.
+    out : ndarray, optional
+        Only used if `workspace` is provided. Array with the same number of
+        elements as `signal` that the filtered signal is written to. By default
+        None (allocate the output).
 
     Returns
     -------
     y : ndarray
         The filtered signal.
     """
-    y = np.convolve(signal, np.ones((window_size,)) / window_size, mode="same")
+    if workspace is not None and window_size <= signal.size:
+        return _running_average(signal, window_size, workspace, out=out,
+                                dtype=dtype)
+    kernel = np.ones((window_size,)) / window_size
+    signal, kernel = _cast(signal, kernel, dtype=dtype)
+    y = np.convolve(signal, kernel, mode="same")
     return y
 
 
-def powerline_filter(signal, sfreq):
-    """Apply a 50Hz powerline filter.
+def _running_average(signal, window_size, workspace, out=None, dtype=None):
+    """Moving average computed from the cumulative sum of the signal.
 
-    Smooth out 50Hz powerline noise with a kernel the width of one period of
-    50 Hz.
+    Matches np.convolve(signal, kernel, mode="same") with a boxcar kernel of
+    `window_size` elements, i.e., the signal is zero-padded at the edges.
+    """
+    nsamp = signal.size
+    if dtype is None:
+        dtype = (signal.dtype if np.issubdtype(signal.dtype, np.floating)
+                 else workspace.dtype)    # don't truncate the average of integer signals
+    if out is None:
+        out = np.empty(nsamp, dtype=dtype)
+    cumsum = workspace.get("running_sum", nsamp + 1, np.float64)
+    cumsum[0] = 0
+    np.cumsum(signal, out=cumsum[1:], dtype=np.float64)
+
+    # The window of sample i spans the samples [i - right, i + left).
+    right = window_size // 2
+    left = (window_size - 1) // 2 + 1
+    edges = sorted({0, min(right, nsamp), max(nsamp - left, 0), nsamp})
+    for beg, end in zip(edges[:-1], edges[1:]):
+        if beg == end:
+            continue
+        upper = (cumsum[beg + left:end + left] if end + left <= nsamp
+                 else cumsum[nsamp])
+        lower = cumsum[beg - right:end - right] if beg >= right else 0.
+        np.subtract(upper, lower, out=out[beg:end], casting="same_kind")
+    np.divide(out, window_size, out=out)
+
+    return out
+
+
+def powerline_filter(signal, sfreq, mainsfreq=50, method="boxcar",
+                     harmonics=None, dtype=None, backend="sos", workers=None):
+    """Apply a powerline filter.
+
+    Attenuate powerline noise at the mains frequency and its harmonics.
 
     Parameters
     ----------
@@ -187,16 +293,270 @@ def powerline_filter(signal, sfreq):
         The signal to be filtered.
     sfreq : int
         Sampling frequency of `signal`.
+    mainsfreq : float, optional
+        Frequency of the mains in Hz (50 in most of Europe, Asia, and Africa;
+        60 in most of the Americas). By default 50.
+    method : str, optional
+        One of {"boxcar", "notch"}. "boxcar" smoothes the signal with a kernel
+        the width of one period of `mainsfreq`, applied forward and backward.
+        The kernel has zeros at `mainsfreq` and all of its harmonics, provided
+        that `sfreq` is a multiple of `mainsfreq`. It is computed from running
+        sums, such that the run time does not depend on the width of the
+        kernel. "notch" applies a cascade of IIR notch filters (zero-phase) at
+        `mainsfreq` and its harmonics, which preserves the signal outside of
+        the notches, at the expense of a longer run time. By default "boxcar".
+    harmonics : int, optional
+        Only used if `method` is "notch". Number of multiples of `mainsfreq`
+        (including `mainsfreq`) that are attenuated. By default None (all
+        multiples below the Nyquist frequency).
+    dtype : data-type, optional
+        Precision of the filtering (e.g., np.float32). By default None (double
+        precision).
+    backend : str, optional
+        Only used if `method` is "notch". One of {"sos", "fft", "auto"}. See
+        module documentation. By default "sos".
+    workers : int, optional
+        Number of threads used by the "fft" backend. By default None (all
+        CPUs).
 
     Returns
     -------
     y : ndarray
         The filtered signal.
     """
-    if sfreq >= 100:
-        b = np.ones(int(sfreq / 50))
+    if method == "notch":
+        sos = _powerline_notch(sfreq, mainsfreq, harmonics=harmonics)
+        if sos.size == 0:
+            return _cast(signal, dtype=dtype)[0]
+        signal, sos = _cast(signal, sos, dtype=dtype)
+        return _zero_phase_filter(sos, signal, backend=backend,
+                                  workers=workers)
+
+    if sfreq >= 2 * mainsfreq:
+        kernel_size = int(sfreq / mainsfreq)
     else:
-        b = np.ones(2)
-    a = [len(b)]
-    y = filtfilt(b, a, signal, method="pad")
+        kernel_size = 2
+    signal, = _cast(signal, dtype=dtype)
+    padlen = 3 * kernel_size
+    if signal.size <= padlen:    # let filtfilt raise the error for short signals
+        b = np.ones(kernel_size)
+        return filtfilt(b, [kernel_size], signal, method="pad")
+    y = _boxcar_filtfilt(signal, kernel_size, padlen)
     return y
+
+
+def _boxcar_filtfilt(signal, kernel_size, padlen):
+    """Forward-backward boxcar filter computed from running sums.
+
+    Equivalent to filtfilt(np.ones(kernel_size), [kernel_size], signal,
+    method="pad", padlen=padlen): the signal is extended by an odd reflection
+    at both ends and each pass starts in the steady state of the first sample
+    (see scipy.signal.lfilter_zi).
+    """
+    offset = signal[0]    # center the running sums in order to reduce rounding errors
+    centered = signal - offset
+    extended = np.concatenate((-centered[padlen:0:-1],
+                               centered,
+                               2 * centered[-1] - centered[-2:-padlen - 2:-1]))
+
+    forward = _causal_boxcar(extended, kernel_size)
+    backward = _causal_boxcar(forward[::-1], kernel_size)[::-1]
+
+    y = backward[padlen:padlen + signal.size]
+    y += offset
+    return y
+
+
+def _causal_boxcar(signal, kernel_size):
+    """Causal moving average, initialized with the first sample.
+
+    The running sum is accumulated in double precision regardless of the
+    precision of `signal`.
+    """
+    cumsum = np.empty(signal.size + kernel_size, dtype=np.float64)
+    cumsum[0] = 0
+    cumsum[1:kernel_size] = signal[0]    # steady state before the first sample
+    cumsum[kernel_size:] = signal
+    np.cumsum(cumsum, out=cumsum)
+    y = cumsum[kernel_size:] - cumsum[:-kernel_size]
+    y /= kernel_size
+    if not np.issubdtype(signal.dtype, np.floating):    # never truncate to integers
+        return y
+    return y.astype(signal.dtype, copy=False)
+
+
+def _powerline_notch(sfreq, mainsfreq, harmonics=None, quality=30):
+    """Design a comb of IIR notch filters at the mains frequency.
+
+    Parameters
+    ----------
+    sfreq : int
+        Sampling frequency of signal.
+    mainsfreq : float
+        Frequency of the mains.
+    harmonics : int, optional
+        Number of multiples of `mainsfreq` to be attenuated, by default None
+        (all multiples below the Nyquist frequency).
+    quality : float, optional
+        Quality factor of each notch, by default 30.
+
+    Returns
+    -------
+    sos : ndarray
+        Second-order sections representation of the IIR filter.
+    """
+    nyq = 0.5 * sfreq
+    n_harmonics = int(np.ceil(nyq / mainsfreq)) - 1    # multiples below nyq
+    if harmonics is not None:
+        n_harmonics = min(n_harmonics, harmonics)
+    sections = [tf2sos(*iirnotch(i * mainsfreq, quality, fs=sfreq))
+                for i in range(1, n_harmonics + 1)]
+    if not sections:
+        return np.empty((0, 6))
+    return np.concatenate(sections)
+
+
+def decimate_signal(signal, factor, dtype=None):
+    """Downsample a signal by an integer factor.
+
+    The signal is low-pass filtered with a zero-phase polyphase FIR filter
+    before downsampling in order to avoid aliasing. Sample i of the decimated
+    signal corresponds to sample i * `factor` of `signal`.
+
+    Parameters
+    ----------
+    signal : ndarray
+        The signal to be decimated.
+    factor : int
+        The downsampling factor.
+    dtype : data-type, optional
+        Precision of the filtering (e.g., np.float32). By default None (double
+        precision).
+
+    Returns
+    -------
+    y : ndarray
+        The decimated signal.
+
+    See Also
+    --------
+    scipy.signal.resample_poly
+    """
+    signal, = _cast(signal, dtype=dtype)
+    y = resample_poly(signal, 1, factor)
+    return y
+
+
+def _zero_phase_filter(sos, signal, backend="sos", workers=None):
+    """Filter a signal forward and backward with an IIR filter.
+
+    Parameters
+    ----------
+    sos : ndarray
+        Second-order sections representation of the IIR filter.
+    signal : ndarray
+        The signal to be filtered.
+    backend : str, optional
+        One of {"sos", "fft", "auto"}, by default "sos".
+    workers : int, optional
+        Number of threads used by the "fft" backend, by default None (all
+        CPUs).
+
+    Returns
+    -------
+    y : ndarray
+        The filtered signal.
+    """
+    workers = os.cpu_count() if workers is None else workers
+    if backend == "auto":    # "fft" is opt-in, see module documentation
+        backend = "sos"
+    if backend == "sos":
+        return sosfiltfilt(sos, signal)
+    if backend == "fft":
+        return _fft_filtfilt(sos, signal, workers)
+    raise ValueError(f"Unknown filter backend {backend}. Choose one of"
+                     " 'sos', 'fft', 'auto'.")
+
+
+def _impulse_response(sos, tol=1e-10):
+    """Compute the impulse response of an IIR filter up to a tolerance.
+
+    The impulse response is truncated after the last sample whose magnitude
+    exceeds `tol` times the maximal magnitude.
+    """
+    nsamp = 1024
+    while True:
+        impulse = np.zeros(nsamp)
+        impulse[0] = 1
+        h = sosfilt(sos, impulse)
+        threshold = tol * np.max(np.abs(h))
+        if np.max(np.abs(h[nsamp // 2:])) < threshold:
+            break
+        nsamp *= 2
+    last = np.nonzero(np.abs(h) >= threshold)[0][-1]
+    return h[:last + 1]
+
+
+def _fft_filtfilt(sos, signal, workers):
+    """Forward-backward IIR filter in the frequency domain.
+
+    The squared magnitude response of the filter (with zero phase) is applied
+    to overlapping blocks of the signal (overlap-add). The FFTs of groups of
+    blocks are computed in parallel. The signal is extended by an odd
+    reflection of one impulse response length at both ends. The filtering is
+    computed in the precision of floating point signals, and in double
+    precision otherwise.
+    """
+    dtype = (signal.dtype if np.issubdtype(signal.dtype, np.floating)
+             else np.float64)
+    signal = signal.astype(dtype, copy=False)
+    h = _impulse_response(sos).astype(dtype)
+    n_taps = h.size
+    kernel_size = 2 * n_taps - 1    # autocorrelation of the impulse response
+    nfft = next_fast_len(max(8 * kernel_size, 2 ** 16), real=True)
+    blocksize = nfft - kernel_size + 1
+
+    response = np.abs(rfft(h, nfft)) ** 2
+    kernel = np.roll(irfft(response, nfft), n_taps - 1)[:kernel_size]    # delay the kernel to make it causal
+    kernel = rfft(kernel, nfft)
+
+    padlen = min(n_taps, signal.size - 1)
+    extended = np.concatenate((2 * signal[0] - signal[padlen:0:-1],
+                               signal,
+                               2 * signal[-1] - signal[-2:-padlen - 2:-1]))
+    n_blocks = -(-extended.size // blocksize)
+    y = np.zeros(n_blocks * blocksize + nfft, dtype=dtype)
+
+    groupsize = 2 * max(workers, 1)
+    for first in range(0, n_blocks, groupsize):
+        last = min(first + groupsize, n_blocks)
+        blocks = np.zeros((last - first, nfft), dtype=dtype)
+        segment = extended[first * blocksize:last * blocksize]
+        for i in range(last - first):
+            block = segment[i * blocksize:(i + 1) * blocksize]
+            blocks[i, :block.size] = block
+        spectra = rfft(blocks, axis=-1, workers=workers)
+        spectra *= kernel
+        blocks = irfft(spectra, nfft, axis=-1, workers=workers)
+        for i, block in enumerate(blocks):
+            offset = (first + i) * blocksize
+            y[offset:offset + nfft] += block
+
+    start = n_taps - 1 + padlen    # compensate the delay and the padding
+    return y[start:start + signal.size]
+
+
+def _cast(signal, *coefficients, dtype=None):
+    """Cast a signal and filter coefficients to the precision of the filtering.
+
+    Leave the arrays untouched if `dtype` is None, except for signals that are
+    not floating point (e.g., int16 channels of EDF files), which are promoted
+    to double precision.
+    """
+    if dtype is None:
+        signal = np.asarray(signal)
+        if not np.issubdtype(signal.dtype, np.floating):
+            signal = signal.astype(np.float64)
+        return (signal, *coefficients)
+    return tuple(np.asarray(array, dtype=dtype) for array in
+                 (signal, *coefficients))
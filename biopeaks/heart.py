@@ -7,13 +7,21 @@ import matplotlib.pyplot as plt
 from matplotlib.patches import Polygon
 from scipy.signal import find_peaks
 from biopeaks.filters import (butter_highpass_filter, powerline_filter,
-                              moving_average, butter_bandpass_filter)
-from biopeaks.analysis_utils import find_segments, interp_stats
+                              moving_average, butter_bandpass_filter,
+                              decimate_signal)
+from biopeaks.analysis_utils import (find_segments, interp_stats,
+                                     abs_gradient, DetectorWorkspace,
+                                     decimation_factor, refine_peaks)
+from biopeaks.profiling import stage, profiled
+from biopeaks.cancellation import check_cancelled
+from biopeaks.progress import report_progress
 
 
+@profiled("ecg_peaks")
 def ecg_peaks(signal, sfreq, smoothwindow=.1, avgwindow=.75,
               gradthreshweight=1.5, minlenweight=.4, mindelay=.3,
-              enable_plot=False):
+              enable_plot=False, dtype=None, workspace=None, decimate=False,
+              mainsfreq=50, powerline_method="boxcar", return_segments=False):
     """Detect R-peaks in an electrocardiogram (ECG).
 
     QRS complexes are detected based on the steepness of the absolute gradient
@@ -47,25 +55,76 @@ def ecg_peaks(signal, sfreq, smoothwindow=.1, avgwindow=.75,
     enable_plot : bool, optional
         Visualize `signal` along with the detection thresholds, as well as the
         detected QRS complexes and R-peaks. Default is False.
+    dtype : data-type, optional
+        Precision of the filtered signal and all intermediate results. Pass
+        np.float32 in order to halve the memory footprint of long recordings.
+        Default is None (the dtype of `workspace` if provided, else double
+        precision).
+    workspace : DetectorWorkspace, optional
+        Buffers for the intermediate results. Pass the same workspace to
+        consecutive calls in order to re-use the buffers (see
+        `DetectorWorkspace`). Default is None.
+    decimate : bool, optional
+        Detect the R-peaks in a version of `signal` that has been downsampled
+        to about 250 Hz (see `decimation_factor`), and subsequently refine
+        each R-peak to the local maximum in `signal`. Speeds up the detection
+        for high sampling frequencies. Default is False.
+    mainsfreq : float, optional
+        Frequency of the powerline noise that is removed from `signal`. In Hz.
+        Default is 50.
+    powerline_method : str, optional
+        One of {"boxcar", "notch"}. See `powerline_filter`. Default is
+        "boxcar".
+    return_segments : bool, optional
+        Also return the QRS complexes that contain the R-peaks (e.g., for
+        `beats.beat_table`). Default is False.
 
     Returns
     -------
     peaks : ndarray
         The samples within `signal` that mark the occurrences of R-peaks.
+    segments : ndarray
+        Only returned if `return_segments` is True. The first and last + 1
+        sample of the QRS complex of each R-peak (n_peaks x 2).
     """
     if enable_plot:
         plt.figure()
         ax1 = plt.subplot(211)
         ax2 = plt.subplot(212, sharex=ax1)
 
-    filt = butter_highpass_filter(signal, .5, sfreq)
-    filt = powerline_filter(filt, sfreq)
-
-    grad = np.gradient(filt)
-    absgrad = np.abs(grad)
-    smoothgrad = moving_average(absgrad, int(np.rint(smoothwindow * sfreq)))
-    avggrad = moving_average(smoothgrad, int(np.rint(avgwindow * sfreq)))
-    gradthreshold = gradthreshweight * avggrad
+    if workspace is None:
+        workspace = DetectorWorkspace()    # buffers only live for this call
+    if dtype is None:
+        dtype = workspace.dtype
+
+    original = signal
+    factor = decimation_factor(sfreq, "ECG") if decimate else 1
+    if factor > 1:
+        with stage("ecg_peaks.decimate"):
+            signal = decimate_signal(signal, factor, dtype=dtype)
+        sfreq /= factor
+    nsamp = signal.size
+
+    with stage("ecg_peaks.highpass"):
+        filt = butter_highpass_filter(signal, .5, sfreq, dtype=dtype)
+    with stage("ecg_peaks.powerline"):
+        filt = powerline_filter(filt, sfreq, mainsfreq=mainsfreq,
+                                method=powerline_method, dtype=dtype)
+
+    with stage("ecg_peaks.gradient"):
+        absgrad = abs_gradient(filt, out=workspace.get("absgrad", nsamp,
+                                                       dtype))
+    with stage("ecg_peaks.smooth"):
+        smoothgrad = moving_average(absgrad,
+                                    int(np.rint(smoothwindow * sfreq)),
+                                    dtype=dtype, workspace=workspace,
+                                    out=workspace.get("smoothgrad", nsamp,
+                                                      dtype))
+    with stage("ecg_peaks.average"):
+        avggrad = moving_average(smoothgrad, int(np.rint(avgwindow * sfreq)),
+                                 dtype=dtype, workspace=workspace,
+                                 out=workspace.get("avggrad", nsamp, dtype))
+    gradthreshold = np.multiply(avggrad, gradthreshweight, out=avggrad)
     mindelay = int(np.rint(sfreq * mindelay))
 
     if enable_plot:
@@ -73,39 +132,55 @@ def ecg_peaks(signal, sfreq, smoothwindow=.1, avgwindow=.75,
         ax2.plot(smoothgrad)
         ax2.plot(gradthreshold)
 
-    qrs = smoothgrad > gradthreshold
-    beg_qrs, end_qrs, durations_qrs = find_segments(qrs)
+    with stage("ecg_peaks.segments"):
+        qrs = np.greater(smoothgrad, gradthreshold,
+                         out=workspace.get("mask", nsamp, bool))
+        beg_qrs, end_qrs, durations_qrs = find_segments(qrs)
 
     # Identify R-peaks within QRS (ignore QRS that are too short).
     min_len = np.mean(durations_qrs) * minlenweight
     peaks = [0]
+    segments = []
 
-    for beg, end, duration in zip(beg_qrs, end_qrs, durations_qrs):
+    with stage("ecg_peaks.qrs_loop"):
+        for beg, end, duration in zip(beg_qrs, end_qrs, durations_qrs):
 
-        if duration < min_len:
-            continue
+            check_cancelled()
+            if duration < min_len:
+                continue
 
-        if enable_plot:
-            ax2.axvspan(beg, end, facecolor="m", alpha=0.5)    # visualize QRS
+            if enable_plot:
+                ax2.axvspan(beg, end, facecolor="m", alpha=0.5)    # visualize QRS
 
-        data = signal[beg:end]
-        locmax, props = find_peaks(data, prominence=(None, None))    # find local maxima and their prominence within QRS
+            data = signal[beg:end]
+            locmax, props = find_peaks(data, prominence=(None, None))    # find local maxima and their prominence within QRS
 
-        if locmax.size > 0:
-            peak = beg + locmax[np.argmax(props["prominences"])]    # identify most prominent local maximum
-            if peak - peaks[-1] > mindelay:    # enforce minimum delay between R-peaks
-                peaks.append(peak)
+            if locmax.size > 0:
+                peak = beg + locmax[np.argmax(props["prominences"])]    # identify most prominent local maximum
+                if peak - peaks[-1] > mindelay:    # enforce minimum delay between R-peaks
+                    peaks.append(peak)
+                    segments.append((beg, end))
 
     peaks.pop(0)
 
     if enable_plot:
         ax1.scatter(peaks, filt[peaks], c="r")
 
-    return np.asarray(peaks).astype(int)
+    peaks = np.asarray(peaks).astype(int)
+    if factor > 1:
+        with stage("ecg_peaks.refine"):
+            peaks = refine_peaks(original, peaks * factor, factor)
+    report_progress(samples=original.size)
+
+    if return_segments:
+        return peaks, _scale_segments(segments, factor, original.size)
+    return peaks
 
 
+@profiled("ppg_peaks")
 def ppg_peaks(signal, sfreq, peakwindow=.111, beatwindow=.667, beatoffset=.02,
-              mindelay=.3, enable_plot=False):
+              mindelay=.3, enable_plot=False, dtype=None, workspace=None,
+              decimate=False, return_segments=False):
     """Detect systolic peaks in a photoplethysmogram (PPG).
 
     Implementation of "Method IV: Event-Related Moving Averages with Dynamic
@@ -130,11 +205,31 @@ def ppg_peaks(signal, sfreq, peakwindow=.111, beatwindow=.667, beatoffset=.02,
     enable_plot : bool, optional
         Visualize `signal` along with the detection thresholds, as well as the
         detected PPG waves and systolic peaks. Default is False.
+    dtype : data-type, optional
+        Precision of the filtered signal and all intermediate results. Pass
+        np.float32 in order to halve the memory footprint of long recordings.
+        Default is None (the dtype of `workspace` if provided, else double
+        precision).
+    workspace : DetectorWorkspace, optional
+        Buffers for the intermediate results. Pass the same workspace to
+        consecutive calls in order to re-use the buffers (see
+        `DetectorWorkspace`). Default is None.
+    decimate : bool, optional
+        Detect the systolic peaks in a version of `signal` that has been
+        downsampled to about 50 Hz (see `decimation_factor`), and subsequently
+        refine each peak to the local maximum in `signal`. Speeds up the
+        detection for high sampling frequencies. Default is False.
+    return_segments : bool, optional
+        Also return the waves that contain the systolic peaks (e.g., for
+        `beats.beat_table`). Default is False.
 
     Returns
     -------
     peaks : ndarray
         The samples within `signal` that mark the occurrences of systolic peaks.
+    segments : ndarray
+        Only returned if `return_segments` is True. The first and last + 1
+        sample of the wave of each systolic peak (n_peaks x 2).
 
     References
     ----------
@@ -146,14 +241,33 @@ def ppg_peaks(signal, sfreq, peakwindow=.111, beatwindow=.667, beatoffset=.02,
     if enable_plot:
         fig, (ax0, ax1) = plt.subplots(nrows=2, ncols=1, sharex=True)
 
-    filt = butter_bandpass_filter(signal, lowcut=.5, highcut=8, sfreq=sfreq,
-                                  order=3)
-    filt[filt < 0] = 0
-    sqrd = filt**2
-
-    ma_peak = moving_average(sqrd, int(np.rint(peakwindow * sfreq)))
-    ma_beat = moving_average(sqrd, int(np.rint(beatwindow * sfreq)))
-    thr1 = ma_beat + beatoffset * np.mean(sqrd)
+    if workspace is None:
+        workspace = DetectorWorkspace()    # buffers only live for this call
+    if dtype is None:
+        dtype = workspace.dtype
+
+    original = signal
+    factor = decimation_factor(sfreq, "PPG") if decimate else 1
+    if factor > 1:
+        with stage("ppg_peaks.decimate"):
+            signal = decimate_signal(signal, factor, dtype=dtype)
+        sfreq /= factor
+    nsamp = signal.size
+
+    with stage("ppg_peaks.bandpass"):
+        filt = butter_bandpass_filter(signal, lowcut=.5, highcut=8,
+                                      sfreq=sfreq, order=3, dtype=dtype)
+    np.maximum(filt, 0, out=filt)
+    sqrd = np.square(filt, out=workspace.get("sqrd", nsamp, dtype))
+
+    with stage("ppg_peaks.average"):
+        ma_peak = moving_average(sqrd, int(np.rint(peakwindow * sfreq)),
+                                 dtype=dtype, workspace=workspace,
+                                 out=workspace.get("ma_peak", nsamp, dtype))
+        ma_beat = moving_average(sqrd, int(np.rint(beatwindow * sfreq)),
+                                 dtype=dtype, workspace=workspace,
+                                 out=workspace.get("ma_beat", nsamp, dtype))
+    thr1 = np.add(ma_beat, beatoffset * np.mean(sqrd), out=ma_beat)
 
     if enable_plot:
         ax0.plot(signal)
@@ -162,38 +276,59 @@ def ppg_peaks(signal, sfreq, peakwindow=.111, beatwindow=.667, beatoffset=.02,
         ax1.plot(thr1, label="threshold")
         ax1.legend(loc="upper right")
 
-    waves = ma_peak > thr1
-    beg_waves, end_waves, duration_waves = find_segments(waves)
+    with stage("ppg_peaks.segments"):
+        waves = np.greater(ma_peak, thr1,
+                           out=workspace.get("mask", nsamp, bool))
+        beg_waves, end_waves, duration_waves = find_segments(waves)
 
     min_len = int(np.rint(peakwindow * sfreq))
     min_delay = int(np.rint(mindelay * sfreq))
     peaks = [0]
+    segments = []
 
-    for beg, end, duration in zip(beg_waves, end_waves, duration_waves):
+    with stage("ppg_peaks.wave_loop"):
+        for beg, end, duration in zip(beg_waves, end_waves, duration_waves):
 
-        if duration < min_len:
-            continue
+            check_cancelled()
+            if duration < min_len:
+                continue
 
-        if enable_plot:
-            ax1.axvspan(beg, end, facecolor="m", alpha=0.5)    # visualize waves
+            if enable_plot:
+                ax1.axvspan(beg, end, facecolor="m", alpha=0.5)    # visualize waves
 
-        data = signal[beg:end]
-        locmax, props = find_peaks(data, prominence=(None, None))    # find local maxima and their prominence within waves
+            data = signal[beg:end]
+            locmax, props = find_peaks(data, prominence=(None, None))    # find local maxima and their prominence within waves
 
-        if locmax.size > 0:
+            if locmax.size > 0:
 
-            peak = beg + locmax[np.argmax(props["prominences"])]    # identify most prominent local maximum
-            if peak - peaks[-1] > min_delay:    # enforce minimum delay between systolic peaks
-                peaks.append(peak)
+                peak = beg + locmax[np.argmax(props["prominences"])]    # identify most prominent local maximum
+                if peak - peaks[-1] > min_delay:    # enforce minimum delay between systolic peaks
+                    peaks.append(peak)
+                    segments.append((beg, end))
 
     peaks.pop(0)
 
     if enable_plot:
         ax0.scatter(peaks, signal[peaks], c="r")
 
-    return np.asarray(peaks).astype(int)
+    peaks = np.asarray(peaks).astype(int)
+    if factor > 1:
+        with stage("ppg_peaks.refine"):
+            peaks = refine_peaks(original, peaks * factor, factor)
+    report_progress(samples=original.size)
+
+    if return_segments:
+        return peaks, _scale_segments(segments, factor, original.size)
+    return peaks
+
+
+def _scale_segments(segments, factor, nsamp):
+    """Convert segments from samples of the decimated to the original signal."""
+    segments = np.asarray(segments, dtype=int).reshape(-1, 2) * factor
+    return np.minimum(segments, nsamp)
 
 
+@profiled("heart_stats")
 def heart_stats(peaks, sfreq, nsamp):
     """Compute instantaneous cardiac features.
 
@@ -226,6 +361,63 @@ def heart_stats(peaks, sfreq, nsamp):
     return periodintp, rateintp
 
 
+def update_heart_stats(periodintp, rateintp, peaks, sfreq, edited):
+    """Update instantaneous cardiac features after editing extrema.
+
+    Instead of re-computing the features over the entire signal (see
+    `heart_stats`), only re-compute them in place for the samples that are
+    affected by the edits. Adding or removing a peak only changes the peak-peak
+    differences of that peak and of the subsequent peak, i.e., the interpolated
+    features between the two peaks preceding the edit and the two peaks
+    following it. Additionally, the period of the first peak (the average
+    period, see `heart_stats`) changes, which affects the samples up until
+    the second peak. Hence, the cost of an update doesn't depend on the length
+    of the signal.
+
+    Parameters
+    ----------
+    periodintp, rateintp : ndarray, ndarray
+        Instantaneous heart period, and -rate, computed with `heart_stats`
+        prior to the edits. Updated in place.
+    peaks : ndarray
+        Cardiac extrema (R-peaks or systolic peaks) after the edits. Must
+        contain at least two peaks.
+    sfreq : int
+        Sampling frequency of the cardiac signal containing `peaks`.
+    edited : int or array_like of int
+        The samples of the peaks that have been added or removed.
+
+    Returns
+    -------
+    periodintp, rateintp : ndarray, ndarray
+        The updated vectors.
+    """
+    nsamp = periodintp.size
+    npeaks = peaks.size
+    bounds = [(0, min(peaks[1], nsamp))]    # average period of the first peak
+    for idx in np.searchsorted(peaks, np.atleast_1d(edited)):
+        begsamp = peaks[idx - 1] if idx >= 1 else 0
+        endsamp = peaks[idx + 2] if idx + 2 < npeaks else nsamp
+        bounds.append((begsamp, min(endsamp, nsamp)))
+
+    for begsamp, endsamp in bounds:
+        # Peaks whose periods are needed to interpolate the samples in
+        # [begsamp, endsamp), including the peak preceding the first one for
+        # the peak-peak difference.
+        first = max(np.searchsorted(peaks, begsamp, side="right") - 1, 0)
+        last = min(np.searchsorted(peaks, endsamp, side="left"), npeaks - 1)
+        localpeaks = peaks[first:last + 1]
+        rr = np.ediff1d(peaks[max(first - 1, 0):last + 1]) / sfreq
+        if first == 0:
+            rr = np.insert(rr, 0, (peaks[-1] - peaks[0]) / (npeaks - 1) / sfreq)    # equals np.mean(rr[1:]) of heart_stats
+        samples = np.arange(begsamp, endsamp)
+        periodintp[begsamp:endsamp] = np.interp(samples, localpeaks, rr)
+        rateintp[begsamp:endsamp] = 60 / periodintp[begsamp:endsamp]
+
+    return periodintp, rateintp
+
+
+@profiled("correct_peaks")
 def correct_peaks(peaks, sfreq, iterative=True):
     """Correct artifacts in cardiac peak detection.
 
@@ -254,8 +446,10 @@ def correct_peaks(peaks, sfreq, iterative=True):
     classification,” Journal of Medical Engineering & Technology, vol. 43,
     no. 3, pp. 173–181, Apr. 2019, doi: 10.1080/03091902.2019.1640306.
     """
-    artifacts = _find_artifacts(peaks, sfreq)
-    peaks_clean = _correct_artifacts(artifacts, peaks)
+    with stage("correct_peaks.find_artifacts"):
+        artifacts = _find_artifacts(peaks, sfreq)
+    with stage("correct_peaks.correct_artifacts"):
+        peaks_clean = _correct_artifacts(artifacts, peaks)
 
     if iterative:
         hashed_artifacts = _hash_artifacts(artifacts)
@@ -265,7 +459,8 @@ def correct_peaks(peaks, sfreq, iterative=True):
 
         while True:
 
-            artifacts = _find_artifacts(peaks_clean, sfreq)
+            with stage("correct_peaks.find_artifacts"):
+                artifacts = _find_artifacts(peaks_clean, sfreq)
             hashed_artifacts = _hash_artifacts(artifacts)
             if hashed_artifacts in previous_artifacts:
                 # Stop iterating if this exact artifact constellation occurred before,
@@ -273,7 +468,8 @@ def correct_peaks(peaks, sfreq, iterative=True):
                 # a) cyclic recurrence of artifact constellations or b) unchanging artifact constellation.
                 break
             previous_artifacts.add(hashed_artifacts)
-            peaks_clean = _correct_artifacts(artifacts, peaks_clean)
+            with stage("correct_peaks.correct_artifacts"):
+                peaks_clean = _correct_artifacts(artifacts, peaks_clean)
 
     return peaks_clean
 
@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+"""Heart rate variability (HRV) in sliding windows.
+
+HRV metrics are computed from the intervals between consecutive cardiac peaks
+(RR intervals, in milliseconds) in windows that slide over the recording.
+
+Time-domain metrics (`windowed_hrv`) are computed in windows that span either
+a number of seconds, or a number of RR intervals. An RR interval belongs to a
+window if both of its peaks lie within the window. The metrics of all windows
+are computed from cumulative sums over the RR intervals, such that the cost is
+linear in the number of peaks and independent of the window size and -step.
+The time-domain metrics are:
+
+* "mean_rr": mean RR interval (ms)
+* "mean_hr": mean heart rate (beats per minute), i.e., 60000 / "mean_rr"
+* "sdnn": standard deviation of the RR intervals (ms)
+* "rmssd": root mean square of successive RR differences (ms)
+* "sdsd": standard deviation of successive RR differences (ms)
+* "pnn50": percentage of successive RR differences larger than 50 ms
+
+Frequency-domain metrics (`windowed_frequency_hrv`) are computed in windows
+that span a number of seconds. The RR intervals are interpolated at a low,
+uniform sampling frequency (4 Hz by default) directly from the peaks, and the
+power spectra of all windows are estimated at once with a periodogram over
+a 2D array of windows. The frequency-domain metrics are:
+
+* "vlf", "lf", "hf": power (ms²) in the very low (.0033 - .04 Hz), low
+  (.04 - .15 Hz), and high (.15 - .4 Hz) frequency bands (see `bands`). Note
+  that the VLF band requires windows of at least 300 seconds.
+* "lf_hf": ratio of LF and HF power
+* "lfnu", "hfnu": LF and HF power in normalized units, i.e., in percent of
+  the sum of LF and HF power
+
+Metrics that are undefined for a window (e.g., "sdnn" for windows with fewer
+than two RR intervals) are NaN.
+
+Examples
+--------
+>>> peaks = ecg_peaks(signal, sfreq)
+>>> hrv = windowed_hrv(peaks, sfreq, window=60, step=10, correct=True)
+>>> hrv[["start", "rmssd"]]
+
+>>> hrv = windowed_frequency_hrv(peaks, sfreq, window=300, step=30)
+>>> hrv[["start", "lf", "hf"]]
+
+>>> results = BatchProcessor("ECG", "EDF", "A3", wdirstats="stats",
+...                          wdirpeaks="peaks").run(fpaths)
+>>> hrv = batch_windowed_hrv(results, window=300, domain="frequency")
+"""
+
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from functools import partial
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import periodogram
+from biopeaks.heart import correct_peaks
+from biopeaks.analysis_utils import interp_stats
+from biopeaks.cancellation import check_cancelled
+
+
+time_metrics = ["mean_rr", "mean_hr", "sdnn", "rmssd", "sdsd", "pnn50"]
+frequency_metrics = ["vlf", "lf", "hf", "lf_hf", "lfnu", "hfnu"]
+bands = {"vlf": (.0033, .04), "lf": (.04, .15), "hf": (.15, .4)}    # in Hz
+
+
+def windowed_hrv(peaks, sfreq, window=60., step=None, unit="seconds",
+                 duration=None, correct=False):
+    """Compute time-domain HRV metrics in sliding windows.
+
+    Parameters
+    ----------
+    peaks : ndarray
+        Cardiac extrema (R-peaks or systolic peaks) in samples.
+    sfreq : int
+        Sampling frequency of the cardiac signal containing `peaks`.
+    window : float or int, optional
+        Size of the windows in seconds if `unit` is "seconds", or number of
+        RR intervals if `unit` is "beats". Default is 60.
+    step : float or int, optional
+        Distance between the starts of consecutive windows, in the same unit
+        as `window`. Default is None (`window`, i.e., non-overlapping
+        windows).
+    unit : {"seconds", "beats"}, optional
+        Unit of `window` and `step`. Default is "seconds".
+    duration : float, optional
+        Duration of the recording in seconds. Windows in seconds start at
+        second 0 and only windows that end before `duration` are computed.
+        Default is None (time of the last peak).
+    correct : bool, optional
+        Correct artifacts in `peaks` before computing the metrics (see
+        `heart.correct_peaks`). Default is False (`peaks` have already been
+        corrected).
+
+    Returns
+    -------
+    hrv : DataFrame
+        A row per window, containing the "start" and "end" of the window in
+        seconds, the number of RR intervals in the window ("nintervals"), and
+        the metrics (see module docstring).
+    """
+    if unit not in ["seconds", "beats"]:
+        raise ValueError(f"Unit must be 'seconds' or 'beats', got {unit}.")
+    step = window if step is None else step
+    if window <= 0 or step <= 0:
+        raise ValueError("Window and step must be positive, got window="
+                         f"{window} and step={step}.")
+    peaks = np.asarray(peaks)
+    if correct:
+        peaks = correct_peaks(peaks, sfreq)
+    peaks = np.sort(peaks)
+    times = peaks / sfreq
+
+    # Each window spans the peaks [first, last).
+    if unit == "seconds":
+        if duration is None:
+            duration = times[-1] if times.size else 0
+        nwindows = int(np.floor((duration - window) / step)) + 1
+        starts = np.arange(max(nwindows, 0)) * float(step)
+        ends = starts + window
+        first = np.searchsorted(times, starts, side="left")
+        last = np.searchsorted(times, ends, side="left")
+    else:
+        window, step = int(window), int(step)
+        nwindows = (times.size - 1 - window) // step + 1
+        first = np.arange(max(nwindows, 0)) * step
+        last = first + window + 1
+        starts = times[first]
+        ends = times[last - 1]
+
+    hrv = _window_metrics(np.diff(peaks) * 1000 / sfreq, first, last)    # RR intervals in msec
+    hrv.insert(0, "start", starts)
+    hrv.insert(1, "end", ends)
+
+    return hrv
+
+
+def windowed_frequency_hrv(peaks, sfreq, window=300., step=None,
+                           duration=None, resample_sfreq=4., correct=False):
+    """Compute frequency-domain HRV metrics in sliding windows.
+
+    Parameters
+    ----------
+    peaks : ndarray
+        Cardiac extrema (R-peaks or systolic peaks) in samples.
+    sfreq : int
+        Sampling frequency of the cardiac signal containing `peaks`.
+    window : float, optional
+        Size of the windows in seconds. Default is 300.
+    step : float, optional
+        Distance between the starts of consecutive windows in seconds.
+        Default is None (`window`, i.e., non-overlapping windows).
+    duration : float, optional
+        Duration of the recording in seconds. Windows start at second 0 and
+        only windows that end before `duration` are computed. Default is None
+        (time of the last peak).
+    resample_sfreq : float, optional
+        Sampling frequency of the interpolated RR intervals. Must be larger
+        than twice the upper edge of the HF band. Default is 4.
+    correct : bool, optional
+        Correct artifacts in `peaks` before computing the metrics (see
+        `heart.correct_peaks`). Default is False (`peaks` have already been
+        corrected).
+
+    Returns
+    -------
+    hrv : DataFrame
+        A row per window, containing the "start" and "end" of the window in
+        seconds, the number of RR intervals in the window ("nintervals"), and
+        the metrics (see module docstring).
+    """
+    step = window if step is None else step
+    if window <= 0 or step <= 0:
+        raise ValueError("Window and step must be positive, got window="
+                         f"{window} and step={step}.")
+    if resample_sfreq <= 2 * bands["hf"][1]:
+        raise ValueError("Resampling frequency must be larger than "
+                         f"{2 * bands['hf'][1]} Hz, got {resample_sfreq}.")
+    peaks = np.asarray(peaks)
+    if correct:
+        peaks = correct_peaks(peaks, sfreq)
+    peaks = np.sort(peaks)
+    times = peaks / sfreq
+    if duration is None:
+        duration = times[-1] if times.size else 0
+    nwindows = max(int(np.floor((duration - window) / step)) + 1, 0)
+    starts = np.arange(nwindows) * float(step)
+    first = np.searchsorted(times, starts, side="left")
+    last = np.searchsorted(times, starts + window, side="left")
+    nrr = np.maximum(last - first - 1, 0)
+    hrv = pd.DataFrame({"start": starts, "end": starts + window,
+                        "nintervals": nrr})
+    powers = np.full((nwindows, len(bands)), np.nan)
+
+    windowsize = int(np.rint(window * resample_sfreq))
+    if times.size > 2 and nwindows and windowsize > 1:
+        # Interpolate the RR intervals at the time of the peak that ends them.
+        rr = np.diff(peaks) * 1000 / sfreq
+        nsamp = max(int(np.floor(duration * resample_sfreq)) + 1, windowsize)
+        rrintp = interp_stats(times[1:] * resample_sfreq, rr, nsamp)
+        windows = sliding_window_view(rrintp, windowsize)    # view, a row per sample
+        startidcs = np.minimum(np.rint(starts * resample_sfreq).astype(int),
+                               nsamp - windowsize)
+        blocksize = max(2**20 // windowsize, 1)    # limit the size of the 2D arrays
+        for i in range(0, nwindows, blocksize):
+            check_cancelled()
+            freqs, psd = periodogram(windows[startidcs[i:i + blocksize]],
+                                     fs=resample_sfreq, window="hann",
+                                     detrend="linear", axis=1)
+            df = freqs[1] - freqs[0]
+            for j, (low, high) in enumerate(bands.values()):
+                band = (freqs >= low) & (freqs < high)
+                powers[i:i + blocksize, j] = psd[:, band].sum(axis=1) * df
+
+    powers[nrr < 2] = np.nan
+    vlf, lf, hf = powers.T
+    with np.errstate(divide="ignore", invalid="ignore"):
+        hrv["vlf"] = vlf
+        hrv["lf"] = lf
+        hrv["hf"] = hf
+        hrv["lf_hf"] = lf / hf
+        hrv["lfnu"] = 100 * lf / (lf + hf)
+        hrv["hfnu"] = 100 * hf / (lf + hf)
+
+    return hrv
+
+
+def batch_windowed_hrv(fpaths, window=60., step=None, unit="seconds",
+                       domain="time", correct=False, sfreq=1000):
+    """Compute HRV metrics in sliding windows for many files.
+
+    Parameters
+    ----------
+    fpaths : list of str or Path, or list of dict
+        CSV files containing the cardiac peaks in seconds, in a column named
+        "peaks" (i.e., the format of the peaks saved by biopeaks, see
+        `io_utils.write_peaks`). Alternatively, the results of
+        `batch.BatchProcessor.run`, in which case the saved peaks of each
+        processed file are used. Files without saved peaks are skipped.
+    window, step, unit, correct
+        See `windowed_hrv` and `windowed_frequency_hrv`.
+    domain : {"time", "frequency"}, optional
+        Compute time-domain metrics (`windowed_hrv`) or frequency-domain
+        metrics (`windowed_frequency_hrv`, requires `unit` "seconds").
+        Default is "time".
+    sfreq : int, optional
+        Sampling frequency that the peaks are converted to samples with (only
+        relevant for `correct`). Default is 1000.
+
+    Returns
+    -------
+    hrv : DataFrame
+        The windows of all files, with the file name in the first column
+        ("file").
+    """
+    if domain == "time":
+        hrvfunc = partial(windowed_hrv, unit=unit)
+        metrics = time_metrics
+    elif domain == "frequency":
+        if unit != "seconds":
+            raise ValueError("Frequency-domain metrics require windows in "
+                             "seconds.")
+        hrvfunc = windowed_frequency_hrv
+        metrics = frequency_metrics
+    else:
+        raise ValueError(f"Domain must be 'time' or 'frequency', got {domain}.")
+
+    results = []
+    for fpath in fpaths:
+        check_cancelled()
+        if isinstance(fpath, dict):    # result of BatchProcessor
+            fpath = fpath["wpathpeaks"] if not fpath["error"] else None
+            if fpath is None:
+                continue
+        seconds = pd.read_csv(fpath)["peaks"].to_numpy()
+        peaks = np.rint(seconds[~np.isnan(seconds)] * sfreq).astype(int)
+        hrv = hrvfunc(peaks, sfreq, window=window, step=step, correct=correct)
+        hrv.insert(0, "file", Path(fpath).name)
+        results.append(hrv)
+    if not results:
+        return pd.DataFrame(columns=["file", "start", "end", "nintervals"] +
+                            metrics)
+
+    return pd.concat(results, ignore_index=True)
+
+
+def _window_metrics(rr, first, last):
+    """Compute the metrics of the RR intervals between the peaks [first, last)
+    of each window, based on cumulative sums."""
+    rrdiff = np.diff(rr)
+    # Center the intervals in order to limit the loss of precision in the
+    # sums of squares.
+    rrmean = rr.mean() if rr.size else 0.
+    rrsum = np.concatenate(([0], np.cumsum(rr - rrmean)))
+    rrsquaresum = np.concatenate(([0], np.cumsum((rr - rrmean) ** 2)))
+    diffsum = np.concatenate(([0], np.cumsum(rrdiff)))
+    diffsquaresum = np.concatenate(([0], np.cumsum(rrdiff ** 2)))
+    nn50sum = np.concatenate(([0], np.cumsum(np.abs(rrdiff) > 50)))
+
+    # The RR intervals of the peaks [first, last) are rr[first:last - 1],
+    # their successive differences are rrdiff[first:last - 2].
+    first = np.minimum(first, rr.size)
+    nrr = np.maximum(np.minimum(last - 1, rr.size) - first, 0)
+    ndiff = np.maximum(nrr - 1, 0)
+    difffirst = np.minimum(first, rrdiff.size)
+
+    def windowsum(cumsum, start, n):
+        return cumsum[start + n] - cumsum[start]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = windowsum(rrsum, first, nrr) / nrr    # centered
+        varrr = ((windowsum(rrsquaresum, first, nrr) - nrr * mean ** 2) /
+                 (nrr - 1))
+        meandiff = windowsum(diffsum, difffirst, ndiff) / ndiff
+        meansquarediff = windowsum(diffsquaresum, difffirst, ndiff) / ndiff
+        vardiff = (meansquarediff - meandiff ** 2) * ndiff / (ndiff - 1)
+        nn50 = windowsum(nn50sum, difffirst, ndiff)
+        hrv = pd.DataFrame({"nintervals": nrr,
+                            "mean_rr": mean + rrmean,
+                            "mean_hr": 60000 / (mean + rrmean),
+                            "sdnn": np.sqrt(np.maximum(varrr, 0)),
+                            "rmssd": np.sqrt(meansquarediff),
+                            "sdsd": np.sqrt(np.maximum(vardiff, 0)),
+                            "pnn50": 100 * nn50 / ndiff})
+    hrv.loc[nrr < 1, ["mean_rr", "mean_hr"]] = np.nan
+    hrv.loc[nrr < 2, ["sdnn", "rmssd", "pnn50"]] = np.nan
+    hrv.loc[nrr < 3, "sdsd"] = np.nan
+
+    return hrv
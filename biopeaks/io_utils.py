@@ -2,13 +2,19 @@
 """Input/output utilities."""
 
 import json
+import hashlib
 import pandas as pd
 import numpy as np
 from itertools import islice
 from struct import pack
 from pathlib import Path
+from biopeaks.profiling import stage, profiled
+from biopeaks.progress import report_progress
+from biopeaks.timeaxis import TimeAxis
+from biopeaks.resp import ensure_peak_trough_alternation
 
 
+@profiled("read_custom")
 def read_custom(rpath, customheader, channeltype):
     """Read a channel from a plain text file.
 
@@ -27,9 +33,9 @@ def read_custom(rpath, customheader, channeltype):
     output : dict
         Dictionary containing the signal corresponding to the requested
         channel and any error raised while reading the signal from file. If
-        `channeltype` is "signal", `output` also contains a vector containing
-        the  seconds corresponding to the samples in the signal, as well as the
-        signal's sampling frequency.
+        `channeltype` is "signal", `output` also contains the seconds
+        corresponding to the samples in the signal (see `TimeAxis`), as well
+        as the signal's sampling frequency.
     """
     output = {"error": False,
               "sec": None,
@@ -42,12 +48,14 @@ def read_custom(rpath, customheader, channeltype):
         chanidx = customheader["markeridx"]
 
     try:
-        signal = pd.read_csv(rpath, sep=customheader["separator"],
-                             usecols=[chanidx - 1], header=None,    # convert chanidx from one-based to zero-based
-                             skiprows=customheader["skiprows"])
+        with stage("read_custom.parse"):
+            signal = pd.read_csv(rpath, sep=customheader["separator"],
+                                 usecols=[chanidx - 1], header=None,    # convert chanidx from one-based to zero-based
+                                 skiprows=customheader["skiprows"])
     except Exception as error:
         output["error"] = str(error)
         return output
+    report_progress(nbytes=Path(rpath).stat().st_size)
 
     if signal.empty:
         output["error"] = (f"{channeltype.capitalize()}-column {chanidx} didn't"
@@ -57,7 +65,7 @@ def read_custom(rpath, customheader, channeltype):
     if channeltype == "signal":
         sfreq = customheader["sfreq"]
         signallen = signal.size
-        output["sec"] = np.linspace(0, signallen / sfreq, signallen)
+        output["sec"] = TimeAxis(signallen, sfreq)
         output["sfreq"] = sfreq
 
     output["signal"] = np.ravel(signal)
@@ -65,6 +73,7 @@ def read_custom(rpath, customheader, channeltype):
     return output
 
 
+@profiled("write_custom")
 def write_custom(rpath, wpath, segment, customheader):
     """Write segmented channels to a plain text file.
 
@@ -98,6 +107,7 @@ def write_custom(rpath, wpath, segment, customheader):
                     index=False)
 
 
+@profiled("read_opensignals")
 def read_opensignals(rpath, channel, channeltype):
     """Read a channel from an OpenSignals file.
 
@@ -115,9 +125,9 @@ def read_opensignals(rpath, channel, channeltype):
     output : dict
         Dictionary containing the signal corresponding to the requested
         channel and any error raised while reading the signal from file. If
-        `channeltype` is "signal", `output` also contains a vector containing
-        the  seconds corresponding to the samples in the signal, as well as the
-        signal's sampling frequency.
+        `channeltype` is "signal", `output` also contains the seconds
+        corresponding to the samples in the signal (see `TimeAxis`), as well
+        as the signal's sampling frequency.
     """
     output = {"error": False,
               "sec": None,
@@ -149,12 +159,14 @@ def read_opensignals(rpath, channel, channeltype):
     elif channel[0] == "I":
         chanidx = int(channel[1])
 
-    signal = pd.read_csv(rpath, sep='\t', usecols=[chanidx], header=None,
-                         comment='#')
+    with stage("read_opensignals.parse"):
+        signal = pd.read_csv(rpath, sep='\t', usecols=[chanidx], header=None,
+                             comment='#')
+    report_progress(nbytes=Path(rpath).stat().st_size)
 
     if channeltype == "signal":
         signallen = signal.size
-        output["sec"] = np.linspace(0, signallen / sfreq, signallen)
+        output["sec"] = TimeAxis(signallen, sfreq)
         output["sfreq"] = sfreq
 
     output["signal"] = np.ravel(signal)
@@ -162,6 +174,7 @@ def read_opensignals(rpath, channel, channeltype):
     return output
 
 
+@profiled("write_opensignals")
 def write_opensignals(rpath, wpath, segment, sfreq):
     """Write segmented channels to an OpenSignals file.
 
@@ -193,6 +206,7 @@ def write_opensignals(rpath, wpath, segment, sfreq):
         data.to_csv(newfile, sep='\t', header=False, index=False)
 
 
+@profiled("read_edf")
 def read_edf(rpath, channel, channeltype):
     """Read a channel from an EDF file.
 
@@ -210,9 +224,9 @@ def read_edf(rpath, channel, channeltype):
     output : dict
         Dictionary containing the signal corresponding to the requested
         channel and any error raised while reading the signal from file. If
-        `channeltype` is "signal", `output` also contains a vector containing
-        the  seconds corresponding to the samples in the signal, as well as the
-        signal's sampling frequency.
+        `channeltype` is "signal", `output` also contains the seconds
+        corresponding to the samples in the signal (see `TimeAxis`), as well
+        as the signal's sampling frequency.
 
     Notes
     -----
@@ -238,9 +252,10 @@ def read_edf(rpath, channel, channeltype):
 
     chanidx = int(channel[1])
 
-    with open(rpath, "rb") as f:
+    with open(rpath, "rb") as f, stage("read_edf.read"):
         info, _ = _read_edfheader(f)
         signal = _read_edfsignal(f, info["end_header"])
+        report_progress(nbytes=f.tell())
 
     if info["n_channels"] < chanidx:    # both indices are one-based
         output["error"] = f"Error: {channeltype.capitalize()} channel not found."
@@ -250,12 +265,12 @@ def read_edf(rpath, channel, channeltype):
         info["n_epochs"] = int(np.rint(signal.size / sum(info["n_samples"])))
 
     chansfreq = info["sfreqs"][chanidx - 1]
-    chansignal = _read_edfchannel(signal, info["n_samples"], chanidx)
+    with stage("read_edf.channel"):
+        chansignal = _read_edfchannel(signal, info["n_samples"], chanidx)
 
     if channeltype == "signal":
         chansignallen = info["n_epochs"] * info["n_samples"][chanidx - 1]
-        sec = np.linspace(0, chansignallen / chansfreq, chansignallen)
-        output["sec"] = sec
+        output["sec"] = TimeAxis(chansignallen, chansfreq)
 
     output["signal"] = chansignal
     output["sfreq"] = chansfreq    # important to send for both marker and signal, since they can differ in sfreq
@@ -263,6 +278,7 @@ def read_edf(rpath, channel, channeltype):
     return output
 
 
+@profiled("write_edf")
 def write_edf(rpath, wpath, segment, *args):
     """Write segmented channels to an EDF file.
 
@@ -290,7 +306,7 @@ def write_edf(rpath, wpath, segment, *args):
     Electroencephalography and Clinical Neurophysiology, vol. 82, no. 5,
     pp. 391–393, May 1992, doi: 10.1016/0013-4694(92)90009-7.
     """
-    with open(rpath, "rb") as f:
+    with open(rpath, "rb") as f, stage("write_edf.read"):
         info, header = _read_edfheader(f)
         signal = _read_edfsignal(f, info["end_header"])
 
@@ -314,7 +330,7 @@ def write_edf(rpath, wpath, segment, *args):
     version = info["version"] + 1    # update file version.
     n_epochs = int(np.floor(duration_segment / info["duration_epoch"]))    # update number of epochs: rounding off is important, otherwise fraction of incomplete epoch could be appended
 
-    with open(wpath, "wb") as f:
+    with stage("write_edf.write"), open(wpath, "wb") as f:    # check for cancellation before truncating the file
 
         f.write(header)    # copy the header to the new file ...
         f.seek(0)
@@ -334,6 +350,267 @@ def write_edf(rpath, wpath, segment, *args):
                     f.write(i)
 
 
+def write_peaks(wpath, peaks, sfreq, modality, signal=None):
+    """Write extrema to a CSV file.
+
+    Parameters
+    ----------
+    wpath : str
+        File system location to write the extrema to.
+    peaks : ndarray
+        The extrema in samples.
+    sfreq : int
+        The sampling frequency of the signal containing the extrema.
+    modality : str
+        One of {"ECG", "PPG", "RESP"}. Cardiac peaks are written to a single
+        column ("peaks"). Breathing extrema are written to two columns
+        ("peaks", "troughs").
+    signal : ndarray, optional
+        The signal containing the extrema. Required if `modality` is "RESP",
+        in order to tell peaks from troughs.
+    """
+    if modality != "RESP":
+        savearray = pd.DataFrame(peaks / sfreq)    # convert to seconds
+        savearray.to_csv(wpath, index=False, header=['peaks'])
+        return
+
+    extrema = ensure_peak_trough_alternation(peaks, signal)    # work on local copy of extrema to avoid call to plotting function
+    amps = signal[extrema]
+
+    if np.remainder(extrema.size, 2) != 0:
+        extrema = np.append(extrema, np.nan)    # pad extrema with NAN in order to ensure equal number of peaks and troughs
+
+    if amps[0] > amps[1]:    # determine if series starts with peak or trough to be able to save peaks and troughs separately
+        peaks = extrema[0:-1:2]
+        troughs = extrema[1::2]
+    elif amps[0] < amps[1]:
+        peaks = extrema[1::2]
+        troughs = extrema[0:-1:2]
+    savearray = np.column_stack((peaks / sfreq, troughs / sfreq))    # make sure extrema are float: IMPORTANT, if seconds are saved as int, rounding errors (i.e. misplaced peaks) occur
+    savearray = pd.DataFrame(savearray)
+    savearray.to_csv(wpath, index=False, header=['peaks', 'troughs'],
+                     na_rep='nan')
+
+
+def write_stats(wpath, stats):
+    """Write instantaneous statistics to a CSV file.
+
+    Parameters
+    ----------
+    wpath : str
+        File system location to write the statistics to.
+    stats : dict
+        Maps the name of each statistic (e.g., "period") to a vector
+        containing the statistic. All vectors must have the same number of
+        elements. Each statistic is written to a column.
+    """
+    savekeys = list(stats.keys())
+    savearray = np.zeros((np.size(stats[savekeys[0]]) if savekeys else 0,
+                          len(savekeys)))
+    for i, key in enumerate(savekeys):
+        savearray[:, i] = stats[key]
+    savearray = pd.DataFrame(savearray)
+    savearray.to_csv(wpath, index=False, header=savekeys, float_format="%.4f")
+
+
+def memmap_edf(rpath, channel, channeltype):
+    """Memory-map a channel of an EDF file.
+
+    Unlike `read_edf`, the channel is not read into memory. Instead, samples
+    are read from disk on demand when the channel is indexed. This allows for
+    processing recordings that are larger than the available memory in chunks
+    (see `biopeaks.chunked.process_long_recording`).
+
+    Parameters
+    ----------
+    rpath : str
+        File system location of the file.
+    channel : str
+        The channel to be read.
+    channeltype : str
+        The kind of channel to read. One of {"marker", "signal"}.
+
+    Returns
+    -------
+    output : dict
+        Dictionary containing the memory-mapped channel (see `EDFChannel`),
+        the seconds corresponding to its samples (see `TimeAxis`), the
+        channel's sampling frequency, and any error raised while mapping the
+        channel.
+    """
+    output = {"error": False,
+              "sec": None,
+              "signal": None,
+              "sfreq": None}
+
+    if Path(rpath).suffix != ".edf":
+        output["error"] = "Error: File is not in EDF format."
+        return output
+
+    chanidx = int(channel[1])
+
+    with open(rpath, "rb") as f:
+        info, _ = _read_edfheader(f)
+
+    if info["n_channels"] < chanidx:    # both indices are one-based
+        output["error"] = f"Error: {channeltype.capitalize()} channel not found."
+        return output
+
+    n_bytes = Path(rpath).stat().st_size - info["end_header"]
+    n_epochs = n_bytes // (2 * sum(info["n_samples"]))    # only map complete epochs
+    if info["n_epochs"] != -1:
+        n_epochs = min(n_epochs, info["n_epochs"])
+
+    output["signal"] = EDFChannel(rpath, info["end_header"], n_epochs,
+                                  info["n_samples"], chanidx)
+    output["sfreq"] = info["sfreqs"][chanidx - 1]
+    output["sec"] = TimeAxis(output["signal"].size, output["sfreq"])
+
+    return output
+
+
+class EDFChannel:
+    """Memory-mapped channel of an EDF file.
+
+    Behaves like a read-only, one-dimensional array of 16-bit integers that
+    supports indexing with slices and integer arrays. Only the indexed samples
+    are read from disk.
+
+    Attributes
+    ----------
+    size : int
+        The number of samples in the channel.
+    dtype : data-type
+        The data type of the samples (np.int16).
+    """
+
+    def __init__(self, rpath, end_header, n_epochs, n_samples, chanidx):
+        """Map a channel.
+
+        Parameters
+        ----------
+        rpath : str
+            File system location of the file.
+        end_header : int
+            Start byte of the channels.
+        n_epochs : int
+            Number of epochs to map.
+        n_samples : list
+            Number of samples per epoch of each channel, as returned by
+            `_read_edfheader`.
+        chanidx : int
+            One-based channel index.
+        """
+        self._n_chansamples = n_samples[chanidx - 1]
+        channel_offset = sum(n_samples[:chanidx - 1])    # starting index of the channel within an epoch
+        data = np.memmap(rpath, dtype=np.int16, mode="r", offset=end_header,
+                         shape=(n_epochs, sum(n_samples)))
+        self._epochs = data[:, channel_offset:channel_offset +
+                            self._n_chansamples]    # one row per epoch
+        self.size = n_epochs * self._n_chansamples
+        self.dtype = self._epochs.dtype
+
+    @property
+    def shape(self):
+        return (self.size,)
+
+    @property
+    def ndim(self):
+        return 1
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            beg, end, step = key.indices(self.size)
+            if step != 1 or end <= beg:
+                return self[np.arange(beg, end, step)]
+            first_epoch = beg // self._n_chansamples
+            last_epoch = (end - 1) // self._n_chansamples + 1
+            offset = first_epoch * self._n_chansamples
+            epochs = np.ravel(self._epochs[first_epoch:last_epoch])
+            report_progress(nbytes=epochs.nbytes)
+            return epochs[beg - offset:end - offset]
+        idcs = np.asarray(key)
+        idcs = np.where(idcs < 0, idcs + self.size, idcs)
+        return np.asarray(self._epochs[idcs // self._n_chansamples,
+                                       idcs % self._n_chansamples])
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self[:], dtype=dtype)
+
+
+def memmap_text(rpath, readfunc, *args, cachedir):
+    """Memory-map a channel of a plain text file via a binary cache.
+
+    The first time a channel is requested, it is read with `readfunc` and
+    stored as .npy file (along with a .json file containing the sampling
+    frequency and the location, size, and modification time of the text
+    file). Subsequent requests memory-map the .npy file, unless the text file
+    has been modified in the meantime. The name of the cache is derived from
+    the location, size, and modification time of the text file as well as
+    from `readfunc` and `args`, such that files with the same name in
+    different directories don't share a cache. Note that the channel needs to
+    fit into memory once in order to create the cache.
+
+    Parameters
+    ----------
+    rpath : str
+        File system location of the text file.
+    readfunc : function
+        The function reading the channel, i.e., `read_custom` or
+        `read_opensignals`.
+    *args
+        Arguments passed on to `readfunc` following `rpath`.
+    cachedir : str
+        Directory containing the cache. Use a dedicated directory rather than
+        the directory containing the recordings, which might be read-only or
+        shared.
+
+    Returns
+    -------
+    output : dict
+        Dictionary containing the memory-mapped channel, the seconds
+        corresponding to its samples (see `TimeAxis`), the channel's sampling
+        frequency, and any error raised while reading the channel.
+    """
+    rpath = Path(rpath).resolve()
+    cachedir = Path(cachedir)
+    stat = rpath.stat()
+    source = {"path": str(rpath), "size": stat.st_size,
+              "mtime_ns": stat.st_mtime_ns}
+    key = hashlib.blake2b(repr((source["path"], source["size"],
+                                source["mtime_ns"], readfunc.__name__,
+                                args)).encode(),
+                          digest_size=8).hexdigest()
+    npypath = cachedir.joinpath(f"{rpath.stem}_{key}.npy")
+    infopath = npypath.with_suffix(".json")
+
+    info = None
+    if npypath.exists() and infopath.exists():
+        with open(infopath, "r") as f:
+            info = json.load(f)
+    if info is None or info.get("source") != source:    # re-read the text file in case of a mismatch
+        output = readfunc(str(rpath), *args)
+        if output["error"]:
+            return output
+        cachedir.mkdir(parents=True, exist_ok=True)
+        np.save(npypath, output["signal"])
+        info = {"sfreq": output["sfreq"], "source": source}
+        with open(infopath, "w") as f:
+            json.dump(info, f)
+    sfreq = info["sfreq"]
+
+    signal = np.load(npypath, mmap_mode="r")
+    output = {"error": False,
+              "sec": TimeAxis(signal.size, sfreq),
+              "signal": signal,
+              "sfreq": sfreq}
+
+    return output
+
+
 def _read_edfheader(f):
     """Read the header of an EDF file.
 
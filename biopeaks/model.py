@@ -4,6 +4,7 @@
 import numpy as np
 from pathlib import Path
 from PySide6.QtCore import QObject, Signal, Slot, Property
+from biopeaks.timeaxis import TimeAxis
 
 
 class Model(QObject):
@@ -22,8 +23,11 @@ class Model(QObject):
     sec
     marker
     segment
+    segments
+    original
     status
     progress
+    progressevent
     sfreq
     sfreqmarker
     loaded
@@ -43,6 +47,7 @@ class Model(QObject):
     wdirstats
     savebatchpeaks
     correctbatchpeaks
+    resumebatch
     savestats
     filetype
     customheader
@@ -66,6 +71,8 @@ class Model(QObject):
         Notify View that the status attribute changed.
     progress_changed : Signal
         Notify View that the progress attribute changed.
+    progressevent_changed : Signal
+        Notify View that the progressevent attribute changed.
     model_reset : Signal
         Notify View that attributes have been reset to their default value.
         See reset method.
@@ -82,6 +89,7 @@ class Model(QObject):
     path_changed = Signal(str)
     status_changed = Signal(str)
     progress_changed = Signal(int)
+    progressevent_changed = Signal(object)
     model_reset = Signal()
 
     def __init__(self):
@@ -93,6 +101,7 @@ class Model(QObject):
         self._plotting = True
         self._savebatchpeaks = False
         self._correctbatchpeaks = False
+        self._resumebatch = False
         self._signal = None
         self._peaks = None
         self._periodintp = None
@@ -101,8 +110,11 @@ class Model(QObject):
         self._sec = None
         self._marker = None
         self._segment = None
+        self._segments = None
+        self._original = None
         self._status = None
         self._progress = None
+        self._progressevent = None
         self._sfreq = None
         self._sfreqmarker = None
         self._signalchan = None
@@ -143,6 +155,8 @@ class Model(QObject):
         self._sec = None
         self._marker = None
         self._segment = None
+        self._segments = None
+        self._original = None
         self._status = None
         self._progress = None
         self._sfreq = None
@@ -268,7 +282,7 @@ class Model(QObject):
     @periodintp.setter
     def periodintp(self, value):
         self._periodintp = value
-        if value is not None and self._plotting:
+        if self._plotting:    # also emit None to clear outdated plots (see Controller.undo_segment)
             self.period_changed.emit(value)
 
     @property
@@ -284,7 +298,7 @@ class Model(QObject):
     @rateintp.setter
     def rateintp(self, value):
         self._rateintp = value
-        if value is not None and self._plotting:
+        if self._plotting:    # also emit None to clear outdated plots (see Controller.undo_segment)
             self.rate_changed.emit(value)
 
     @property
@@ -300,13 +314,13 @@ class Model(QObject):
     @tidalampintp.setter
     def tidalampintp(self, value):
         self._tidalampintp = value
-        if value is not None and self._plotting:
+        if self._plotting:    # also emit None to clear outdated plots (see Controller.undo_segment)
             self.tidalamp_changed.emit(value)
 
     @property
     def sec(self):
-        """ndarray of float: Vector representing the seconds associated with
-        each sample in signal and marker.
+        """TimeAxis: The seconds associated with each sample in signal and
+        marker (see biopeaks.timeaxis).
 
         Set by Controller. Default is None.
         """
@@ -329,15 +343,49 @@ class Model(QObject):
         self._marker = value
         if value is not None and self._plotting:
             # In case the marker channel is sampled at a different rate than
-            # signal channel (possible for EDF format), generate the seconds
-            # vector for the markers on the spot.
+            # signal channel (possible for EDF format), define the seconds
+            # of the markers on the spot.
             if len(value) != len(self._signal):
-                sec = np.linspace(0, len(value) / self._sfreqmarker,
-                                  len(value))
+                sec = TimeAxis(len(value), self._sfreqmarker)
             else:
                 sec = self._sec
             self.marker_changed.emit([sec, value])
 
+    @property
+    def segments(self):
+        """list of dict: The confirmed segments, from the first to the active
+        segment.
+
+        Each segment contains the start and end of the segment in "seconds",
+        as well as the start and end sample of the "signal" and "marker"
+        channels (None if there is no marker), with respect to the original
+        dataset. Set by Controller. Default is None (the dataset hasn't been
+        segmented).
+        """
+        return self._segments
+
+    @segments.setter
+    def segments(self, value):
+        self._segments = value
+
+    @property
+    def original(self):
+        """dict: The entire dataset prior to segmentation.
+
+        Contains the "signal" and "marker" channels, as well as "peaks",
+        "periodintp", "rateintp", and "tidalampintp" (None if unavailable). As
+        long as the dataset is segmented, signal, marker, and the statistics
+        are views on the original arrays, such that segmentation can be
+        undone without reloading the file. The peaks of the segment are a
+        shifted copy of the original peaks. Set by Controller. Default is None
+        (the dataset hasn't been segmented).
+        """
+        return self._original
+
+    @original.setter
+    def original(self, value):
+        self._original = value
+
     @property
     def rpathsignal(self):
         """str: File system location of the file containing the signal and
@@ -459,6 +507,20 @@ class Model(QObject):
         if value is not None:
             self.status_changed.emit(value)
 
+    @property
+    def progressevent(self):
+        """dict: Progress of the batch processing (files done, throughput,
+        estimated time remaining), see biopeaks.progress.
+
+        Set by Controller during batch processing. Default is None.
+        """
+        return self._progressevent
+
+    @progressevent.setter
+    def progressevent(self, value):
+        self._progressevent = value
+        self.progressevent_changed.emit(value)
+
     @property
     def customheader(self):
         """dict of {int, str}: Header information when loading a Custom dataset.
@@ -625,6 +687,23 @@ class Model(QObject):
         elif value == 0:
             self._correctbatchpeaks = False
 
+    @Property(int)
+    def resumebatch(self):
+        """bool: Indicates whether or not to skip files that have already been
+        processed with the same configuration during an earlier (interrupted)
+        batch processing.
+
+        Set by View. Default is False.
+        """
+        return self._resumebatch
+
+    @Slot(int)
+    def set_resumebatch(self, value):
+        if value == 2:
+            self._resumebatch = True
+        elif value == 0:
+            self._resumebatch = False
+
     @Slot(int)
     def progress(self, value):
         """int: Conveys the progress signal of the Controller's worker thread.
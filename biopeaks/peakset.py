@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""Editable set of extrema.
+
+A `PeakSet` holds extrema (sample indices) in a sorted array. Lookups (e.g.,
+finding the extremum that is closest to the cursor) are binary searches.
+Additions and removals are buffered and only merged into the array when
+the array is requested (see `PeakSet.__array__`) or when many edits are
+pending, such that a sequence of edits costs a single copy of the array.
+Each edit is recorded in a log, which allows for unlimited undo and redo.
+
+Examples
+--------
+>>> peaks = PeakSet([100, 250, 400])
+>>> peaks.nearest(260)
+250
+>>> peaks.remove(250)
+True
+>>> peaks.add([240, 500])
+True
+>>> np.asarray(peaks)
+array([100, 240, 400, 500])
+>>> peaks.undo()
+True
+>>> np.asarray(peaks)
+array([100, 400])
+"""
+
+from bisect import bisect_left, insort
+
+import numpy as np
+
+
+class PeakSet:
+    """Sorted set of extrema with an undo/redo log.
+
+    Supports `len` and `np.asarray`, which returns the sorted extrema as a
+    vector of int (i.e., the format expected by the detectors and statistics
+    functions).
+
+    Attributes
+    ----------
+    changed : list of int
+        The samples of the extrema that have been added or removed by the
+        most recent edit, undo, or redo.
+    """
+
+    def __init__(self, peaks=None, maxpending=1024):
+        """Initiate with extrema.
+
+        Parameters
+        ----------
+        peaks : array_like of int, optional
+            Indices of the extrema. Need not be sorted, duplicates are
+            discarded. Default is None (no extrema).
+        maxpending : int, optional
+            Maximal number of buffered edits before they're merged into the
+            sorted array. Default is 1024.
+        """
+        peaks = np.empty(0, dtype=int) if peaks is None else np.asarray(peaks)
+        self._array = np.unique(peaks).astype(int, copy=False)
+        self._added = []    # sorted samples that aren't in _array
+        self._removed = set()    # samples in _array that have been removed
+        self._undo = []    # edit log, each entry is (operation, samples)
+        self._redo = []
+        self.maxpending = maxpending
+        self.changed = []
+
+    def __len__(self):
+        return self._array.size - len(self._removed) + len(self._added)
+
+    def __repr__(self):
+        return f"PeakSet(size={len(self)})"
+
+    def __contains__(self, sample):
+        idx = bisect_left(self._added, sample)
+        if idx < len(self._added) and self._added[idx] == sample:
+            return True
+        idx = np.searchsorted(self._array, sample)
+        return (idx < self._array.size and self._array[idx] == sample and
+                sample not in self._removed)
+
+    def __array__(self, dtype=None, copy=None):
+        """Merge pending edits and return the sorted extrema.
+
+        The array is shared with the PeakSet until the next edit, it must not
+        be modified.
+        """
+        self._merge()
+        array = self._array
+        if dtype is not None and np.dtype(dtype) != array.dtype:
+            return array.astype(dtype)
+        return array.copy() if copy else array
+
+    @property
+    def can_undo(self):
+        """bool: Whether there are edits that can be undone."""
+        return bool(self._undo)
+
+    @property
+    def can_redo(self):
+        """bool: Whether there are undone edits that can be redone."""
+        return bool(self._redo)
+
+    def nearest(self, sample):
+        """Find the extremum that is closest to a sample.
+
+        Parameters
+        ----------
+        sample : int
+            Sample index (e.g., the cursor position).
+
+        Returns
+        -------
+        int or None
+            The closest extremum (the earlier one in case of a tie), or None
+            if there are no extrema.
+        """
+        candidates = []
+        idx = int(np.searchsorted(self._array, sample))
+        left = idx - 1
+        while left >= 0 and int(self._array[left]) in self._removed:
+            left -= 1
+        right = idx
+        while (right < self._array.size and
+               int(self._array[right]) in self._removed):
+            right += 1
+        if left >= 0:
+            candidates.append(int(self._array[left]))
+        if right < self._array.size:
+            candidates.append(int(self._array[right]))
+        idx = bisect_left(self._added, sample)
+        candidates.extend(self._added[max(idx - 1, 0):idx + 1])
+        if not candidates:
+            return None
+        return min(candidates, key=lambda peak: (abs(peak - sample), peak))
+
+    def add(self, samples):
+        """Add extrema.
+
+        Parameters
+        ----------
+        samples : int or array_like of int
+            The extrema. Extrema that already exist are ignored.
+
+        Returns
+        -------
+        bool
+            Whether any extrema have been added.
+        """
+        samples = [sample for sample in self._unique(samples)
+                   if sample not in self]
+        if not samples:
+            return False
+        self._add(samples)
+        self._log("add", samples)
+        return True
+
+    def remove(self, samples):
+        """Remove extrema.
+
+        Parameters
+        ----------
+        samples : int or array_like of int
+            The extrema. Samples that aren't extrema are ignored.
+
+        Returns
+        -------
+        bool
+            Whether any extrema have been removed.
+        """
+        samples = [sample for sample in self._unique(samples)
+                   if sample in self]
+        if not samples:
+            return False
+        self._remove(samples)
+        self._log("remove", samples)
+        return True
+
+    def undo(self):
+        """Undo the most recent edit.
+
+        Returns
+        -------
+        bool
+            Whether an edit has been undone.
+        """
+        if not self._undo:
+            return False
+        operation, samples = self._undo.pop()
+        if operation == "add":
+            self._remove(samples)
+        else:
+            self._add(samples)
+        self._redo.append((operation, samples))
+        return True
+
+    def redo(self):
+        """Redo the most recently undone edit.
+
+        Returns
+        -------
+        bool
+            Whether an edit has been redone.
+        """
+        if not self._redo:
+            return False
+        operation, samples = self._redo.pop()
+        if operation == "add":
+            self._add(samples)
+        else:
+            self._remove(samples)
+        self._undo.append((operation, samples))
+        return True
+
+    def _unique(self, samples):
+        return np.unique(np.atleast_1d(samples)).astype(int).tolist()
+
+    def _log(self, operation, samples):
+        self._undo.append((operation, samples))
+        self._redo.clear()    # a new edit invalidates the undone edits
+
+    def _add(self, samples):
+        self.changed = samples
+        for sample in samples:
+            if sample in self._removed:    # restore removed extremum
+                self._removed.discard(sample)
+            else:
+                insort(self._added, sample)
+        self._merge(force=False)
+
+    def _remove(self, samples):
+        self.changed = samples
+        for sample in samples:
+            idx = bisect_left(self._added, sample)
+            if idx < len(self._added) and self._added[idx] == sample:
+                del self._added[idx]
+            else:
+                self._removed.add(sample)
+        self._merge(force=False)
+
+    def _merge(self, force=True):
+        """Merge buffered edits into the sorted array.
+
+        Unless forced, only merge if more than maxpending edits are buffered.
+        """
+        npending = len(self._added) + len(self._removed)
+        if not npending or (not force and npending <= self.maxpending):
+            return
+        array = self._array
+        if self._removed:
+            removed = np.fromiter(self._removed, dtype=int,
+                                  count=len(self._removed))
+            array = np.delete(array, np.searchsorted(array, removed))
+        if self._added:
+            added = np.asarray(self._added, dtype=int)
+            array = np.insert(array, np.searchsorted(array, added), added)
+        self._array = array
+        self._added = []
+        self._removed = set()
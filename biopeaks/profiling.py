@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""Opt-in instrumentation of the processing pipeline.
+
+The detectors, the artifact correction, as well as the readers and writers
+are divided into named stages (e.g., "ecg_peaks.highpass"). While a
+`StageProfile` is active (see `profile_stages`), the wall-clock time and
+optionally the allocated memory of every stage are recorded. When no profile is
+active, entering a stage does nothing, such that the instrumentation has
+negligible overhead. Regardless of profiling, entering a stage checks for
+cancellation (see `biopeaks.cancellation`).
+
+Examples
+--------
+>>> with profile_stages(trace_memory=True) as profile:
+...     peaks = ecg_peaks(signal, sfreq)
+>>> profile.to_json("profile.json")
+
+A profile can be re-activated in order to aggregate the stages across multiple
+calls, e.g., across all files of a batch:
+
+>>> profile = StageProfile()
+>>> for signal in signals:
+...     with profile_stages(profile):
+...         peaks = ecg_peaks(signal, sfreq)
+"""
+
+import json
+import threading
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from timeit import default_timer as timer
+from biopeaks.cancellation import check_cancelled
+
+
+_profile = None    # the active profile, shared by all threads
+_local = threading.local()    # per-thread stack of the entered stages
+_NULLSTAGE = nullcontext()
+
+
+class StageProfile:
+    """Wall-clock time and memory usage of named processing stages.
+
+    Attributes
+    ----------
+    trace_memory : bool
+        Whether or not the memory allocated by each stage is recorded.
+    stages : dict of dict
+        Maps each stage name to the number of calls ("calls"), the total and
+        maximum wall-clock time in seconds ("time", "max_time"), and, if
+        `trace_memory` is True, the maximum memory allocated during a call in
+        bytes ("memory").
+    """
+
+    def __init__(self, trace_memory=False):
+        """Instantiate an empty profile.
+
+        Parameters
+        ----------
+        trace_memory : bool, optional
+            Record the memory allocated by each stage with tracemalloc.
+            Tracing memory slows down processing considerably. Default is
+            False.
+        """
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, elapsed, memory=None):
+        """Record a call of a stage.
+
+        Parameters
+        ----------
+        name : str
+            The name of the stage.
+        elapsed : float
+            Wall-clock time of the call in seconds.
+        memory : int, optional
+            Memory allocated during the call in bytes. Default is None.
+        """
+        with self._lock:
+            record = self.stages.setdefault(name, {"calls": 0, "time": 0.,
+                                                   "max_time": 0.})
+            record["calls"] += 1
+            record["time"] += elapsed
+            record["max_time"] = max(record["max_time"], elapsed)
+            if memory is not None:
+                record["memory"] = max(record.get("memory", 0), memory)
+
+    def merge(self, other):
+        """Aggregate the stages of another profile into this profile.
+
+        Parameters
+        ----------
+        other : StageProfile
+            The profile whose stages are added.
+
+        Returns
+        -------
+        self : StageProfile
+        """
+        with self._lock:
+            for name, other_record in other.stages.items():
+                record = self.stages.setdefault(name, {"calls": 0, "time": 0.,
+                                                       "max_time": 0.})
+                record["calls"] += other_record["calls"]
+                record["time"] += other_record["time"]
+                record["max_time"] = max(record["max_time"],
+                                         other_record["max_time"])
+                if "memory" in other_record:
+                    record["memory"] = max(record.get("memory", 0),
+                                           other_record["memory"])
+        return self
+
+    def to_dict(self):
+        """Return the stages as dictionary, including the mean time per call."""
+        with self._lock:
+            return {name: {**record, "mean_time": record["time"] /
+                           record["calls"]}
+                    for name, record in self.stages.items()}
+
+    def to_json(self, wpath=None):
+        """Export the stages as JSON.
+
+        Parameters
+        ----------
+        wpath : str, optional
+            File system location to write the JSON to. Default is None.
+
+        Returns
+        -------
+        str
+            The JSON representation of the stages.
+        """
+        serialized = json.dumps(self.to_dict(), indent=2)
+        if wpath is not None:
+            with open(wpath, "w") as f:
+                f.write(serialized)
+        return serialized
+
+
+@contextmanager
+def profile_stages(profile=None, trace_memory=False):
+    """Record the processing stages that are executed within the context.
+
+    Parameters
+    ----------
+    profile : StageProfile, optional
+        The profile that records the stages. Pass a profile that has been
+        used before in order to aggregate stages across contexts. Default is
+        None (record to a new profile).
+    trace_memory : bool, optional
+        Only used if `profile` is None. See `StageProfile`. Default is False.
+
+    Yields
+    ------
+    profile : StageProfile
+    """
+    global _profile
+    if profile is None:
+        profile = StageProfile(trace_memory=trace_memory)
+    previous = _profile
+    start_tracing = profile.trace_memory and not tracemalloc.is_tracing()
+    if start_tracing:
+        tracemalloc.start()
+    _profile = profile
+    try:
+        yield profile
+    finally:
+        _profile = previous
+        if start_tracing:
+            tracemalloc.stop()
+
+
+def stage(name):
+    """Mark a processing stage.
+
+    Use as context manager around the code that constitutes the stage.
+
+    Parameters
+    ----------
+    name : str
+        The name of the stage.
+
+    Returns
+    -------
+    context manager
+        Records the stage in the active profile. Does nothing if no profile is
+        active.
+
+    Raises
+    ------
+    Cancelled
+        If the cancellation token of the current thread has been cancelled.
+    """
+    check_cancelled()
+    if _profile is None:
+        return _NULLSTAGE
+    return _record_stage(_profile, name)
+
+
+def profiled(name):
+    """Decorator that marks an entire function as a processing stage.
+
+    Parameters
+    ----------
+    name : str
+        The name of the stage.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            check_cancelled()
+            if _profile is None:
+                return func(*args, **kwargs)
+            with _record_stage(_profile, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def _record_stage(profile, name):
+    """Record wall-clock time and memory of a stage in a profile.
+
+    Nested stages are supported: the memory peak of a nested stage is
+    propagated to the enclosing stage, since tracemalloc's peak is reset upon
+    entering (and leaving) each stage.
+    """
+    trace_memory = profile.trace_memory and tracemalloc.is_tracing()
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+
+    if trace_memory:
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1][1] = max(stack[-1][1], peak)
+        tracemalloc.reset_peak()
+        stack.append([current, 0])
+
+    start = timer()
+    try:
+        yield
+    finally:
+        elapsed = timer() - start
+        memory = None
+        if trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            begin, nested_peak = stack.pop()
+            peak = max(peak, nested_peak)
+            memory = max(peak - begin, 0)
+            if stack:
+                stack[-1][1] = max(stack[-1][1], peak)
+            tracemalloc.reset_peak()
+        profile.add(name, elapsed, memory)
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""Progress reporting of long-running processing.
+
+A `ProgressTracker` is activated for the current thread with `tracking`.
+Readers report the bytes they read, detectors report the samples they
+processed, and chunked processing reports the fraction of the current file
+that is done (see `report_progress`). The tracker aggregates these reports
+into progress events, which are passed on to a callback at most every
+`interval` seconds (and whenever a file has been completed). When no tracker is
+active, reports do nothing.
+
+Each event is a dict containing:
+
+* "files_done" and "files_total": completed and total number of files
+* "samples" and "samples_per_sec": processed samples, and their rate
+* "bytes_read": bytes read from disk
+* "elapsed": seconds since the tracker has been created
+* "fraction": estimated fraction of the work that is done, where files are
+  weighted by their size on disk if available
+* "eta": estimated seconds remaining, None until some work is done
+
+Examples
+--------
+>>> processor = BatchProcessor("ECG", "EDF", "A3", wdirstats="stats",
+...                            progress=print)
+>>> results = processor.run(fpaths)
+
+>>> with tracking(ProgressTracker(callback=print)):
+...     results = process_long_recording(signal, sfreq, "ECG")
+"""
+
+import threading
+from contextlib import contextmanager
+from timeit import default_timer as timer
+
+
+_local = threading.local()    # the tracker that is active in each thread
+
+
+class ProgressTracker:
+    """Aggregate progress reports into progress events.
+
+    The tracker is thread-safe, such that reports can come from I/O threads
+    (see `biopeaks.batch.Prefetcher`) as well as from the processing thread.
+    """
+
+    def __init__(self, files_total=0, bytes_total=None, callback=None,
+                 interval=.5):
+        """Start timing.
+
+        Parameters
+        ----------
+        files_total : int, optional
+            Number of files that are processed. By default 0 (unknown).
+        bytes_total : int, optional
+            Size of all files on disk. If given, files are weighted by their
+            size (see `start_file`) when estimating the fraction of the work
+            that is done. By default None (files have equal weight).
+        callback : function, optional
+            Called with each progress event. By default None.
+        interval : float, optional
+            Minimal interval between two events in seconds. By default .5.
+        """
+        self.files_total = files_total
+        self.bytes_total = bytes_total
+        self.callback = callback
+        self.interval = interval
+        self.files_done = 0
+        self.samples = 0
+        self.bytes_read = 0
+        self._start = timer()
+        self._last_event = None
+        self._done_weight = 0.
+        self._file_weight = 0.
+        self._file_fraction = 0.
+        self._lock = threading.Lock()
+
+    def start_file(self, nbytes=None):
+        """Start processing a file.
+
+        Parameters
+        ----------
+        nbytes : int, optional
+            Size of the file on disk. Only used if `bytes_total` has been
+            given. By default None.
+        """
+        with self._lock:
+            if self.bytes_total:
+                self._file_weight = (nbytes or 0) / self.bytes_total
+            elif self.files_total:
+                self._file_weight = 1 / self.files_total
+            self._file_fraction = 0.
+
+    def finish_file(self):
+        """Finish processing the current file, and emit an event."""
+        with self._lock:
+            self.files_done += 1
+            self._done_weight += self._file_weight
+            self._file_weight = 0.
+            self._file_fraction = 0.
+        self.emit(force=True)
+
+    def report(self, samples=0, nbytes=0, fraction=None):
+        """Report progress and emit an event if the interval has passed.
+
+        Parameters
+        ----------
+        samples : int, optional
+            Number of samples that have been processed. By default 0.
+        nbytes : int, optional
+            Number of bytes that have been read. By default 0.
+        fraction : float, optional
+            Fraction of the current file that is done. By default None (no
+            change).
+        """
+        with self._lock:
+            self.samples += samples
+            self.bytes_read += nbytes
+            if fraction is not None:
+                self._file_fraction = min(max(fraction, 0.), 1.)
+        self.emit()
+
+    def event(self):
+        """Return the current progress event."""
+        with self._lock:
+            elapsed = timer() - self._start
+            if self.bytes_total or self.files_total:
+                fraction = (self._done_weight +
+                            self._file_weight * self._file_fraction)
+            else:
+                fraction = 0.
+            fraction = min(fraction, 1.)
+            eta = None
+            if fraction > 0:
+                eta = elapsed * (1 - fraction) / fraction
+            return {"files_done": self.files_done,
+                    "files_total": self.files_total,
+                    "samples": self.samples,
+                    "samples_per_sec": self.samples / elapsed if elapsed else 0.,
+                    "bytes_read": self.bytes_read,
+                    "elapsed": elapsed,
+                    "fraction": fraction,
+                    "eta": eta}
+
+    def emit(self, force=False):
+        """Pass the current event on to the callback.
+
+        Parameters
+        ----------
+        force : bool, optional
+            Emit regardless of the time passed since the last event. By
+            default False.
+        """
+        if self.callback is None:
+            return
+        now = timer()
+        with self._lock:
+            if (not force and self._last_event is not None and
+                    now - self._last_event < self.interval):
+                return
+            self._last_event = now
+        self.callback(self.event())
+
+
+@contextmanager
+def tracking(tracker):
+    """Activate a tracker for the current thread.
+
+    Parameters
+    ----------
+    tracker : ProgressTracker or None
+        The tracker that receives the reports within the context. None
+        deactivates reporting within the context.
+
+    Yields
+    ------
+    tracker : ProgressTracker or None
+    """
+    previous = getattr(_local, "tracker", None)
+    _local.tracker = tracker
+    try:
+        yield tracker
+    finally:
+        _local.tracker = previous
+
+
+def current_tracker():
+    """Return the tracker that is active in the current thread, or None."""
+    return getattr(_local, "tracker", None)
+
+
+def report_progress(samples=0, nbytes=0, fraction=None):
+    """Report progress to the active tracker (see `ProgressTracker.report`).
+
+    Does nothing if no tracker is active.
+    """
+    tracker = getattr(_local, "tracker", None)
+    if tracker is not None:
+        tracker.report(samples=samples, nbytes=nbytes, fraction=fraction)
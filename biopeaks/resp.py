@@ -3,11 +3,16 @@
 
 import numpy as np
 from itertools import cycle
-from biopeaks.filters import butter_bandpass_filter
-from biopeaks.analysis_utils import interp_stats
+from biopeaks.filters import butter_bandpass_filter, decimate_signal
+from biopeaks.analysis_utils import (interp_stats, DetectorWorkspace,
+                                     decimation_factor)
+from biopeaks.profiling import stage, profiled
+from biopeaks.cancellation import check_cancelled
+from biopeaks.progress import report_progress
 
 
-def resp_extrema(signal, sfreq):
+@profiled("resp_extrema")
+def resp_extrema(signal, sfreq, dtype=None, workspace=None, decimate=False):
     """Detect local extrema in a respiratory signal.
 
     Detect inhalation peaks and exhalation troughs with a variant of the
@@ -21,6 +26,20 @@ def resp_extrema(signal, sfreq):
         The respiratory signal.
     sfreq : int
         The sampling frequency of `signal`.
+    dtype : data-type, optional
+        Precision of the filtered signal. Pass np.float32 in order to halve
+        the memory footprint of long recordings. Default is None (the dtype of
+        `workspace` if provided, else double precision).
+    workspace : DetectorWorkspace, optional
+        Buffers for the intermediate results. Pass the same workspace to
+        consecutive calls in order to re-use the buffers (see
+        `DetectorWorkspace`). Default is None.
+    decimate : bool, optional
+        Detect the extrema in a version of `signal` that has been downsampled
+        to about 10 Hz (see `decimation_factor`). The extrema are mapped back
+        to the samples of `signal`, i.e., their precision is limited to the
+        downsampling factor. Speeds up the detection for high sampling
+        frequencies. Default is False.
 
     Returns
     -------
@@ -35,27 +54,50 @@ def resp_extrema(signal, sfreq):
     impedance tomography,” Physiol. Meas., vol. 39, no. 9, Sep. 2018,
     doi: 10.1088/1361-6579/aad7e6.
     """
-    signal = butter_bandpass_filter(signal, lowcut=.05, highcut=3, sfreq=sfreq,
-                                    order=2)    # preserve breathing rates > 3 bpm and < 180 bpm
-
-    greater = signal > 0
-    smaller = signal < 0
-
-    risex = np.where(np.bitwise_and(smaller[:-1], greater[1:]))[0]    # detect rising zero crossings
-    fallx = np.where(np.bitwise_and(greater[:-1], smaller[1:]))[0]    # detect falling zero crossings
-
-    allx = np.concatenate((risex, fallx))
-    allx.sort(kind="mergesort")
+    if workspace is None:
+        workspace = DetectorWorkspace()    # buffers only live for this call
+    if dtype is None:
+        dtype = workspace.dtype
+
+    original = signal
+    factor = decimation_factor(sfreq, "RESP") if decimate else 1
+    if factor > 1:
+        with stage("resp_extrema.decimate"):
+            signal = decimate_signal(signal, factor, dtype=dtype)
+        sfreq /= factor
+    nsamp = signal.size
+
+    with stage("resp_extrema.bandpass"):
+        signal = butter_bandpass_filter(signal, lowcut=.05, highcut=3,
+                                        sfreq=sfreq, order=2,
+                                        dtype=dtype)    # preserve breathing rates > 3 bpm and < 180 bpm
+
+    with stage("resp_extrema.zero_crossings"):
+        greater = np.greater(signal, 0, out=workspace.get("greater", nsamp,
+                                                           bool))
+        smaller = np.less(signal, 0, out=workspace.get("smaller", nsamp,
+                                                        bool))
+        crossing = workspace.get("crossing", nsamp - 1, bool)
+
+        risex = np.where(np.bitwise_and(smaller[:-1], greater[1:],
+                                        out=crossing))[0]    # detect rising zero crossings
+        fallx = np.where(np.bitwise_and(greater[:-1], smaller[1:],
+                                        out=crossing))[0]    # detect falling zero crossings
+
+        allx = np.concatenate((risex, fallx))
+        allx.sort(kind="mergesort")
 
     argextreme = cycle([np.argmax, np.argmin])
     if fallx[0] < risex[0]:
         next(argextreme)    # cycle once to switch order
 
     extrema = []
-    for beg, end in zip(allx[0:], allx[1:]):
+    with stage("resp_extrema.extrema_loop"):
+        for beg, end in zip(allx[0:], allx[1:]):
 
-        extreme = next(argextreme)(signal[beg:end])
-        extrema.append(beg + extreme)
+            check_cancelled()
+            extreme = next(argextreme)(signal[beg:end])
+            extrema.append(beg + extreme)
 
     extrema = np.asarray(extrema)
 
@@ -69,10 +111,12 @@ def resp_extrema(signal, sfreq):
     extdiffs = np.add(extdiffs[0:-1], extdiffs[1:])
     removeext = np.where(extdiffs != 0)[0] + 1
     extrema = np.delete(extrema, removeext)    # remove extrema that cause breaks in the alternation of peaks and troughs
+    report_progress(samples=original.size)
 
-    return extrema
+    return extrema * factor
 
 
+@profiled("resp_stats")
 def resp_stats(extrema, signal, sfreq):
     """Compute instantaneous respiratory features.
 
@@ -140,11 +184,10 @@ def resp_stats(extrema, signal, sfreq):
     nan_idcs = np.where(np.isnan(tidalamps))[0]
     tidalamps = np.delete(tidalamps, nan_idcs)    # remove tidal amplitudes that are NAN
     peaks = np.delete(peaks, nan_idcs)    # remove peaks that are part of a trough-peak pair that resulted in a tidal amplitude of NAN
-    tidalampintp = interp_stats(peaks, tidalamps, signal.size)
-
     period = np.ediff1d(peaks, to_begin=0) / sfreq
     period[0] = np.mean(period[1:])
-    periodintp = interp_stats(peaks, period, signal.size)
+    periodintp, tidalampintp = interp_stats(peaks, [period, tidalamps],
+                                            signal.size)    # both statistics are associated with the same peaks
     rateintp = 60 / periodintp
 
     return periodintp, rateintp, tidalampintp
@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+"""Fixtures shared by the unit tests."""
+
+import pytest
+from pathlib import Path
+from biopeaks.io_utils import read_edf
+
+
+@pytest.fixture
+def datadir():
+    return Path(__file__).parent.resolve().joinpath("testdata")
+
+
+@pytest.fixture
+def ecg_data(datadir):
+    return read_edf(datadir.joinpath("EDFmontage0.edf"), channel="A3",
+                    channeltype="signal")
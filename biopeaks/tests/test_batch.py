@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for batch module."""
+
+import json
+import shutil
+import threading
+import time
+import pytest
+import numpy as np
+import pandas as pd
+from biopeaks.batch import BatchProcessor, BatchManifest, Prefetcher
+
+
+sigfnames = ["OSmontage1A.txt", "OSmontage1J.txt", "OSmontage2A.txt",
+             "OSmontage2J.txt", "OSmontage3A.txt", "OSmontage3J.txt"]
+
+
+@pytest.mark.parametrize("correctpeaks, peaksums, stats",
+                         [(False, [3828709, 3434713, 2666196, 3546319,
+                                   3611836, 3480340],
+                           [(0.7916, 76.3624), (0.7285, 83.1771),
+                            (0.7889, 76.9233), (0.7402, 81.7879),
+                            (0.7856, 76.9153), (0.7234, 83.6239)]),
+                          (True, [3828678, 3416886, 2644580, 3534109,
+                                  3611833, 3480341],
+                           [(0.7914, 76.3427), (0.7305, 82.8876),
+                            (0.7942, 75.954), (0.7418, 81.5025),
+                            (0.7856, 76.9152), (0.7233, 83.6178)])],
+                         ids=["uncorrected", "autocorrection"])
+def test_batch_processor(tmp_path, correctpeaks, peaksums, stats, datadir):
+
+    processor = BatchProcessor("ECG", "OpenSignals", "A3",
+                               wdirstats=tmp_path, wdirpeaks=tmp_path,
+                               correctpeaks=correctpeaks)
+    results = processor.run([datadir.joinpath(f) for f in sigfnames])
+
+    for result, peaksum, stat in zip(results, peaksums, stats):
+        assert not result["error"]
+        peaks = pd.read_csv(result["wpathpeaks"])["peaks"] * 100    # sfreq
+        assert np.rint(peaks).astype(int).sum() == peaksum
+        savedstats = pd.read_csv(result["wpathstats"])
+        assert np.around(savedstats["period"].mean(), 4) == stat[0]
+        assert np.around(savedstats["rate"].mean(), 4) == stat[1]
+
+
+def test_batch_processor_error(tmp_path, datadir):
+
+    processor = BatchProcessor("ECG", "OpenSignals", "A1",
+                               wdirstats=tmp_path)
+    results = processor.run([datadir.joinpath(sigfnames[0])])
+    assert results[0]["error"] == "Error: Signal channel not found."
+
+
+def test_batch_processor_events(tmp_path, datadir):
+
+    processor = BatchProcessor("PPG", "EDF", "A5", wdirstats=tmp_path,
+                               markerinfo="A1", epochwindow=(-2, 5))
+    fpath = datadir.joinpath("EDFmontage0.edf")
+    result = processor.run([fpath])[0]
+    assert not result["error"]
+    events = pd.read_csv(result["wpathevents"])
+    assert list(events.columns) == ["onset", "period_baseline",
+                                    "period_response", "rate_baseline",
+                                    "rate_response"]
+    assert events.shape[0] > 800
+    assert events["onset"].min() >= 2
+    record = BatchManifest(tmp_path).records.popitem()[1]
+    assert len(record["outputs"]) == 2
+    assert record["params"]["epochwindow"] == [-2, 5]
+
+
+def test_batch_processor_beats(tmp_path, datadir):
+
+    processor = BatchProcessor("ECG", "OpenSignals", "A3", wdirstats=tmp_path,
+                               wdirpeaks=tmp_path.joinpath("peaks"),
+                               savebeats=True)
+    tmp_path.joinpath("peaks").mkdir()
+    result = processor.run([datadir.joinpath(sigfnames[0])])[0]
+    assert result["wpathbeats"].parent == tmp_path.joinpath("peaks")
+    beats = pd.read_csv(result["wpathbeats"])
+    peaks = pd.read_csv(result["wpathpeaks"])["peaks"]
+    assert np.allclose(beats["time"], peaks)
+    assert beats["qrs_width"].notna().all()
+
+
+def test_batch_resume(tmp_path, datadir):
+
+    rdir = tmp_path.joinpath("signals")
+    rdir.mkdir()
+    fpaths = [rdir.joinpath(f) for f in sigfnames[:3]]
+    for f, fpath in zip(sigfnames, fpaths):
+        shutil.copy(datadir.joinpath(f), fpath)
+
+    processor = BatchProcessor("ECG", "OpenSignals", "A3",
+                               wdirstats=tmp_path, wdirpeaks=tmp_path,
+                               resume=True)
+    results = processor.run(fpaths)
+    assert not any(result["skipped"] for result in results)
+    with open(tmp_path.joinpath("batch_manifest.jsonl")) as f:
+        records = [json.loads(line) for line in f]
+    assert [record["status"] for record in records] == ["done"] * 3
+    assert len(records[0]["outputs"]) == 2
+
+    results = processor.run(fpaths)
+    assert all(result["skipped"] for result in results)
+
+    with open(tmp_path.joinpath("batch_manifest.jsonl"), "a") as f:
+        f.write('{"fpath": "interrupted')    # truncated line
+    fpaths[0].write_bytes(fpaths[0].read_bytes())    # touched, but unchanged
+    shutil.copy(datadir.joinpath(sigfnames[3]), fpaths[1])    # changed input
+    results[2]["wpathpeaks"].unlink()    # incomplete outputs
+    results = processor.run(fpaths)
+    assert [result["skipped"] for result in results] == [True, False, False]
+
+    processor.correctpeaks = True    # changed parameters
+    results = processor.run(fpaths)
+    assert not any(result["skipped"] for result in results)
+    assert not BatchManifest(tmp_path).pending(fpaths, processor.params)
+
+
+def wait_for_reads(started, n_reads, timeout=5):
+
+    deadline = time.monotonic() + timeout
+    while len(started) < n_reads and time.monotonic() < deadline:
+        time.sleep(.01)
+    time.sleep(.1)    # give further reads the chance to (erroneously) start
+
+
+def test_prefetcher():
+
+    started = []
+    release = threading.Event()
+
+    def readfunc(path):
+        started.append(path)
+        release.wait(5)
+        return np.zeros(1000)
+
+    prefetcher = Prefetcher(range(10), readfunc, n_ahead=3, n_threads=4)
+    wait_for_reads(started, 3)
+    assert sorted(started) == [0, 1, 2]    # only read n_ahead files ahead
+    release.set()
+    assert [path for path, _ in prefetcher] == list(range(10))    # in order
+    prefetcher.close()
+
+
+def test_prefetcher_budget(tmp_path):
+
+    fpaths = [tmp_path.joinpath(f"{i}.txt") for i in range(4)]
+    for fpath in fpaths:
+        fpath.write_bytes(bytes(1000))
+    started = []
+    release = threading.Event()
+
+    def readfunc(path):
+        started.append(path)
+        release.wait(5)
+        return np.zeros(125)    # 1000 bytes
+
+    prefetcher = Prefetcher(fpaths, readfunc, n_ahead=4, max_bytes=2500,
+                            n_threads=4)
+    wait_for_reads(started, 2)
+    assert sorted(started) == fpaths[:2]    # a third file would exceed the budget
+    release.set()
+    assert [path for path, _ in prefetcher] == fpaths
+    prefetcher.close()
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for beats module."""
+
+import pytest
+import numpy as np
+from biopeaks.beats import (beat_table, beat_windows, beat_template,
+                            template_correlation)
+
+
+@pytest.fixture
+def signal():
+    rng = np.random.default_rng(42)
+    return rng.normal(size=10000)
+
+
+@pytest.fixture
+def peaks():
+    return np.arange(250, 9800, 700)
+
+
+@pytest.fixture
+def segments(peaks):
+    return np.column_stack((peaks - 20, peaks + 30))
+
+
+def test_beat_table_ecg(signal, peaks, segments):
+
+    beats = beat_table(signal, peaks, 1000, "ECG", segments=segments)
+    assert np.array_equal(beats["peak"], peaks)
+    assert np.allclose(beats["amplitude"], signal[peaks])
+    assert np.isnan(beats["interval"].iloc[0])
+    assert np.allclose(beats["interval"].iloc[1:], 700)
+    assert np.allclose(beats["qrs_width"], 50)
+    for (beg, end), amplitude in zip(segments, beats["qrs_amplitude"]):
+        assert amplitude == pytest.approx(np.ptp(signal[beg:end]))
+
+    # Peaks outside of segments (e.g., after correction).
+    edited = np.r_[peaks[:3], 5000]
+    beats = beat_table(signal, edited, 1000, "ECG", segments=segments)
+    assert beats["qrs_width"].iloc[:3].notna().all()
+    assert np.isnan(beats["qrs_width"].iloc[3])
+    assert beat_table(signal, peaks, 1000, "ECG")["qrs_width"].isna().all()
+
+
+def test_beat_table_ppg(signal, peaks, segments):
+
+    beats = beat_table(signal, peaks, 1000, "PPG", segments=segments)
+    begs = np.r_[0, peaks[:-1]]
+    for beat, beg, peak in zip(beats.itertuples(), begs, peaks):
+        window = signal[beg:peak + 1]
+        assert beat.foot_amplitude == pytest.approx(window.min())
+        assert beat.pulse_amplitude == pytest.approx(signal[peak] -
+                                                     window.min())
+        assert beat.rise_time == pytest.approx(peak - beg -
+                                               np.argmin(window))
+    assert np.allclose(beats["wave_width"], 50)
+    assert beat_table(signal, [], 1000, "PPG").empty
+    with pytest.raises(ValueError):
+        beat_table(signal, peaks, 1000, "RESP")
+
+
+def test_beat_table_int(peaks, segments):
+
+    signal = np.zeros(10000, dtype=np.int16)
+    signal[peaks] = 20000
+    signal[peaks + 10] = -20000
+    beats = beat_table(signal, peaks, 1000, "ECG", segments=segments)
+    assert np.allclose(beats["qrs_amplitude"], 40000)
+    beats = beat_table(signal, peaks, 1000, "PPG")
+    assert np.allclose(beats["pulse_amplitude"].iloc[1:], 40000)
+
+
+def test_beat_table_nan(signal, peaks, segments):
+
+    signal = signal.copy()
+    signal[peaks[1] - 300:peaks[1] - 200] = np.nan
+    signal[peaks[2]:peaks[3] + 1] = np.nan    # the entire pulse
+    beats = beat_table(signal, peaks, 1000, "PPG", segments=segments)
+    assert beats.shape[0] == peaks.size
+    window = signal[peaks[0]:peaks[1] + 1]
+    assert beats["foot_amplitude"].iloc[1] == pytest.approx(np.nanmin(window))
+    assert beats["rise_time"].iloc[1] == pytest.approx(peaks[1] - peaks[0] -
+                                                      np.nanargmin(window))
+    assert beats[["foot_amplitude", "rise_time"]].iloc[3].isna().all()
+    assert beats["rise_time"].drop(index=3).notna().all()
+    beats = beat_table(signal, peaks, 1000, "ECG", segments=segments)
+    assert beats["qrs_amplitude"].notna().all()
+
+
+@pytest.mark.parametrize("dtype", [None, np.float32])
+def test_beat_windows(signal, dtype):
+
+    peaks = np.array([100, 2000, 5000, 9990])
+    windows, valid = beat_windows(signal, peaks, 1000, before=.2, after=.1,
+                                  dtype=dtype)
+    assert np.array_equal(valid, [2000, 5000])    # windows of first and last peak exceed signal
+    assert windows.shape == (2, 301)
+    assert windows.dtype == (signal.dtype if dtype is None else dtype)
+    for window, peak in zip(windows, valid):
+        assert np.allclose(window, signal[peak - 200:peak + 101])
+    assert beat_windows(signal, [], 1000, dtype=dtype)[0].shape == (0, 601)
+
+
+def test_beat_template(signal, peaks):
+
+    rng = np.random.default_rng(1)
+    beat = np.sin(np.linspace(0, 2 * np.pi, 601))
+    windows = beat + rng.normal(scale=.1, size=(peaks.size, 601))
+    windows[3] = rng.normal(size=601)    # artifact
+    template = beat_template(windows)
+    assert np.corrcoef(template, beat)[0, 1] > .99
+    assert np.allclose(beat_template(windows, method="mean"),
+                       windows.mean(axis=0))
+    with pytest.raises(ValueError):
+        beat_template(windows, method="mode")
+
+    r = template_correlation(windows.astype(np.float32), template)
+    expected = [np.corrcoef(window, template)[0, 1] for window in windows]
+    assert np.allclose(r, expected, atol=1e-6)
+    assert np.argmin(r) == 3
+    windows[0] = 1    # no variance
+    assert np.isnan(template_correlation(windows, template)[0])
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for cache module."""
+
+import os
+import pytest
+import numpy as np
+import pandas as pd
+from biopeaks.cache import ResultCache
+from biopeaks.batch import BatchProcessor
+from biopeaks.heart import ecg_peaks, correct_peaks, heart_stats
+from biopeaks.resp import resp_extrema, resp_stats
+from biopeaks.io_utils import read_edf
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(tmp_path.joinpath("cache"))
+
+
+def test_cache_ecg(cache, ecg_data):
+
+    signal, sfreq = ecg_data["signal"], ecg_data["sfreq"]
+    peaks = cache.detect(signal, sfreq, "ECG")
+    assert np.array_equal(peaks, ecg_peaks(signal, sfreq))
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    assert np.array_equal(cache.detect(signal, sfreq, "ECG"), peaks)
+    cache.detect(signal, sfreq, "ECG", smoothwindow=.1)    # default value
+    assert (cache.hits, cache.misses) == (2, 1)
+    cache.detect(signal, sfreq, "ECG", smoothwindow=.2)
+    cache.detect(signal[1:], sfreq, "ECG")
+    assert (cache.hits, cache.misses) == (2, 3)
+
+    corrected = cache.correct(peaks, sfreq)
+    assert np.array_equal(corrected, correct_peaks(peaks, sfreq))
+    stats = cache.stats(corrected, signal, sfreq, "ECG")
+    period, rate = heart_stats(corrected, sfreq, signal.size)
+    assert np.array_equal(stats["period"], period)
+    assert np.array_equal(stats["rate"], rate)
+    cache.stats(corrected, signal, sfreq, "ECG")
+    assert (cache.hits, cache.misses) == (3, 5)
+
+    # Segments are cached along with the extrema.
+    peaks_segments, segments = cache.detect(signal, sfreq, "ECG",
+                                            return_segments=True)
+    assert np.array_equal(peaks_segments, peaks)
+    assert (cache.hits, cache.misses) == (4, 5)    # entry without segments has been replaced
+    _, cached_segments = cache.detect(signal, sfreq, "ECG",
+                                      return_segments=True)
+    assert np.array_equal(cached_segments, segments)
+    assert np.array_equal(cache.detect(signal, sfreq, "ECG"), peaks)
+    assert (cache.hits, cache.misses) == (6, 5)
+
+
+def test_cache_resp(cache, datadir):
+
+    data = read_edf(datadir.joinpath("EDFmontage0.edf"), channel="A5",
+                    channeltype="signal")
+    signal, sfreq = data["signal"], data["sfreq"]
+    extrema = cache.detect(signal, sfreq, "RESP")
+    assert np.array_equal(extrema, resp_extrema(signal, sfreq))
+    stats = cache.stats(extrema, signal, sfreq, "RESP")
+    tidalamp = resp_stats(extrema, signal, sfreq)[2]
+    assert np.array_equal(stats["tidalamp"], tidalamp)
+    cache.stats(extrema, signal * 2, sfreq, "RESP")    # tidal amplitude changes
+    assert cache.hits == 0
+
+
+def test_cache_eviction(cache):
+
+    entry = {"data": np.zeros(1000)}    # 8000 bytes plus header
+    for key in ["a", "b", "c"]:
+        cache.put(key, entry)
+    os.utime(cache._path("a"), ns=(0, 0))
+    os.utime(cache._path("b"), ns=(1, 1))
+    assert cache.get("a") is not None    # "b" is now least recently used
+
+    cache.max_bytes = cache.nbytes - 1
+    cache.evict()
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+    cache.put("d", entry)    # evicts the least recently used entry
+    assert len(list(cache.cachedir.glob("*.npz"))) == 2
+    cache.clear()
+    assert cache.nbytes == 0
+
+
+def test_cache_corrupted_entry(cache):
+
+    cache._path("a").write_bytes(b"truncated")
+    assert cache.get("a") is None
+    assert not cache._path("a").exists()
+
+
+def test_batch_processor_cache(tmp_path, cache, datadir):
+
+    fpaths = [datadir.joinpath(f) for f in ["OSmontage1A.txt",
+                                             "OSmontage1J.txt"]]
+    processor = BatchProcessor("ECG", "OpenSignals", "A3",
+                               wdirstats=tmp_path, correctpeaks=True,
+                               cache=cache)
+    expected = [pd.read_csv(result["wpathstats"]) for result
+                in processor.run(fpaths)]
+    assert (cache.hits, cache.misses) == (0, 6)
+
+    processor.savestats = ["rate"]    # only the saved statistics change
+    results = processor.run(fpaths)
+    assert (cache.hits, cache.misses) == (6, 6)
+    for result, stats in zip(results, expected):
+        assert pd.read_csv(result["wpathstats"]).equals(stats[["rate"]])
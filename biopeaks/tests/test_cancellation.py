@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for cancellation module."""
+
+import threading
+import time
+import pytest
+import numpy as np
+from biopeaks.cancellation import (CancellationToken, Cancelled, cancellable,
+                                   check_cancelled, current_token)
+from biopeaks.batch import BatchProcessor, BatchManifest, Prefetcher
+from biopeaks.heart import ecg_peaks
+
+
+sigfnames = ["OSmontage1A.txt", "OSmontage1J.txt", "OSmontage2A.txt",
+             "OSmontage2J.txt", "OSmontage3A.txt", "OSmontage3J.txt"]
+
+
+def test_cancellable():
+
+    check_cancelled()    # must not fail without an active token
+    token = CancellationToken()
+    with cancellable(token):
+        check_cancelled()
+        with cancellable(None):
+            token.cancel()
+            check_cancelled()    # deactivated within nested context
+        assert current_token() is token
+        with pytest.raises(Cancelled):
+            check_cancelled()
+    assert current_token() is None
+
+
+def test_cancel_detector(ecg_data):
+
+    signal = np.tile(ecg_data["signal"], 20)
+    start = time.perf_counter()
+    ecg_peaks(signal, ecg_data["sfreq"])
+    duration = time.perf_counter() - start
+
+    token = CancellationToken()
+    threading.Timer(duration / 4, token.cancel).start()
+    start = time.perf_counter()
+    with cancellable(token), pytest.raises(Cancelled):
+        ecg_peaks(signal, ecg_data["sfreq"])
+    assert time.perf_counter() - start < duration
+
+
+def test_cancel_prefetcher():
+
+    release = threading.Event()
+
+    def readfunc(path):
+        release.wait(5)
+        return path
+
+    token = CancellationToken()
+    prefetcher = Prefetcher(range(3), readfunc, token=token)
+    threading.Timer(.1, token.cancel).start()
+    with cancellable(token), pytest.raises(Cancelled):
+        prefetcher.get()    # stops waiting for the read
+    release.set()
+    prefetcher.close()
+
+
+def test_cancel_batch_processor(tmp_path, datadir):
+
+    fpaths = [datadir.joinpath(f) for f in sigfnames]
+    processor = BatchProcessor("ECG", "OpenSignals", "A3",
+                               wdirstats=tmp_path, resume=True)
+    processor.cancel()
+    with pytest.raises(Cancelled):
+        processor.run(fpaths)
+    assert not BatchManifest(tmp_path).records
+
+    manifest = tmp_path.joinpath("batch_manifest.jsonl")
+
+    def cancel_after_first_file():
+        while not manifest.exists():
+            time.sleep(.01)
+        processor.cancel()
+
+    threading.Thread(target=cancel_after_first_file).start()
+    with pytest.raises(Cancelled):
+        processor.run(fpaths)
+    nprocessed = len(BatchManifest(tmp_path).records)
+    assert 1 <= nprocessed < len(fpaths)
+
+    results = processor.run(fpaths)    # resume
+    assert sum(result["skipped"] for result in results) == nprocessed
+    assert not any(result["error"] for result in results)
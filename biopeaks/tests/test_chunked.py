@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for chunked module."""
+
+import numpy as np
+from biopeaks.chunked import process_long_recording
+from biopeaks.heart import ecg_peaks, correct_peaks, heart_stats
+from biopeaks.resp import resp_extrema
+from biopeaks.io_utils import (read_edf, memmap_edf, read_opensignals,
+                               read_custom, memmap_text)
+
+
+def test_memmap_edf(datadir):
+
+    data = read_edf(datadir.joinpath("EDFmontage0.edf"), "A3", "signal")
+    mapped = memmap_edf(datadir.joinpath("EDFmontage0.edf"), "A3", "signal")
+    signal = mapped["signal"]
+    assert mapped["sfreq"] == data["sfreq"]
+    assert signal.size == data["signal"].size
+    assert np.array_equal(signal[1234:56789], data["signal"][1234:56789])
+    assert np.array_equal(signal[[0, 999, -1]], data["signal"][[0, 999, -1]])
+
+
+def test_memmap_text(tmp_path, datadir):
+
+    rpath = datadir.joinpath("OSmontage1J.txt")
+    data = read_opensignals(rpath, "A3", "signal")
+    for _ in range(2):    # create and re-use cache
+        mapped = memmap_text(rpath, read_opensignals, "A3", "signal",
+                             cachedir=tmp_path)
+        assert isinstance(mapped["signal"], np.memmap)
+        assert np.array_equal(mapped["signal"], data["signal"])
+        assert mapped["sfreq"] == data["sfreq"]
+    assert len(list(tmp_path.glob("*.npy"))) == 1
+
+
+def test_memmap_text_same_name(tmp_path):
+
+    header = {"signalidx": 1, "markeridx": 1, "skiprows": 0, "sfreq": 10,
+              "separator": "\t"}
+    cachedir = tmp_path.joinpath("cache")
+    for directory, sign in [("a", 1), ("b", -1)]:    # same file name, different data
+        rpath = tmp_path.joinpath(directory, "rec.txt")
+        rpath.parent.mkdir()
+        np.savetxt(rpath, sign * np.arange(10))
+        mapped = memmap_text(rpath, read_custom, header, "signal",
+                             cachedir=cachedir)
+        assert np.array_equal(mapped["signal"], sign * np.arange(10))
+    assert len(list(cachedir.glob("rec_*.npy"))) == 2
+
+
+def test_process_long_recording_ecg(datadir):
+
+    data = read_edf(datadir.joinpath("EDFmontage0.edf"), "A3", "signal")
+    mapped = memmap_edf(datadir.joinpath("EDFmontage0.edf"), "A3", "signal")
+    results = process_long_recording(mapped["signal"], mapped["sfreq"], "ECG",
+                                     chunksize=120)
+
+    peaks = correct_peaks(ecg_peaks(data["signal"], data["sfreq"]),
+                          data["sfreq"])
+    period, rate = heart_stats(peaks, data["sfreq"], data["signal"].size)
+    assert np.array_equal(results["peaks"], peaks)
+    assert np.allclose(results["period"], period)
+    assert np.allclose(results["rate"], rate)
+
+
+def test_process_long_recording_out(datadir, tmp_path):
+
+    mapped = memmap_edf(datadir.joinpath("EDFmontage0.edf"), "A3", "signal")
+    nsamp = mapped["signal"].size
+    out = {key: np.lib.format.open_memmap(tmp_path.joinpath(f"{key}.npy"),
+                                          mode="w+", shape=(nsamp,))
+           for key in ["period", "rate"]}
+    results = process_long_recording(mapped["signal"], mapped["sfreq"], "ECG",
+                                     chunksize=120, out=out)
+    assert results["period"] is out["period"]
+    period, rate = heart_stats(results["peaks"], mapped["sfreq"], nsamp)
+    assert np.allclose(out["period"], period)
+    assert np.allclose(out["rate"], rate)
+
+    results32 = process_long_recording(mapped["signal"], mapped["sfreq"],
+                                       "ECG", chunksize=120, stats=False,
+                                       dtype=np.float32)
+    assert np.array_equal(results32["peaks"], results["peaks"])
+
+
+def test_process_long_recording_resp(datadir):
+
+    data = read_edf(datadir.joinpath("EDFmontage0.edf"), "A5", "signal")
+    results = process_long_recording(data["signal"], data["sfreq"], "RESP",
+                                     chunksize=120, stats=False)
+
+    extrema = resp_extrema(data["signal"], data["sfreq"])
+    assert results["peaks"].size == extrema.size
+    assert np.max(np.abs(results["peaks"] - extrema)) <= 1    # in samples
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for epochs module."""
+
+import pytest
+import numpy as np
+from biopeaks.epochs import marker_onsets, epochs, event_stats
+
+
+@pytest.fixture
+def marker():
+    marker = np.zeros(1000)
+    for onset in [100, 300, 305, 700]:
+        marker[onset:onset + 20] = 5
+    marker[500:505] = 1    # below the default threshold
+    return marker
+
+
+def test_marker_onsets(marker):
+
+    assert np.array_equal(marker_onsets(marker), [100, 300, 700])
+    assert np.array_equal(marker_onsets(marker, threshold=.5),
+                          [100, 300, 500, 700])
+    # Marker sampled at a tenth of the signal's sampling frequency.
+    assert np.array_equal(marker_onsets(marker, sfreqmarker=100, sfreq=1000),
+                          [1000, 3000, 7000])
+    marker[330:333] = 5    # bounce
+    assert np.array_equal(marker_onsets(marker, sfreqmarker=100), [100, 300,
+                                                                  330, 700])
+    assert np.array_equal(marker_onsets(marker, sfreqmarker=100,
+                                        mininterval=.5), [100, 300, 700])
+    assert marker_onsets(np.zeros(100)).size == 0
+
+
+def test_epochs():
+
+    x = np.arange(1000.)
+    onsets = np.array([5, 100, 500, 995])
+    result, valid = epochs(x, onsets, 100, tmin=-.1, tmax=.2)
+    assert np.array_equal(valid, [100, 500])    # windows of first and last event exceed x
+    assert result.shape == (2, 30)
+    for window, onset in zip(result, valid):
+        assert np.array_equal(window, x[onset - 10:onset + 20])
+    assert epochs(x[:10], onsets, 100)[0].shape == (0, 1100)
+    with pytest.raises(ValueError):
+        epochs(x, onsets, 100, tmin=1, tmax=1)
+
+
+def test_event_stats():
+
+    sfreq = 10
+    rate = np.full(1000, 60.)
+    onsets = np.array([100, 400, 995])
+    for onset, response in zip(onsets, [10, 20]):
+        rate[onset:onset + 50] += response
+    events = event_stats({"rate": rate, "period": 60 / rate}, onsets, sfreq,
+                         tmin=-2, tmax=5)
+    assert np.allclose(events["onset"], [10, 40])
+    assert np.allclose(events["rate_baseline"], 60)
+    assert np.allclose(events["rate_response"], [10, 20])
+    assert np.allclose(events["period_response"], [60 / 70 - 1, 60 / 80 - 1])
+    with pytest.raises(ValueError):
+        event_stats({"rate": rate}, onsets, sfreq, tmin=0)
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for filters module."""
+
+import pytest
+import numpy as np
+from scipy.signal import filtfilt
+from biopeaks.filters import (butter_lowpass_filter, butter_highpass_filter,
+                              butter_bandpass_filter, moving_average,
+                              powerline_filter, _butter_highpass,
+                              _fft_filtfilt)
+from biopeaks.analysis_utils import DetectorWorkspace
+
+
+@pytest.fixture
+def signal():
+    rng = np.random.default_rng(42)
+    sec = np.arange(0, 60, .001)
+    return (np.sin(2 * np.pi * sec) + np.sin(2 * np.pi * 50 * sec) +
+            rng.normal(0, .1, sec.size))
+
+
+@pytest.mark.parametrize("filterfunc, kwargs",
+                         [(butter_lowpass_filter, {"cutoff": 5}),
+                          (butter_highpass_filter, {"cutoff": .5}),
+                          (butter_bandpass_filter, {"lowcut": .5,
+                                                    "highcut": 5}),
+                          (powerline_filter, {})],
+                         ids=["lowpass", "highpass", "bandpass", "powerline"])
+def test_filter_float32(signal, filterfunc, kwargs):
+
+    filt64 = filterfunc(signal, sfreq=1000, **kwargs)
+    filt32 = filterfunc(signal, sfreq=1000, dtype=np.float32, **kwargs)
+    assert filt64.dtype == np.float64
+    assert filt32.dtype == np.float32
+    # Cutoffs that are low relative to the sampling rate amplify the rounding
+    # errors of single precision.
+    assert np.allclose(filt32, filt64, atol=1e-2 * np.max(np.abs(filt64)))
+
+
+def test_moving_average_float32(signal):
+
+    avg64 = moving_average(signal, 100)
+    avg32 = moving_average(signal, 100, dtype=np.float32)
+    assert avg32.dtype == np.float32
+    assert np.allclose(avg32, avg64, atol=1e-5)
+
+
+def test_moving_average_workspace_int(signal):
+
+    signal = np.rint(signal * 1000).astype(np.int16)
+    expected = moving_average(signal, 101)
+    avg = moving_average(signal, 101, workspace=DetectorWorkspace())
+    assert avg.dtype == np.float64
+    assert np.allclose(avg, expected)
+
+
+@pytest.mark.parametrize("sfreq", [50, 100, 1000, 4000])
+def test_powerline_boxcar(signal, sfreq):
+
+    kernel_size = int(sfreq / 50) if sfreq >= 100 else 2
+    expected = filtfilt(np.ones(kernel_size), [kernel_size], signal,
+                        method="pad")
+    assert np.allclose(powerline_filter(signal, sfreq), expected)
+
+
+def test_powerline_boxcar_int(signal):
+
+    signal = np.rint(signal * 4000).astype(np.int16)    # like read_edf
+    expected = filtfilt(np.ones(20), [20], signal, method="pad")
+    filt = powerline_filter(signal, 1000)
+    assert filt.dtype == np.float64
+    assert np.allclose(filt, expected)
+
+
+@pytest.mark.parametrize("method", ["boxcar", "notch"])
+def test_powerline_mainsfreq(method):
+
+    sec = np.arange(0, 10, 1 / 600)
+    slow = np.sin(2 * np.pi * 1 * sec)
+    noise = np.sin(2 * np.pi * 60 * sec) + .5 * np.sin(2 * np.pi * 180 * sec)
+    filt = powerline_filter(slow + noise, 600, mainsfreq=60, method=method)
+    core = slice(600, -600)    # ignore edge effects
+    assert np.max(np.abs(filt[core] - slow[core])) < .05
+
+
+@pytest.mark.parametrize("filterfunc, kwargs",
+                         [(butter_lowpass_filter, {"cutoff": 5}),
+                          (butter_highpass_filter, {"cutoff": .5}),
+                          (butter_bandpass_filter, {"lowcut": .5,
+                                                    "highcut": 5}),
+                          (powerline_filter, {"method": "notch"})],
+                         ids=["lowpass", "highpass", "bandpass", "powerline"])
+def test_filter_fft_backend(signal, filterfunc, kwargs):
+
+    filtsos = filterfunc(signal, sfreq=1000, **kwargs)
+    filtfft = filterfunc(signal, sfreq=1000, backend="fft", workers=2,
+                         **kwargs)
+    assert filtfft.shape == filtsos.shape
+    core = slice(20000, -20000)    # edges are handled differently
+    assert np.allclose(filtfft[core], filtsos[core],
+                       atol=1e-7 * np.max(np.abs(filtsos)))
+
+
+def test_filter_fft_backend_int():
+
+    sec = np.arange(0, 60, .001)
+    signal = (20000 * np.sin(2 * np.pi * sec)).astype(np.int16)
+    filtsos = butter_highpass_filter(signal, .5, 1000)
+    filtfft = _fft_filtfilt(_butter_highpass(.5, 1000), signal, 2)
+    assert filtfft.dtype == np.float64
+    core = slice(20000, -20000)    # edges are handled differently
+    assert np.allclose(filtfft[core], filtsos[core],
+                       atol=1e-7 * np.max(np.abs(filtsos)))
+
+
+def test_filter_auto_backend(signal):
+
+    filtsos = butter_highpass_filter(signal, .5, 1000, backend="sos")
+    filtauto = butter_highpass_filter(signal, .5, 1000, backend="auto",
+                                      workers=8)
+    assert np.array_equal(filtauto, filtsos)
+
+
+def test_filter_backend_error(signal):
+
+    with pytest.raises(ValueError):
+        butter_lowpass_filter(signal, 5, 1000, backend="unknown")
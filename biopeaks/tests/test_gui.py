@@ -289,6 +289,12 @@ def test_singlefile(qtbot, tmpdir, cfg_single):
     # case of a flat peak, hence discrepancies of a few msecs can arise. Set
     # tolerance for deviation of re-inserted peak to 25 msec.
     assert abs(model.peaks[0] / model.sfreq - demopeak) <= .025
+    # Undo and redo adding the peak.
+    addedpeak = model.peaks[0]
+    controller.edit_peaks(MockKeyEvent(key="ctrl+z", xdata=None))
+    assert model.peaks[0] > addedpeak
+    controller.edit_peaks(MockKeyEvent(key="ctrl+y", xdata=None))
+    assert model.peaks[0] == addedpeak
     view.editcheckbox.setCheckState(Qt.Unchecked)
 
     # 6. save peaks ###########################################################
@@ -480,3 +486,59 @@ def test_batchfile(qtbot, tmpdir, cfg_batch):
         stats = pd.read_csv(statsfname)
         assert np.around(stats["period"].mean(), 4) == stat[0]
         assert np.around(stats["rate"].mean(), 4) == stat[1]
+
+
+def test_segment_undo(qtbot):
+
+    model = Model()
+    controller = Controller(model)
+    view = View(model, controller)
+    qtbot.addWidget(view)
+    view.show()
+
+    qtbot.keyClicks(view.sigchanmenu, ppg_edf["sigchan"])
+    qtbot.keyClicks(view.markerchanmenu, ppg_edf["markerchan"])
+    qtbot.keyClicks(view.modmenu, ppg_edf["modality"])
+    qtbot.keyClicks(view.batchmenu, ppg_edf["mode"])
+    model.set_filetype(ppg_edf["filetype"])
+    model.fpaths = [ppg_edf["sigpathorig"]]
+    with qtbot.waitSignals([model.signal_changed, model.marker_changed],
+                           timeout=10000):
+        controller._load_channels()
+    with qtbot.waitSignal(model.peaks_changed, timeout=5000):
+        controller.find_peaks()
+    with qtbot.waitSignal(model.period_changed, timeout=5000):
+        controller.calculate_stats()
+    signal, peaks = model.signal, model.peaks
+
+    # Segment twice, the second segment is relative to the first one.
+    model.set_segment(values=ppg_edf["segment"])
+    with qtbot.waitSignal(model.signal_changed, timeout=5000):
+        controller.segment_dataset()
+    firstsegment = model.signal
+    model.set_segment(values=[10, 40])
+    with qtbot.waitSignal(model.signal_changed, timeout=5000):
+        controller.segment_dataset()
+    assert np.size(model.signal) == 30 * model.sfreq
+    assert np.shares_memory(model.signal, signal)    # no copy
+    assert np.allclose(model.segments[-1]["seconds"],
+                       np.add(ppg_edf["segment"][0], [10, 40]),
+                       atol=1 / model.sfreq)
+
+    # Undo the second segment.
+    with qtbot.waitSignal(model.signal_changed, timeout=5000):
+        controller.undo_segment()
+    assert np.array_equal(model.signal, firstsegment)
+    assert np.allclose(np.size(model.marker),
+                       np.diff(ppg_edf["segment"]) * model.sfreqmarker, atol=1)
+    assert model.periodintp.size == model.signal.size
+
+    # Delete a peak and revert to the entire signal.
+    model.peaks = np.delete(model.peaks, 0)
+    with qtbot.waitSignal(model.signal_changed, timeout=5000):
+        controller.revert_segment()
+    assert model.signal.size == ppg_edf["siglen"]
+    assert model.marker.size == ppg_edf["markerlen"]
+    assert model.peaks.size == peaks.size - 1
+    assert model.periodintp is None    # outdated since peaks have been edited
+    assert model.segments is None and model.original is None
@@ -3,10 +3,13 @@
 
 import pytest
 import numpy as np
+from scipy.signal import resample_poly
 from pathlib import Path
 from biopeaks.heart import (ecg_peaks, ppg_peaks, heart_stats, _find_artifacts,
-                            _correct_artifacts, correct_peaks)
+                            _correct_artifacts, correct_peaks,
+                            update_heart_stats)
 from biopeaks.io_utils import read_edf
+from biopeaks.analysis_utils import DetectorWorkspace, interp_stats
 
 
 def compute_rmssd(peaks):
@@ -265,8 +268,96 @@ def test_ppg_peaks(ppg_data):
     assert np.allclose(np.sum(test_extrema), 20238288, atol=5)
 
 
+def test_ecg_peaks_float32(ecg_data):
+
+    peaks64 = ecg_peaks(ecg_data["signal"], ecg_data["sfreq"])
+    peaks32 = ecg_peaks(ecg_data["signal"], ecg_data["sfreq"],
+                        dtype=np.float32)
+    assert np.array_equal(peaks32, peaks64)
+
+
+def test_ppg_peaks_float32(ppg_data):
+
+    peaks64 = ppg_peaks(ppg_data["signal"], ppg_data["sfreq"])
+    peaks32 = ppg_peaks(ppg_data["signal"], ppg_data["sfreq"],
+                        dtype=np.float32)
+    assert np.array_equal(peaks32, peaks64)
+
+
+@pytest.mark.parametrize("detector", [ecg_peaks, ppg_peaks])
+def test_peaks_workspace(ecg_data, detector):
+
+    peaks = detector(ecg_data["signal"], ecg_data["sfreq"])
+    workspace = DetectorWorkspace(ecg_data["signal"].size)
+    for _ in range(2):
+        peaks_workspace = detector(ecg_data["signal"], ecg_data["sfreq"],
+                                   workspace=workspace)
+        assert np.array_equal(peaks_workspace, peaks)
+    allocations = workspace.allocations
+    detector(ecg_data["signal"][:-100], ecg_data["sfreq"], workspace=workspace)
+    assert workspace.allocations == allocations    # shorter signal fits buffers
+
+
+@pytest.mark.parametrize("detector", [ecg_peaks, ppg_peaks])
+def test_peaks_decimate(ecg_data, detector):
+
+    upsampled = resample_poly(ecg_data["signal"].astype(float), 5, 1)
+    sfreq = ecg_data["sfreq"] * 5
+    peaks = detector(upsampled, sfreq)
+    peaks_decimated = detector(upsampled, sfreq, decimate=True)
+    assert np.array_equal(peaks_decimated, peaks)
+
+
+@pytest.mark.parametrize("detector", [ecg_peaks, ppg_peaks])
+@pytest.mark.parametrize("decimate", [False, True])
+def test_peaks_segments(ecg_data, detector, decimate):
+
+    peaks = detector(ecg_data["signal"], ecg_data["sfreq"], decimate=decimate)
+    peaks_segments, segments = detector(ecg_data["signal"], ecg_data["sfreq"],
+                                        decimate=decimate,
+                                        return_segments=True)
+    assert np.array_equal(peaks_segments, peaks)
+    assert segments.shape == (peaks.size, 2)
+    assert np.all(segments[:, 0] <= peaks) and np.all(peaks < segments[:, 1])
+
+
 def test_heart_stats(peaks_correct):
 
     period, rate = heart_stats(peaks_correct, sfreq=1000, nsamp=peaks_correct[-1])
     assert np.allclose(np.mean(period), 1, atol=.01)
     assert np.allclose(np.mean(rate), 60, atol=1)
+
+
+def test_interp_stats(peaks_correct):
+
+    peaks = peaks_correct    # spanning multiple of interp_stats' blocks
+    nsamp = peaks[-1] + 1000
+    samples = np.arange(nsamp)
+    period = np.ediff1d(peaks, to_begin=1000) / 1000
+    amplitude = np.cos(np.arange(peaks.size))
+    expected = [np.interp(samples, peaks, period),
+                np.interp(samples, peaks, amplitude)]
+    assert np.allclose(interp_stats(peaks, period, nsamp), expected[0])
+    out = np.empty((2, nsamp))
+    result = interp_stats(peaks, [period, amplitude], nsamp, out=out)
+    assert result is out
+    assert np.allclose(out, expected)
+
+
+@pytest.mark.parametrize("edit", ["remove", "add"])
+@pytest.mark.parametrize("idx", [0, 1, 500, -2, -1])
+def test_update_heart_stats(peaks_correct, edit, idx):
+
+    nsamp = peaks_correct[-1] + 1000
+    period, rate = heart_stats(peaks_correct, sfreq=1000, nsamp=nsamp)
+    if edit == "remove":
+        edited = peaks_correct[idx]
+        peaks = np.delete(peaks_correct, idx)
+    else:
+        edited = peaks_correct[idx] + 10
+        peaks = np.insert(peaks_correct, idx + 1 if idx >= 0 else
+                          peaks_correct.size + idx + 1, edited)
+    update_heart_stats(period, rate, peaks, 1000, edited)
+    period_full, rate_full = heart_stats(peaks, sfreq=1000, nsamp=nsamp)
+    assert np.allclose(period, period_full)
+    assert np.allclose(rate, rate_full)
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for hrv module."""
+
+import pytest
+import numpy as np
+from scipy.signal import periodogram
+from biopeaks.hrv import (windowed_hrv, windowed_frequency_hrv,
+                          batch_windowed_hrv, bands)
+from biopeaks.io_utils import write_peaks
+
+
+@pytest.fixture
+def peaks():
+    rng = np.random.default_rng(42)
+    return np.cumsum(rng.integers(600, 1200, 500))    # RR intervals in msec
+
+
+def reference_hrv(rr):
+    """Compute metrics of a single window with loops over RR intervals."""
+    rrdiff = np.diff(rr)
+    return {"nintervals": rr.size,
+            "mean_rr": np.mean(rr),
+            "sdnn": np.std(rr, ddof=1),
+            "rmssd": np.sqrt(np.mean(rrdiff ** 2)),
+            "sdsd": np.std(rrdiff, ddof=1),
+            "pnn50": 100 * np.mean(np.abs(rrdiff) > 50)}
+
+
+@pytest.mark.parametrize("unit, window, step",
+                         [("seconds", 60, None), ("seconds", 7.5, 3.3),
+                          ("beats", 50, 7), ("beats", 3, 1)])
+def test_windowed_hrv(peaks, unit, window, step):
+
+    hrv = windowed_hrv(peaks, 1000, window=window, step=step, unit=unit)
+    times = peaks / 1000
+    step = window if step is None else step
+    expected_step = step if unit == "seconds" else times[step] - times[0]
+    assert hrv["start"].iloc[1] - hrv["start"].iloc[0] == pytest.approx(expected_step)
+    for idx, window_hrv in hrv.iterrows():
+        first, last = np.searchsorted(times, [window_hrv["start"],
+                                              window_hrv["end"]])
+        if unit == "beats":
+            last += 1    # the window ends with the last beat
+        expected = reference_hrv(np.diff(peaks[first:last]))
+        for metric, value in expected.items():
+            assert window_hrv[metric] == pytest.approx(value), metric
+    assert np.allclose(hrv["mean_hr"], 60000 / hrv["mean_rr"])
+
+
+def test_windowed_hrv_edge_cases(peaks):
+
+    assert windowed_hrv(peaks[:1], 1000, window=60).empty
+    hrv = windowed_hrv(peaks, 1000, window=1, unit="beats")
+    assert np.all(hrv["nintervals"] == 1)
+    assert hrv["sdnn"].isna().all()
+    assert np.allclose(hrv["mean_rr"], np.diff(peaks))
+    hrv = windowed_hrv(peaks, 1000, window=60, duration=peaks[-1] / 1000 + 60)
+    assert hrv["nintervals"].iloc[-1] < hrv["nintervals"].iloc[0]    # last window extends beyond the last peak
+    with pytest.raises(ValueError):
+        windowed_hrv(peaks, 1000, window=60, unit="minutes")
+
+
+def modulated_peaks(freq, duration=600, sfreq=1000):
+    """Peaks with RR intervals that oscillate at freq Hz around 800 msec."""
+    peaks = [0]
+    while peaks[-1] < duration * sfreq:
+        t = peaks[-1] / sfreq
+        peaks.append(peaks[-1] + int(800 + 50 * np.sin(2 * np.pi * freq * t)))
+    return np.asarray(peaks)
+
+
+@pytest.mark.parametrize("freq, band", [(.1, "lf"), (.25, "hf")])
+def test_windowed_frequency_hrv(freq, band):
+
+    peaks = modulated_peaks(freq)
+    hrv = windowed_frequency_hrv(peaks, 1000, window=120, step=30)
+    assert np.allclose(hrv["start"], np.arange(hrv.shape[0]) * 30)
+    other = "hf" if band == "lf" else "lf"
+    assert np.all(hrv[band] > 10 * hrv[other])
+    assert np.allclose(hrv["lfnu"] + hrv["hfnu"], 100)
+    # A sinusoid with amplitude 50 msec has a power of 50**2 / 2 msec² (minus
+    # the attenuation by the linear interpolation at higher frequencies).
+    assert np.allclose(hrv[band], 1250, rtol=.3)
+
+    # Compare a window to the periodogram of the interpolated RR intervals.
+    start = hrv["start"].iloc[3]
+    times = np.arange(start, start + 120, .25)
+    rr = np.interp(times, peaks[1:] / 1000, np.diff(peaks))
+    freqs, psd = periodogram(rr, fs=4, window="hann", detrend="linear")
+    low, high = bands[band]
+    expected = psd[(freqs >= low) & (freqs < high)].sum() * freqs[1]
+    assert hrv[band].iloc[3] == pytest.approx(expected, rel=.01)
+
+
+def test_windowed_frequency_hrv_edge_cases(peaks):
+
+    assert windowed_frequency_hrv(peaks[:1], 1000, window=60).empty
+    hrv = windowed_frequency_hrv(peaks, 1000, window=60,
+                                 duration=peaks[-1] / 1000 + 120)
+    assert hrv["nintervals"].iloc[-1] == 0
+    assert hrv[["lf", "hf"]].iloc[-1].isna().all()
+    assert hrv[["lf", "hf"]].iloc[0].notna().all()
+    with pytest.raises(ValueError):
+        windowed_frequency_hrv(peaks, 1000, resample_sfreq=.5)
+
+
+def test_batch_windowed_hrv(peaks, tmp_path):
+
+    fpaths = []
+    for i in range(3):
+        fpath = tmp_path.joinpath(f"rec{i}_peaks.csv")
+        write_peaks(fpath, peaks[i * 100:], 1000, "ECG")
+        fpaths.append(fpath)
+
+    hrv = batch_windowed_hrv(fpaths, window=30, unit="beats")
+    for i, fpath in enumerate(fpaths):
+        expected = windowed_hrv(peaks[i * 100:], 1000, window=30, unit="beats")
+        result = hrv[hrv["file"] == fpath.name].drop(columns="file")
+        assert np.allclose(result.to_numpy(), expected.to_numpy(),
+                           equal_nan=True)
+    assert batch_windowed_hrv([]).empty
+
+    # Results of BatchProcessor, files without peaks are skipped.
+    results = [{"wpathpeaks": str(fpath), "error": False} for fpath in fpaths]
+    results.append({"wpathpeaks": None, "error": "Could not read file."})
+    hrv = batch_windowed_hrv(results, window=120, domain="frequency")
+    assert list(hrv["file"].unique()) == [fpath.name for fpath in fpaths]
+    expected = windowed_frequency_hrv(peaks, 1000, window=120)
+    result = hrv[hrv["file"] == fpaths[0].name].drop(columns="file")
+    assert np.allclose(result.to_numpy(), expected.to_numpy(), equal_nan=True)
+    with pytest.raises(ValueError):
+        batch_windowed_hrv(fpaths, unit="beats", domain="frequency")
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for peakset module."""
+
+import pytest
+import numpy as np
+from biopeaks.peakset import PeakSet
+
+
+@pytest.fixture
+def peaks():
+    return np.arange(0, 10000, 100)
+
+
+@pytest.mark.parametrize("maxpending", [0, 4, 1024])
+def test_peakset_edits(peaks, maxpending):
+
+    rng = np.random.default_rng(42)
+    peakset = PeakSet(peaks, maxpending=maxpending)
+    expected = set(peaks.tolist())
+    history = [sorted(expected)]
+    for _ in range(200):
+        sample = int(rng.integers(0, 10000))
+        if rng.random() < .5:
+            edited = peakset.add(sample)
+            assert edited == (sample not in expected)
+            expected.add(sample)
+        else:
+            reference = np.asarray(sorted(expected))
+            nearest = reference[np.argmin(np.abs(reference - sample))]
+            sample = peakset.nearest(sample)
+            assert sample == nearest
+            edited = peakset.remove(sample)
+            assert edited
+            expected.discard(sample)
+        if edited:
+            history.append(sorted(expected))
+        assert len(peakset) == len(expected)
+        assert np.array_equal(np.asarray(peakset), sorted(expected))
+
+    # Undo all edits, then redo them.
+    for state in reversed(history[:-1]):
+        assert peakset.undo()
+        assert np.array_equal(np.asarray(peakset), state)
+    assert not peakset.undo()
+    for state in history[1:]:
+        assert peakset.redo()
+        assert np.array_equal(np.asarray(peakset), state)
+    assert not peakset.redo()
+
+
+def test_peakset_lookup():
+
+    peakset = PeakSet([300, 100, 200, 200])
+    assert len(peakset) == 3
+    assert peakset.nearest(150) == 100    # earlier extremum in case of a tie
+    assert peakset.nearest(1000) == 300
+    assert 200 in peakset
+    assert peakset.remove([100, 200, 150])    # 150 isn't an extremum
+    assert peakset.nearest(190) == 300
+    assert not peakset.remove(100)
+    assert peakset.add([150, 300])    # 300 exists already
+    assert np.array_equal(np.asarray(peakset), [150, 300])
+    assert peakset.undo()
+    assert peakset.add(100)
+    assert not peakset.can_redo    # new edits discard undone edits
+    assert PeakSet().nearest(0) is None
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for the comparison of runs of the performance suite."""
+
+import pytest
+from biopeaks.benchmarks.performance.suite import (save_results, load_results,
+                                                   compare_results,
+                                                   format_report)
+from biopeaks.benchmarks.performance.__main__ import main
+
+
+def timing(time_min, time_median, peak_memory=2 ** 20):
+    return {"time_min": time_min, "time_median": time_median,
+            "peak_memory": peak_memory}
+
+
+@pytest.fixture
+def results_dir(tmp_path):
+    baseline = {"fast": {"60": timing(1., 1.01)},
+                "noisy": {"60": timing(1., 1.01)},
+                "slow": {"60": timing(1., 1.01), "600": timing(10., 10.1)},
+                "removed": {"60": timing(1., 1.)}}
+    contender = {"fast": {"60": timing(.5, .51)},
+                 "noisy": {"60": timing(1.15, 1.5)},    # within the spread of the timings
+                 "slow": {"60": timing(1.05, 1.06), "600": timing(13., 13.1)},
+                 "added": {"60": timing(1., 1.)}}
+    save_results(baseline, label="baseline", results_dir=tmp_path)
+    save_results(contender, label="contender", results_dir=tmp_path)
+    return tmp_path
+
+
+def test_compare_results(results_dir):
+
+    baseline = load_results("baseline", results_dir)
+    contender = load_results("contender", results_dir)
+    report = compare_results(baseline, contender, threshold=.1)
+    flags = {(row["benchmark"], row["duration"]): row["flag"]
+             for row in report}
+    assert flags == {("fast", "60"): "improvement", ("noisy", "60"): "",
+                     ("slow", "60"): "", ("slow", "600"): "regression"}
+    noisy, = [row for row in report if row["benchmark"] == "noisy"]
+    assert noisy["noise"] == pytest.approx(.35)
+
+    text = format_report(report, baseline, contender)
+    assert text.splitlines()[0] == "time_min: baseline -> contender"
+    assert text.splitlines()[-1] == "1 regression(s) found."
+
+
+def test_compare_cli(results_dir, capsys):
+
+    args = ["--results-dir", str(results_dir), "compare", "baseline",
+            "contender"]
+    assert main(args) == 1
+    assert "regression" in capsys.readouterr().out
+    assert main(args + ["--threshold", ".5"]) == 0
+    assert main(args + ["--metric", "peak_memory"]) == 0
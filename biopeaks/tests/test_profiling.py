@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for profiling module."""
+
+import json
+import numpy as np
+from biopeaks.profiling import StageProfile, profile_stages, stage
+from biopeaks.heart import ecg_peaks
+
+
+def test_inactive_profile():
+
+    with stage("unprofiled"):
+        pass    # must not fail without an active profile
+
+
+def test_profile_stages(ecg_data):
+
+    with profile_stages() as profile:
+        ecg_peaks(ecg_data["signal"], ecg_data["sfreq"])
+
+    stages = profile.to_dict()
+    for name in ["ecg_peaks", "ecg_peaks.highpass", "ecg_peaks.powerline",
+                 "ecg_peaks.gradient", "ecg_peaks.smooth", "ecg_peaks.average",
+                 "ecg_peaks.segments", "ecg_peaks.qrs_loop"]:
+        assert stages[name]["calls"] == 1
+        assert "memory" not in stages[name]
+    assert stages["ecg_peaks"]["time"] >= stages["ecg_peaks.highpass"]["time"]
+
+
+def test_profile_memory(ecg_data):
+
+    with profile_stages(trace_memory=True) as profile:
+        ecg_peaks(ecg_data["signal"], ecg_data["sfreq"])
+
+    stages = profile.to_dict()
+    nbytes = ecg_data["signal"].size * 8    # one float64 copy of the signal
+    assert stages["ecg_peaks.highpass"]["memory"] >= nbytes
+    assert stages["ecg_peaks"]["memory"] >= stages["ecg_peaks.highpass"]["memory"]
+
+
+def test_aggregate_profiles(tmp_path, ecg_data):
+
+    profile = StageProfile()
+    for _ in range(2):
+        with profile_stages(profile):
+            ecg_peaks(ecg_data["signal"], ecg_data["sfreq"])
+    assert profile.stages["ecg_peaks"]["calls"] == 2
+
+    with profile_stages() as other:
+        ecg_peaks(ecg_data["signal"], ecg_data["sfreq"])
+    profile.merge(other)
+    assert profile.stages["ecg_peaks"]["calls"] == 3
+
+    wpath = tmp_path.joinpath("profile.json")
+    profile.to_json(wpath)
+    with open(wpath) as f:
+        exported = json.load(f)
+    assert exported["ecg_peaks"]["calls"] == 3
+    assert np.isclose(exported["ecg_peaks"]["mean_time"],
+                      exported["ecg_peaks"]["time"] / 3)
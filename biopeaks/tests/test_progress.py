@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for progress module."""
+
+import numpy as np
+from biopeaks.progress import ProgressTracker, tracking, report_progress
+from biopeaks.batch import BatchProcessor
+from biopeaks.chunked import process_long_recording
+from biopeaks.io_utils import read_edf
+
+
+def test_progress_tracker():
+
+    report_progress(samples=10)    # must not fail without an active tracker
+
+    events = []
+    tracker = ProgressTracker(files_total=2, bytes_total=400,
+                              callback=events.append, interval=60)
+    with tracking(tracker):
+        tracker.start_file(100)
+        report_progress(samples=1000, nbytes=100)
+        report_progress(fraction=.5)
+    assert len(events) == 1    # subsequent reports are throttled
+    event = tracker.event()
+    assert event["samples"] == 1000
+    assert event["bytes_read"] == 100
+    assert np.isclose(event["fraction"], .125)    # half of a quarter
+    assert event["eta"] > 0
+
+    tracker.finish_file()    # always emitted
+    assert events[-1]["files_done"] == 1
+    assert np.isclose(events[-1]["fraction"], .25)
+    tracker.start_file(300)
+    tracker.finish_file()
+    assert np.isclose(events[-1]["fraction"], 1)
+    assert events[-1]["eta"] == 0
+
+
+def test_batch_processor_progress(tmp_path, datadir):
+
+    fpaths = [datadir.joinpath(f) for f in ["OSmontage1A.txt",
+                                             "OSmontage1J.txt"]]
+    events = []
+    processor = BatchProcessor("ECG", "OpenSignals", "A3",
+                               wdirstats=tmp_path, progress=events.append)
+    processor.run(fpaths)
+
+    assert [event["files_done"] for event in events][-2:] == [1, 2]
+    event = events[-1]
+    assert event["files_total"] == 2
+    assert event["fraction"] == 1
+    assert event["bytes_read"] == sum(f.stat().st_size for f in fpaths)
+    assert event["samples"] > 0
+    assert event["samples_per_sec"] > 0
+
+
+def test_chunked_progress(datadir):
+
+    data = read_edf(datadir.joinpath("EDFmontage0.edf"), channel="A3",
+                    channeltype="signal")
+    events = []
+    tracker = ProgressTracker(files_total=1, callback=events.append,
+                              interval=0)
+    tracker.start_file()
+    with tracking(tracker):
+        process_long_recording(data["signal"], data["sfreq"], "ECG",
+                               chunksize=30, stats=False)
+    fractions = [event["fraction"] for event in events]
+    assert np.all(np.diff(fractions) >= 0)
+    assert fractions[-1] == 1
+    assert events[-1]["samples"] >= data["signal"].size
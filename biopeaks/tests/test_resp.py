@@ -3,10 +3,12 @@
 
 import pytest
 import numpy as np
+from scipy.signal import resample_poly
 from pathlib import Path
 from biopeaks.resp import (resp_extrema, resp_stats,
                            ensure_peak_trough_alternation)
 from biopeaks.io_utils import read_edf
+from biopeaks.analysis_utils import DetectorWorkspace
 
 
 @pytest.fixture
@@ -33,6 +35,27 @@ def test_resp_extrema(resp_data):
     assert np.allclose(np.sum(test_extrema), 40410033, atol=5)
 
 
+def test_resp_extrema_float32(resp_data):
+
+    extrema64 = resp_extrema(resp_data["signal"], resp_data["sfreq"])
+    extrema32 = resp_extrema(resp_data["signal"], resp_data["sfreq"],
+                             dtype=np.float32)
+    assert extrema32.size == extrema64.size
+    assert np.max(np.abs(extrema32 - extrema64)) <= 1    # in samples
+
+
+def test_resp_extrema_workspace(resp_data):
+
+    extrema = resp_extrema(resp_data["signal"], resp_data["sfreq"])
+    workspace = DetectorWorkspace()
+    resp_extrema(resp_data["signal"], resp_data["sfreq"], workspace=workspace)
+    allocations = workspace.allocations
+    extrema_workspace = resp_extrema(resp_data["signal"], resp_data["sfreq"],
+                                     workspace=workspace)
+    assert workspace.allocations == allocations
+    assert np.array_equal(extrema_workspace, extrema)
+
+
 def test_resp_stats(signal, extrema):
 
     period, rate, tidalamp = resp_stats(extrema, signal, sfreq=1)
@@ -45,3 +68,17 @@ def test_ensure_peak_trough_alternation(signal, extrema):
 
     alternating_extrema = ensure_peak_trough_alternation(extrema, signal)
     assert np.sum(alternating_extrema - np.array([0, 2, 4, 8, 9])) == 0
+
+
+def test_resp_extrema_decimate(resp_data):
+
+    upsampled = resample_poly(resp_data["signal"].astype(float), 20, 1)
+    sfreq = resp_data["sfreq"] * 20
+    extrema = resp_extrema(upsampled, sfreq)
+    extrema_decimated = resp_extrema(upsampled, sfreq, decimate=True)
+    assert abs(extrema_decimated.size - extrema.size) <= 1
+    idcs = np.searchsorted(extrema_decimated, extrema)
+    idcs = np.clip(idcs, 1, extrema_decimated.size - 1)
+    deviations = np.minimum(np.abs(extrema_decimated[idcs] - extrema),
+                            np.abs(extrema_decimated[idcs - 1] - extrema))
+    assert np.max(deviations) <= 100    # decimation factor
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for timeaxis module."""
+
+import pytest
+import numpy as np
+from biopeaks.timeaxis import TimeAxis
+from biopeaks.io_utils import read_edf, memmap_edf
+
+
+@pytest.fixture
+def sec():
+    return TimeAxis(1000, sfreq=100, offset=2.)
+
+
+def test_timeaxis_indexing(sec):
+
+    expected = 2. + np.arange(1000) / 100
+    assert len(sec) == np.size(sec) == 1000
+    assert np.array_equal(np.asarray(sec), expected)
+    assert sec[0] == 2. and sec[-1] == expected[-1]
+    assert np.array_equal(sec[[3, -3]], expected[[3, -3]])
+    mask = expected > 10
+    assert np.array_equal(sec[mask], expected[mask])
+    assert np.allclose(sec[100:300:2], expected[100:300:2])
+    assert np.array_equal(sec[::-1], expected[::-1])
+    assert sec[100:200] == TimeAxis(100, 100, offset=3.)
+    with pytest.raises(IndexError):
+        sec[1000]
+
+
+def test_timeaxis_conversion(sec):
+
+    expected = np.asarray(sec)
+    assert sec.sample(3.004) == 100
+    assert np.array_equal(sec.sample([0., 20.]), [-200, 1800])
+    assert np.array_equal(sec.sample([0., 20.], clip=True), [0, 999])
+    times = np.array([1., 2., 2.005, 2.03, 3.3, 20.])
+    for side in ["left", "right"]:
+        assert np.array_equal(sec.searchsorted(times, side=side),
+                              np.searchsorted(expected, times, side=side))
+
+
+def test_reader_timeaxis(datadir):
+
+    data = read_edf(datadir.joinpath("EDFmontage0.edf"), channel="A3",
+                    channeltype="signal")
+    assert data["sec"] == TimeAxis(data["signal"].size, data["sfreq"])
+    mapped = memmap_edf(datadir.joinpath("EDFmontage0.edf"), channel="A3",
+                        channeltype="signal")
+    assert mapped["sec"] == data["sec"]
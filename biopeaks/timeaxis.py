@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""Time axis of evenly sampled signals.
+
+The time of sample `i` is `offset + i / sfreq`. `TimeAxis` represents these
+times by the three parameters instead of a vector, such that reading a
+recording doesn't allocate a float64 vector of seconds per channel. The
+vector is only computed when it is needed (e.g., for plotting, see
+`TimeAxis.__array__`).
+
+Examples
+--------
+>>> sec = TimeAxis(1000, sfreq=100)
+>>> sec[250]
+2.5
+>>> sec.sample(2.504)
+250
+>>> sec[100:200]
+TimeAxis(size=100, sfreq=100, offset=1.0)
+"""
+
+import numpy as np
+
+
+class TimeAxis:
+    """Seconds associated with each sample of an evenly sampled signal.
+
+    Supports `len`, indexing with integers (returns float), slices (returns
+    TimeAxis for positive steps), as well as integer and boolean arrays
+    (returns ndarray), like the equivalent vector of seconds.
+
+    Attributes
+    ----------
+    size : int
+        The number of samples.
+    sfreq : float
+        The sampling frequency.
+    offset : float
+        The time of the first sample in seconds.
+    """
+
+    def __init__(self, size, sfreq, offset=0.):
+        """Define the axis.
+
+        Parameters
+        ----------
+        size : int
+            The number of samples.
+        sfreq : float
+            The sampling frequency.
+        offset : float, optional
+            The time of the first sample in seconds. Default is 0.
+        """
+        if size < 0:
+            raise ValueError(f"Size must not be negative, got {size}.")
+        if sfreq <= 0:
+            raise ValueError(f"Sampling frequency must be positive, got {sfreq}.")
+        self.size = int(size)
+        self.sfreq = sfreq
+        self.offset = float(offset)
+        self._array = None
+
+    def __len__(self):
+        return self.size
+
+    def __repr__(self):
+        return (f"TimeAxis(size={self.size}, sfreq={self.sfreq}, "
+                f"offset={self.offset})")
+
+    def __eq__(self, other):
+        if not isinstance(other, TimeAxis):
+            return NotImplemented
+        return (self.size == other.size and self.sfreq == other.sfreq and
+                self.offset == other.offset)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.size)
+            if step < 0:
+                return self.time(np.arange(start, stop, step))
+            size = len(range(start, stop, step))
+            sfreq = self.sfreq if step == 1 else self.sfreq / step
+            return TimeAxis(size, sfreq, offset=self.time(start))
+        if isinstance(key, (int, np.integer)):
+            if not -self.size <= key < self.size:
+                raise IndexError(f"Index {key} is out of bounds for TimeAxis "
+                                 f"with size {self.size}.")
+            return float(self.time(key % self.size))
+        idcs = np.asarray(key)
+        if idcs.dtype == bool:
+            if idcs.shape != (self.size,):
+                raise IndexError("Boolean index must have the same size as "
+                                 "the TimeAxis.")
+            idcs = np.flatnonzero(idcs)
+        if idcs.size and (idcs.max() >= self.size or idcs.min() < -self.size):
+            raise IndexError(f"Index out of bounds for TimeAxis with size "
+                             f"{self.size}.")
+        return self.time(np.where(idcs < 0, idcs + self.size, idcs))
+
+    def __array__(self, dtype=None, copy=None):
+        """Compute the vector of seconds.
+
+        The vector is computed once and kept for subsequent conversions (e.g.,
+        when the same axis is plotted multiple times).
+        """
+        if self._array is None:
+            self._array = self.time(np.arange(self.size))
+        array = self._array
+        if dtype is not None and np.dtype(dtype) != array.dtype:
+            return array.astype(dtype)
+        return array.copy() if copy else array
+
+    @property
+    def duration(self):
+        """float: Time spanned by the samples, i.e., `size / sfreq`."""
+        return self.size / self.sfreq
+
+    def time(self, samples):
+        """Convert sample indices to seconds.
+
+        Parameters
+        ----------
+        samples : int or ndarray of int
+            Sample indices (need not be within the axis).
+
+        Returns
+        -------
+        float or ndarray of float
+        """
+        return self.offset + np.asarray(samples) / self.sfreq
+
+    def sample(self, seconds, clip=False):
+        """Convert seconds to the index of the nearest sample.
+
+        Parameters
+        ----------
+        seconds : float or ndarray of float
+            Time in seconds.
+        clip : bool, optional
+            Clip indices to the axis (i.e., to [0, size - 1]). Default is
+            False.
+
+        Returns
+        -------
+        int or ndarray of int
+        """
+        samples = np.rint((np.asarray(seconds) - self.offset) * self.sfreq)
+        if clip:
+            samples = np.clip(samples, 0, max(self.size - 1, 0))
+        samples = samples.astype(int)
+        return samples if samples.ndim else int(samples)
+
+    def searchsorted(self, seconds, side="left"):
+        """Find the indices where times would be inserted to maintain order.
+
+        Equivalent to `np.searchsorted(np.asarray(self), seconds, side)`, but
+        computed in constant time.
+
+        Parameters
+        ----------
+        seconds : float or ndarray of float
+            Time in seconds.
+        side : {"left", "right"}, optional
+            If "left", the index of the first sample at or after `seconds`,
+            if "right", the index of the first sample after `seconds`.
+            Default is "left".
+
+        Returns
+        -------
+        int or ndarray of int
+        """
+        # Round to suppress representation errors of sample times (e.g.,
+        # .1 * 3 != .3) before rounding up or down.
+        position = np.round((np.asarray(seconds) - self.offset) * self.sfreq,
+                            decimals=6)
+        if side == "left":
+            idcs = np.ceil(position)
+        elif side == "right":
+            idcs = np.floor(position) + 1
+        else:
+            raise ValueError(f"Side must be 'left' or 'right', got {side}.")
+        idcs = np.clip(idcs, 0, self.size).astype(int)
+        return idcs if idcs.ndim else int(idcs)
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 """View component of the MVC application."""
 
+import numpy as np
+from datetime import timedelta
 from PySide6.QtWidgets import (QWidget, QComboBox, QMainWindow,
                                QVBoxLayout, QHBoxLayout, QCheckBox,
                                QLabel, QStatusBar, QGroupBox, QDockWidget,
@@ -119,6 +121,10 @@ class View(QMainWindow):
                                          self)
         self.correctcheckbox.stateChanged.connect(self._model.set_correctbatchpeaks)
 
+        # Resuming an interrupted batch processing.
+        self.resumecheckbox = QCheckBox("resume interrupted batch", self)
+        self.resumecheckbox.stateChanged.connect(self._model.set_resumebatch)
+
         # Selection of stats for saving.
         self.periodcheckbox = QCheckBox("period", self)
         self.periodcheckbox.stateChanged.connect(lambda: self.select_stats("period"))
@@ -300,6 +306,14 @@ class View(QMainWindow):
         self.segmentermap.setMapping(segmentSignal, 1)
         signalmenu.addAction(segmentSignal)
 
+        undoSegment = QAction("undo segmentation", self)
+        undoSegment.triggered.connect(self._controller.undo_segment)
+        signalmenu.addAction(undoSegment)
+
+        revertSegment = QAction("revert to entire signal", self)
+        revertSegment.triggered.connect(self._controller.revert_segment)
+        signalmenu.addAction(revertSegment)
+
         self.segmentermap.mappedInt.connect(self.toggle_segmenter)
 
         saveSignal = QAction("save", self)
@@ -336,9 +350,14 @@ class View(QMainWindow):
 
         self.statusBar = QStatusBar()
         self.setStatusBar(self.statusBar)
+        self.progressLabel = QLabel()
+        self.statusBar.addPermanentWidget(self.progressLabel)
         self.progressBar = QProgressBar(self)
         self.progressBar.setRange(0, 1)
         self.statusBar.addPermanentWidget(self.progressBar)
+        self.cancelbutton = QPushButton("cancel")
+        self.cancelbutton.clicked.connect(self._controller.cancel)
+        self.statusBar.addPermanentWidget(self.cancelbutton)
         self.currentFile = QLabel()
         self.statusBar.addPermanentWidget(self.currentFile)
 
@@ -369,6 +388,7 @@ class View(QMainWindow):
         self.optionsgroupA = QGroupBox("processing options")
         self.vlayoutA.addRow(self.modmenulabel, self.modmenu)
         self.vlayoutA.addRow(self.batchmenulabel, self.batchmenu)
+        self.vlayoutA.addRow(self.resumecheckbox)
         self.optionsgroupA.setLayout(self.vlayoutA)
 
         self.optionsgroupB = QGroupBox("channels")
@@ -418,6 +438,7 @@ class View(QMainWindow):
         self._model.segment_changed.connect(self.plot_segment)
         self._model.status_changed.connect(self.display_status)
         self._model.progress_changed.connect(self.display_progress)
+        self._model.progressevent_changed.connect(self.display_progressevent)
         self._model.model_reset.connect(self.reset_plot)
 
     def plot_signal(self, signal):
@@ -437,7 +458,7 @@ class View(QMainWindow):
         self.ax00.clear()
         self.ax00.relim()
         self.navitools.update()    # reset navitools history
-        self.line00 = self.ax00.plot(self._model.sec, signal, zorder=1)
+        self.line00 = self.ax00.plot(np.asarray(self._model.sec), signal, zorder=1)
         self.ax00.set_xlabel("seconds", fontsize="large", fontweight="heavy")
         self.canvas0.draw()
 
@@ -493,9 +514,9 @@ class View(QMainWindow):
 
         Parameters
         ----------
-        marker : list of ndarray
+        marker : list
             Seconds element is vector representing the marker channel and first
-            element is a vector representing the seconds associated with each
+            element is a TimeAxis representing the seconds associated with each
             sample in the marker channel.
 
         See Also
@@ -504,7 +525,7 @@ class View(QMainWindow):
         """
         self.ax10.clear()
         self.ax10.relim()
-        self.line10 = self.ax10.plot(marker[0], marker[1])
+        self.line10 = self.ax10.plot(np.asarray(marker[0]), marker[1])
         self.canvas1.draw()
 
     def plot_period(self, period):
@@ -514,8 +535,9 @@ class View(QMainWindow):
 
         Parameters
         ----------
-        period : ndarray of float
-            Vector representing the instantaneous period.
+        period : ndarray of float or None
+            Vector representing the instantaneous period. None clears the
+            plot.
 
         See Also
         --------
@@ -523,11 +545,15 @@ class View(QMainWindow):
         """
         self.ax20.clear()
         self.ax20.relim()
+        if period is None:    # statistics have been discarded
+            self.line20 = None
+            self.canvas2.draw()
+            return
         self.navitools.home()
         if self._model.savestats["period"]:
-            self.line20 = self.ax20.plot(self._model.sec, period, c="m")
+            self.line20 = self.ax20.plot(np.asarray(self._model.sec), period, c="m")
         else:
-            self.line20 = self.ax20.plot(self._model.sec, period)
+            self.line20 = self.ax20.plot(np.asarray(self._model.sec), period)
         self.ax20.set_ylim(bottom=min(period), top=max(period))
         self.ax20.set_title("period", pad=0, fontweight="heavy")
         self.ax20.grid(True, axis="y")
@@ -541,8 +567,9 @@ class View(QMainWindow):
 
         Parameters
         ----------
-        rate : ndarray of float
-            Vector representing the instantaneous rate.
+        rate : ndarray of float or None
+            Vector representing the instantaneous rate. None clears the
+            plot.
 
         See Also
         --------
@@ -550,11 +577,15 @@ class View(QMainWindow):
         """
         self.ax21.clear()
         self.ax21.relim()
+        if rate is None:    # statistics have been discarded
+            self.line21 = None
+            self.canvas2.draw()
+            return
         self.navitools.home()
         if self._model.savestats["rate"]:
-            self.line21 = self.ax21.plot(self._model.sec, rate, c="m")
+            self.line21 = self.ax21.plot(np.asarray(self._model.sec), rate, c="m")
         else:
-            self.line21 = self.ax21.plot(self._model.sec, rate)
+            self.line21 = self.ax21.plot(np.asarray(self._model.sec), rate)
         self.ax21.set_ylim(bottom=min(rate), top=max(rate))
         self.ax21.set_title("rate", pad=0, fontweight="heavy")
         self.ax21.grid(True, axis="y")
@@ -568,8 +599,9 @@ class View(QMainWindow):
 
         Parameters
         ----------
-        tidalamp : ndarray of float
-            Vector representing the instantaneous tidal amplitude.
+        tidalamp : ndarray of float or None
+            Vector representing the instantaneous tidal amplitude. None clears the
+            plot.
 
         See Also
         --------
@@ -577,11 +609,15 @@ class View(QMainWindow):
         """
         self.ax22.clear()
         self.ax22.relim()
+        if tidalamp is None:    # statistics have been discarded
+            self.line22 = None
+            self.canvas2.draw()
+            return
         self.navitools.home()
         if self._model.savestats["tidalamp"]:
-            self.line22 = self.ax22.plot(self._model.sec, tidalamp, c="m")
+            self.line22 = self.ax22.plot(np.asarray(self._model.sec), tidalamp, c="m")
         else:
-            self.line22 = self.ax22.plot(self._model.sec, tidalamp)
+            self.line22 = self.ax22.plot(np.asarray(self._model.sec), tidalamp)
         self.ax22.set_ylim(bottom=min(tidalamp), top=max(tidalamp))
         self.ax22.set_title("amplitude", pad=0, fontweight="heavy")
         self.ax22.grid(True, axis="y")
@@ -634,8 +670,38 @@ class View(QMainWindow):
         --------
         model.Model.progress, controller.Worker, controller.threaded
         """
+        if self._model.progressevent is not None:    # batch progress is displayed instead
+            return
         self.progressBar.setRange(0, progress)    # indicates busy state if progress is 0
 
+    def display_progressevent(self, event):
+        """Display the progress of batch processing.
+
+        Receives updates in progress events from Model.
+
+        Parameters
+        ----------
+        event : dict or None
+            Progress event (see biopeaks.progress). None resets the display.
+
+        See Also
+        --------
+        model.Model.progressevent, controller.Controller._batch_processor
+        """
+        if event is None:
+            self.progressLabel.clear()
+            self.progressBar.setRange(0, 1)
+            self.progressBar.reset()
+            return
+        eta = ("--:--:--" if event["eta"] is None
+               else str(timedelta(seconds=round(event["eta"]))))
+        self.progressLabel.setText(f"{event['files_done']}/{event['files_total']} files | "
+                                   f"{event['samples_per_sec'] / 1e3:.0f} k samples/s | "
+                                   f"{event['bytes_read'] / 2 ** 20:.1f} MiB read | "
+                                   f"remaining {eta}")
+        self.progressBar.setRange(0, 1000)
+        self.progressBar.setValue(int(event["fraction"] * 1000))
+
     def toggle_segmenter(self, visibility_state):
         """Toggle visibility of segmenter widget.
 
@@ -769,6 +835,7 @@ class View(QMainWindow):
             self.editcheckbox.setChecked(False)
             self.savecheckbox.setEnabled(True)
             self.correctcheckbox.setEnabled(True)
+            self.resumecheckbox.setEnabled(True)
             self.markerchanmenu.setEnabled(False)
         elif state == "single file":
             self.editcheckbox.setEnabled(True)
@@ -777,6 +844,8 @@ class View(QMainWindow):
             self.savecheckbox.setChecked(False)
             self.correctcheckbox.setEnabled(False)
             self.correctcheckbox.setChecked(False)
+            self.resumecheckbox.setEnabled(False)
+            self.resumecheckbox.setChecked(False)
 
     def reset_plot(self):
         """Reset plot elements associated with the current dataset."""